@@ -0,0 +1,583 @@
+#!/usr/bin/env python3
+"""
+Winnability analyzer.
+
+Searches every state that the player can reach, where a state is the room the
+player is in, the value of every flag, and the items the player is carrying.
+The level's actions are interpreted without running the game: only their
+effects on flags and items matter, so printing is ignored. From each state
+the player can take any open exit, try a closed exit (which runs its
+fail-text), look around, or use any verb on any object in the room. Fights
+are assumed to be won.
+
+The search reports whether END can be reached and the shortest command script
+that reaches it, rooms that can never be entered, items that can never be
+taken, and states from which END can no longer be reached (soft-locks).
+
+States are packed into fixed-size records (with a parent link and the
+command that led to them) and deduplicated by a 64-bit hash. The records are
+written to a temporary file once more than a limit of them are in memory, and
+the hashes are kept in a hash table in a memory-mapped temporary file, so
+large worlds don't need to fit in memory. Transitions aren't kept; soft-locks
+are found by looking at each state's moves again once the search is done.
+
+Run with e.g. `python analyzer.py`, or `python analyzer.py --world zork.json`.
+"""
+import sys
+assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
+
+import argparse
+import hashlib
+import json
+import mmap
+import struct
+import tempfile
+import gameflags
+import main
+import world
+
+# Number of states that are kept in memory before they are written to disk
+MEMORY_STATES = 100000
+# The verbs that the player can use on objects
+VERBS = ["look", "search", "take", "open"]
+
+# Records are the parent's index and the label of the command that led to
+# the state, followed by the encoded state
+_RECORD = struct.Struct("<qi")
+# Records are read back from disk this many at a time
+BLOCK_RECORDS = 4096
+# Initial number of slots in a StateTable
+TABLE_CAPACITY = 1 << 16
+
+class StateStore:
+    """
+    A list of fixed-size records, numbered in the order they were appended.
+    Once more than memory_limit records are waiting in memory, they are
+    written to a temporary file, and read back a block at a time.
+    """
+    __slots__ = ("record_size", "memory_limit", "_file", "_tail", "_tail_start", "_block", "_block_start",
+        "_length")
+    def __init__(self, record_size, memory_limit=MEMORY_STATES):
+        self.record_size = record_size
+        self.memory_limit = max(memory_limit, 1)
+        self._file = None
+        self._tail = bytearray()
+        # Index of the first record in _tail; every record before it is on disk
+        self._tail_start = 0
+        self._block = b""
+        self._block_start = 0
+        self._length = 0
+    @property
+    def spilled(self):
+        """
+        The number of records that have been written to disk.
+        """
+        return self._tail_start
+    def append(self, record):
+        """
+        Add a record. Returns its index.
+        """
+        self._tail += record
+        self._length += 1
+        if self._length - self._tail_start >= self.memory_limit:
+            self._spill()
+        return self._length - 1
+    def _spill(self):
+        if self._file == None:
+            self._file = tempfile.TemporaryFile()
+        self._file.seek(self._tail_start * self.record_size)
+        self._file.write(self._tail)
+        self._tail = bytearray()
+        self._tail_start = self._length
+    def get(self, index):
+        """
+        Get the record at an index.
+        """
+        size = self.record_size
+        if index >= self._tail_start:
+            offset = (index - self._tail_start) * size
+            return bytes(self._tail[offset:offset + size])
+        offset = (index - self._block_start) * size
+        if index < self._block_start or offset >= len(self._block):
+            self._block_start = index - index % BLOCK_RECORDS
+            self._file.seek(self._block_start * size)
+            count = min(BLOCK_RECORDS, self._tail_start - self._block_start)
+            self._block = self._file.read(count * size)
+            offset = (index - self._block_start) * size
+        return self._block[offset:offset + size]
+    def close(self):
+        if self._file != None:
+            self._file.close()
+            self._file = None
+    def __len__(self):
+        return self._length
+
+class StateTable:
+    """
+    A hash table from 64-bit state hashes to state indices. Slots are pairs
+    of 64-bit integers (hash, index + 1) in a temporary file that is mapped
+    into memory, so the operating system can page the table out instead of
+    it having to fit in memory. The table doubles in size when it is half
+    full.
+    """
+    __slots__ = ("capacity", "_file", "_map", "_slots", "_count")
+    def __init__(self, capacity=TABLE_CAPACITY):
+        self._count = 0
+        self._allocate(capacity)
+    def _allocate(self, capacity):
+        self.capacity = capacity
+        self._file = tempfile.TemporaryFile()
+        self._file.truncate(capacity * 16)
+        self._map = mmap.mmap(self._file.fileno(), capacity * 16)
+        self._slots = memoryview(self._map).cast("Q")
+    def _find(self, key):
+        # Returns the slot that holds key, or the empty slot where it belongs
+        slots = self._slots
+        mask = self.capacity - 1
+        slot = key & mask
+        while True:
+            stored = slots[slot * 2]
+            if stored == key or stored == 0:
+                return slot
+            slot = (slot + 1) & mask
+    def get(self, key):
+        """
+        Get the index of the state with a hash, or None if it hasn't been
+        added.
+        """
+        slot = self._find(key or 1)
+        index = self._slots[slot * 2 + 1]
+        return index - 1 if index != 0 else None
+    def add(self, key, index):
+        """
+        Add the index of a state that isn't in the table yet.
+        """
+        if (self._count + 1) * 2 > self.capacity:
+            self._grow()
+        slot = self._find(key or 1)
+        self._slots[slot * 2] = key or 1
+        self._slots[slot * 2 + 1] = index + 1
+        self._count += 1
+    def _grow(self):
+        oldslots = self._slots
+        oldmap = self._map
+        oldfile = self._file
+        self._allocate(self.capacity * 2)
+        slots = self._slots
+        for slot in range(0, len(oldslots), 2):
+            key = oldslots[slot]
+            if key != 0:
+                newslot = self._find(key)
+                slots[newslot * 2] = key
+                slots[newslot * 2 + 1] = oldslots[slot + 1]
+        oldslots.release()
+        oldmap.close()
+        oldfile.close()
+    def close(self):
+        self._slots.release()
+        self._map.close()
+        self._file.close()
+    def __len__(self):
+        return self._count
+
+class _StateCodec:
+    """
+    Packs (room, flags, inventory) into bytes and back. Rooms and values of
+    non-boolean flags are stored as indices; only items that actions refer to
+    are counted. Items that are never removed are only checked for with
+    "has", so having one of them is stored the same as having several.
+    """
+    def __init__(self, gameworld, itemnames, removed):
+        self.world = gameworld
+        self.layout = gameworld.flag_layout
+        self.roomnames = list(gameworld.rooms)
+        self.roomids = {name: i for i, name in enumerate(self.roomnames)}
+        self.bitbytes = (len(self.layout.bool_names) + 7) // 8
+        # Values of each value slot; index 0 means unset
+        self.values = [[gameflags._UNSET] for _ in self.layout.value_names]
+        self.valueids = [{} for _ in self.layout.value_names]
+        self.itemnames = sorted(itemnames)
+        self.itemcaps = [255 if name in removed else 1 for name in self.itemnames]
+        self.header = struct.Struct("<I{0}s{0}s".format(self.bitbytes))
+        # Every state is encoded to this many bytes
+        self.size = self.header.size + 2 * len(self.values) + len(self.itemnames)
+    def _value_id(self, slot, value):
+        key = json.dumps(value, sort_keys=True)
+        ids = self.valueids[slot]
+        if key not in ids:
+            ids[key] = len(self.values[slot])
+            self.values[slot].append(value)
+        return ids[key]
+    def encode(self, roomname, flags, counts):
+        parts = [self.header.pack(self.roomids[roomname],
+            flags.isset.to_bytes(self.bitbytes, "little"),
+            flags.bits.to_bytes(self.bitbytes, "little"))]
+        for slot, value in enumerate(flags.values):
+            if value is gameflags._UNSET:
+                parts.append(b"\0\0")
+            else:
+                parts.append(struct.pack("<H", self._value_id(slot, value)))
+        if len(counts) > 0:
+            parts.append(bytes([min(counts.get(name, 0), cap) for name, cap in zip(self.itemnames, self.itemcaps)]))
+        else:
+            parts.append(bytes(len(self.itemnames)))
+        return b"".join(parts)
+    def room(self, data):
+        return self.roomnames[struct.unpack_from("<I", data)[0]]
+    def decode(self, data):
+        roomname = self.room(data)
+        pos = 4
+        flags = gameflags.Flags(self.layout)
+        flags.isset = int.from_bytes(data[pos:pos + self.bitbytes], "little")
+        pos += self.bitbytes
+        flags.bits = int.from_bytes(data[pos:pos + self.bitbytes], "little")
+        pos += self.bitbytes
+        for slot in range(len(flags.values)):
+            flags.values[slot] = self.values[slot][struct.unpack_from("<H", data, pos)[0]]
+            pos += 2
+        counts = {}
+        for name, count in zip(self.itemnames, data[pos:]):
+            if count > 0:
+                counts[name] = count
+        return roomname, flags, counts
+
+def _same_state(flags, counts, newflags, newcounts):
+    return newflags.isset == flags.isset and newflags.bits == flags.bits \
+        and newflags.values == flags.values and newcounts == counts
+
+def _copy_flags(flags):
+    result = gameflags.Flags(flags.layout)
+    result.isset = flags.isset
+    result.bits = flags.bits
+    result.values = list(flags.values)
+    result.extra = dict(flags.extra)
+    return result
+
+def run_action(action, flags, counts):
+    """
+    Apply the effects of a level action (see main.execute_level_action) to
+    flags and item counts, without printing anything.
+
+    Parameters
+    ----------
+    action: str, sequence, or mapping
+        The action, as it appears in the level data.
+    flags: gameflags.Flags
+        The flags; modified in place.
+    counts: dict[str -> int]
+        The number of each item that the player has; modified in place.
+    """
+    if isinstance(action, str) or action == None:
+        return
+    if not hasattr(action, "get"):
+        for item in action:
+            run_action(item, flags, counts)
+        return
+    atype = action.get("type")
+    if atype == "setflag":
+        flags.set(action.get("flag"), action.get("value"))
+    elif atype == "if":
+        value = flags.get(action.get("flag"), action.get("default"))
+        testvalue = action.get("value", None)
+        if testvalue == None:
+            passed = value or value == None
+        else:
+            passed = value == testvalue
+        run_action(action.get("true" if passed else "false"), flags, counts)
+    elif atype == "has":
+        passed = counts.get(action.get("item"), 0) > 0
+        run_action(action.get("true" if passed else "false"), flags, counts)
+    elif atype == "give":
+        itemname = action.get("item")
+        counts[itemname] = counts.get(itemname, 0) + 1
+    elif atype == "remove":
+        itemname = action.get("item")
+        if counts.get(itemname, 0) > 0:
+            if action.get("remove-all", False):
+                del counts[itemname]
+            else:
+                counts[itemname] -= 1
+                if counts[itemname] == 0:
+                    del counts[itemname]
+
+def find_items(action, itemnames, removed):
+    """
+    Add the name of every item that a level action refers to to itemnames,
+    and the name of every item that it removes to removed.
+    """
+    if isinstance(action, str) or action == None:
+        return
+    if not hasattr(action, "get"):
+        for item in action:
+            find_items(item, itemnames, removed)
+        return
+    atype = action.get("type")
+    if atype in ("has", "give", "remove"):
+        itemnames.add(action.get("item"))
+    if atype == "remove":
+        removed.add(action.get("item"))
+    for key in ("true", "false"):
+        find_items(action.get(key), itemnames, removed)
+
+class Analysis:
+    """
+    The result of analyze.
+
+    Attributes
+    ----------
+    states: int
+        The number of distinct states that were found.
+    complete: bool
+        False if the search stopped at max_states.
+    spilled: int
+        The number of queued states that were written to disk.
+    winning_script: list[str]
+        The shortest list of commands that reaches END, or None.
+    unreachable_rooms: list[str]
+        Rooms that can't be entered.
+    untakeable_items: list[(str, str)]
+        (room, object) for room items that can never be taken.
+    softlock_states: int
+        The number of states from which END can't be reached. Only counted
+        if the search was complete and END can be reached at all.
+    softlock_rooms: list[str]
+        Rooms in which the player can be soft-locked.
+    softlock_script: list[str]
+        The shortest list of commands that soft-locks the player, or None.
+    """
+    def __init__(self):
+        self.states = 0
+        self.complete = True
+        self.spilled = 0
+        self.winning_script = None
+        self.unreachable_rooms = []
+        self.untakeable_items = []
+        self.softlock_states = 0
+        self.softlock_rooms = []
+        self.softlock_script = None
+
+def _moves(gameworld, roomname, flags, counts):
+    """
+    Yield (command, room, flags, counts, took) for every command that can be
+    used in a state. took is true if the command took one of the room's items.
+    """
+    room = gameworld.rooms[roomname]
+    exitdefs = room.data.get("exits", ())
+    for i, exitdata in enumerate(room.exits):
+        newflags = _copy_flags(flags)
+        newcounts = dict(counts)
+        if not exitdata.is_open(flags):
+            run_action(exitdefs[i].get("fail-text"), newflags, newcounts)
+            if not _same_state(flags, counts, newflags, newcounts):
+                yield "move " + exitdata.exit.lower(), roomname, newflags, newcounts, False
+            continue
+        target = exitdata.room
+        if target.id != roomname and target.data.get("desc") != None:
+            run_action(target.data["desc"], newflags, newcounts)
+        yield "move " + exitdata.exit.lower(), target.id, newflags, newcounts, False
+    newflags = _copy_flags(flags)
+    newcounts = dict(counts)
+    run_action(room.data.get("look", world.DEFAULT_LOOK), newflags, newcounts)
+    if not _same_state(flags, counts, newflags, newcounts):
+        yield "look", roomname, newflags, newcounts, False
+    items = room.data.get("items", {})
+    for objectname, objectdata in room.data.get("interact", {}).items():
+        for verb in VERBS:
+            if verb not in objectdata:
+                continue
+            newflags = _copy_flags(flags)
+            newcounts = dict(counts)
+            run_action(objectdata[verb], newflags, newcounts)
+            if _same_state(flags, counts, newflags, newcounts):
+                continue
+            took = verb == "take" and objectname in items and newcounts != counts
+            yield "{} {}".format(verb, objectname), roomname, newflags, newcounts, took
+
+def _state_hash(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+def _script(store, labelnames, index):
+    script = []
+    while True:
+        parent, label = _RECORD.unpack_from(store.get(index))
+        if parent < 0:
+            break
+        script.append(labelnames[label])
+        index = parent
+    script.reverse()
+    return script
+
+def _find_winnable(gameworld, codec, store, table):
+    """
+    Find every state from which END can be reached, as a bitset over state
+    indices. Transitions aren't kept during the search, so every state's
+    moves are found again: each pass walks the states backwards, marking
+    those with a move into a marked state. Another pass is only needed if a
+    state was marked after one that was left unmarked, which might now have
+    a move into it.
+    """
+    canwin = bytearray((len(store) + 7) // 8)
+    again = True
+    while again:
+        again = False
+        unmarked = False
+        for index in range(len(store) - 1, -1, -1):
+            if canwin[index >> 3] >> (index & 7) & 1:
+                continue
+            data = store.get(index)[_RECORD.size:]
+            roomname, flags, counts = codec.decode(data)
+            winnable = roomname in main.END_EXITS
+            if not winnable:
+                for _, newroom, newflags, newcounts, _ in _moves(gameworld, roomname, flags, counts):
+                    newindex = table.get(_state_hash(codec.encode(newroom, newflags, newcounts)))
+                    if newindex != None and canwin[newindex >> 3] >> (newindex & 7) & 1:
+                        winnable = True
+                        break
+            if winnable:
+                canwin[index >> 3] |= 1 << (index & 7)
+                again = again or unmarked
+            else:
+                unmarked = True
+    return canwin
+
+def analyze(gameworld, classname=None, max_states=None, memory_states=MEMORY_STATES):
+    """
+    Search every reachable state of a world. Returns an Analysis.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world to analyze.
+    classname: str
+        The class whose starting items the player has, or None to start with
+        no items.
+    max_states: int
+        Stop after finding this many states, or None to search every state.
+    memory_states: int
+        The number of states to keep in memory before they are written to
+        disk; see StateStore.
+    """
+    itemnames = set()
+    removed = set()
+    for room in gameworld.rooms.values():
+        for key in ("desc", "look"):
+            find_items(room.data.get(key), itemnames, removed)
+        for exitdef in room.data.get("exits", ()):
+            find_items(exitdef.get("fail-text"), itemnames, removed)
+        for objectdata in room.data.get("interact", {}).values():
+            for action in objectdata.values():
+                find_items(action, itemnames, removed)
+    codec = _StateCodec(gameworld, itemnames, removed)
+    counts = {}
+    if classname != None:
+        for itemname in gameworld.classdefs[classname].get("items", []):
+            if itemname in itemnames:
+                counts[itemname] = counts.get(itemname, 0) + 1
+    start = main.START_ROOM if main.START_ROOM in gameworld.rooms else next(iter(gameworld.rooms))
+    flags = gameflags.Flags(gameworld.flag_layout)
+    if gameworld.rooms[start].data.get("desc") != None:
+        run_action(gameworld.rooms[start].data["desc"], flags, counts)
+    result = Analysis()
+    labelnames = []
+    labelids = {}
+    visitedrooms = {start}
+    takenitems = set()
+    firstwin = None
+    # States are numbered in breadth first order, and the states that haven't
+    # been searched yet are the ones after head, so the store is the queue.
+    store = StateStore(_RECORD.size + codec.size, memory_states)
+    table = StateTable()
+    data = codec.encode(start, flags, counts)
+    table.add(_state_hash(data), store.append(_RECORD.pack(-1, -1) + data))
+    try:
+        head = 0
+        while head < len(store):
+            index = head
+            head += 1
+            data = store.get(index)[_RECORD.size:]
+            roomname, flags, counts = codec.decode(data)
+            if roomname in main.END_EXITS:
+                if firstwin == None:
+                    firstwin = index
+                continue
+            for command, newroom, newflags, newcounts, took in _moves(gameworld, roomname, flags, counts):
+                if took:
+                    takenitems.add((roomname, command.split(" ", 1)[1]))
+                newdata = codec.encode(newroom, newflags, newcounts)
+                if newdata == data:
+                    continue
+                key = _state_hash(newdata)
+                if table.get(key) != None:
+                    continue
+                if max_states != None and len(store) >= max_states:
+                    result.complete = False
+                    continue
+                if command not in labelids:
+                    labelids[command] = len(labelnames)
+                    labelnames.append(command)
+                table.add(key, store.append(_RECORD.pack(index, labelids[command]) + newdata))
+                visitedrooms.add(newroom)
+        result.states = len(store)
+        if firstwin != None:
+            result.winning_script = _script(store, labelnames, firstwin)
+        result.unreachable_rooms = [name for name in gameworld.rooms if name not in visitedrooms]
+        for roomname, room in gameworld.rooms.items():
+            if roomname not in visitedrooms:
+                continue
+            for objectname in room.data.get("items", {}):
+                if (roomname, objectname) not in takenitems:
+                    result.untakeable_items.append((roomname, objectname))
+        if result.complete and firstwin != None:
+            canwin = _find_winnable(gameworld, codec, store, table)
+            softlock_rooms = set()
+            for index in range(len(store)):
+                if canwin[index >> 3] >> (index & 7) & 1:
+                    continue
+                # The first stuck state has the shortest script
+                if result.softlock_states == 0:
+                    result.softlock_script = _script(store, labelnames, index)
+                result.softlock_states += 1
+                softlock_rooms.add(codec.room(store.get(index)[_RECORD.size:]))
+            result.softlock_rooms = sorted(softlock_rooms)
+    finally:
+        result.spilled = store.spilled
+        store.close()
+        table.close()
+    return result
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Check that a world can be won.")
+    parser.add_argument("--world", default=main.FILE_LEVEL, help="level file to analyze")
+    parser.add_argument("--directory", default=None, help="folder containing the content files")
+    parser.add_argument("--class", dest="classname", default=None,
+        help="start with this class's items (default: no items)")
+    parser.add_argument("--max-states", type=int, default=None, help="stop after this many states")
+    parser.add_argument("--memory-states", type=int, default=MEMORY_STATES,
+        help="states to keep in memory before writing them to disk")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+    gameworld = main.load_content(level=args.world, directory=args.directory)
+    result = analyze(gameworld, args.classname, args.max_states, args.memory_states)
+    if args.json:
+        print(json.dumps(vars(result), indent=4))
+        return
+    print("States: {}{}".format(result.states, "" if result.complete else " (stopped early)"))
+    if result.spilled > 0:
+        print("States written to disk: {}".format(result.spilled))
+    if result.winning_script == None:
+        print("END can't be reached!")
+    else:
+        print("Shortest win ({} commands):".format(len(result.winning_script)))
+        for command in result.winning_script:
+            print("    " + command)
+    print("Unreachable rooms ({}): {}".format(len(result.unreachable_rooms), ", ".join(result.unreachable_rooms)))
+    print("Untakeable items ({}): {}".format(len(result.untakeable_items),
+        ", ".join("{} in {}".format(objectname, roomname) for roomname, objectname in result.untakeable_items)))
+    if result.complete and result.winning_script != None:
+        print("Soft-lock states: {}".format(result.softlock_states))
+        if result.softlock_script != None:
+            print("Soft-locks happen in: {}".format(", ".join(result.softlock_rooms)))
+            print("Shortest soft-lock: " + "; ".join(result.softlock_script))
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Monte Carlo balance runner.
+
+Plays many complete runs of the game for every class, without any input or
+output, and reports how often each class wins, what kills it, how long each
+fight takes and how much of each stat is lost in each room.
+
+A run is a headless game (see main.start_game) that follows a script of
+commands. By default the script is the shortest winning script found by
+analyzer; use --route to give the rooms to walk through instead. Whenever the
+player is ambushed, the fight is played with the game's 'attack' and 'use'
+commands, chosen by combatsim's attack and reaction policies (see
+combatsim.PolicyIO). So every level action, item and fight follows the game's
+own rules, and the player keeps their stats and items from one fight to the
+next.
+
+Runs are split into chunks that are played across a pool of processes. Each
+chunk has its own random number generator, seeded from --seed, the class and
+the chunk's number, so results don't depend on how many processes are used.
+
+Run with e.g. `python balance.py -n 100000 --seed 1 --csv balance.csv`.
+"""
+import sys
+assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import random
+import analyzer
+import commandparser
+import combatsim
+import gameevents
+import main
+
+# Number of runs played by a process at a time
+CHUNK_SIZE = 1000
+
+class RoomStats:
+    """
+    Aggregated results of the fights in one room.
+
+    Attributes
+    ----------
+    fights: int
+        The number of fights.
+    deaths: int
+        The number of fights that the player died in.
+    rounds: int
+        The total number of rounds over all fights.
+    stat_loss: list[int]
+        The total loss of each stat (STR, DEX, WIS, SOUL) over all fights.
+    """
+    __slots__ = ("fights", "deaths", "rounds", "stat_loss")
+    def __init__(self):
+        self.fights = 0
+        self.deaths = 0
+        self.rounds = 0
+        self.stat_loss = [0, 0, 0, 0]
+    def add(self, result):
+        self.fights += 1
+        if result.cause != None:
+            self.deaths += 1
+        self.rounds += result.rounds
+        for i, value in enumerate(result.stat_loss):
+            self.stat_loss[i] += value
+    def merge(self, other):
+        self.fights += other.fights
+        self.deaths += other.deaths
+        self.rounds += other.rounds
+        for i, value in enumerate(other.stat_loss):
+            self.stat_loss[i] += value
+    def to_dict(self):
+        fights = max(self.fights, 1)
+        return {
+            "fights": self.fights,
+            "death_rate": self.deaths / fights,
+            "avg_rounds": self.rounds / fights,
+            "avg_stat_loss": {name.upper(): loss / fights
+                for name, loss in zip(combatsim.STAT_NAMES, self.stat_loss)}
+        }
+
+class ClassStats:
+    """
+    Aggregated results of many runs of one class.
+
+    Attributes
+    ----------
+    runs: int
+        The number of runs.
+    wins: int
+        The number of runs that reached the end of the route alive.
+    causes: dict[str -> int]
+        The number of deaths for each cause of death (see
+        Character.get_cause_of_death).
+    rooms: dict[str -> RoomStats]
+        Results of the fights in each room on the route.
+    """
+    __slots__ = ("runs", "wins", "causes", "rooms")
+    def __init__(self):
+        self.runs = 0
+        self.wins = 0
+        self.causes = {}
+        self.rooms = {}
+    def merge(self, other):
+        """
+        Add another ClassStats' results to this one.
+        """
+        self.runs += other.runs
+        self.wins += other.wins
+        for cause, count in other.causes.items():
+            self.causes[cause] = self.causes.get(cause, 0) + count
+        for roomname, stats in other.rooms.items():
+            self.rooms.setdefault(roomname, RoomStats()).merge(stats)
+    def to_dict(self):
+        runs = max(self.runs, 1)
+        return {
+            "runs": self.runs,
+            "win_rate": self.wins / runs,
+            "causes": dict(self.causes),
+            "rooms": {roomname: stats.to_dict() for roomname, stats in self.rooms.items()}
+        }
+
+def find_route(gameworld, script):
+    """
+    Get the rooms that a command script walks through, in order, starting
+    with the room the player starts in. Commands other than 'move' are
+    ignored.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world.
+    script: list[str]
+        Commands, e.g. from analyzer.Analysis.winning_script.
+    """
+    roomname = main.START_ROOM if main.START_ROOM in gameworld.rooms else next(iter(gameworld.rooms))
+    route = [roomname]
+    for command in script:
+        words = command.split(" ", 1)
+        if words[0] != "move" or len(words) < 2:
+            continue
+        room = gameworld.rooms[roomname]
+        if words[1].isdigit():
+            # Exits can be given by number, like in the game
+            index = int(words[1]) - 1
+            if index not in range(len(room.exits)):
+                index = None
+        else:
+            index = room.exit_index.find(words[1])
+        if index == None or index is commandparser.AMBIGUOUS:
+            raise ValueError("Can't follow '{}' from {}".format(command, roomname))
+        roomname = room.exits[index].target
+        route.append(roomname)
+    return route
+
+def route_script(gameworld, route):
+    """
+    Get the 'move' commands that walk through a route. Raises ValueError if
+    two rooms on the route aren't joined by an exit. Exits that are closed
+    stay closed, since no other command is played.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world.
+    route: list[str]
+        The rooms to walk through, starting with the room the player starts in.
+    """
+    script = []
+    for roomname, nextname in zip(route, route[1:]):
+        for i, exitdata in enumerate(gameworld.rooms[roomname].exits):
+            if exitdata.target == nextname:
+                script.append("move {}".format(i + 1))
+                break
+        else:
+            raise ValueError("There is no exit from {} to {}".format(roomname, nextname))
+    return script
+
+def _stat_values(player):
+    return [player.strength.value, player.dexterity.value, player.wisdom.value, player.soul.value]
+
+class _FightRecorder:
+    """
+    Subscribed to a game's events; adds the result of each fight to the
+    RoomStats of the room that it was fought in.
+    """
+    __slots__ = ("gamedata", "stats", "room", "start")
+    def __init__(self, gamedata, stats):
+        self.gamedata = gamedata
+        self.stats = stats
+        self.room = None
+        self.start = None
+        if len(gamedata.encounter) > 0:
+            # Ambushed in the first room, before subscribing
+            self._begin()
+    def __call__(self, event):
+        if isinstance(event, gameevents.EncounterStarted):
+            self._begin()
+        elif isinstance(event, gameevents.EncounterCleared):
+            self.end()
+    def _begin(self):
+        self.room = self.gamedata.room
+        self.start = _stat_values(self.gamedata.player)
+    def end(self):
+        """
+        Record the current fight, if there is one. A fight that is still
+        going on was lost.
+        """
+        if self.room == None:
+            return
+        player = self.gamedata.player
+        stat_loss = [a - b for a, b in zip(self.start, _stat_values(player))]
+        result = combatsim.CombatResult(len(self.gamedata.encounter) == 0, self.gamedata.io.rounds, stat_loss,
+            player.get_cause_of_death())
+        roomstats = self.stats.rooms.get(self.room)
+        if roomstats == None:
+            roomstats = self.stats.rooms[self.room] = RoomStats()
+        roomstats.add(result)
+        self.room = None
+
+def play_run(gameworld, classname, script, attack_policy, reaction_policy, seed, stats):
+    """
+    Play one run of the game, adding its results to stats. Returns the
+    finished game. The run is won if the player is alive and not fighting
+    when the script ends or the game is won.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world.
+    classname: str
+        The player's class.
+    script: list[str]
+        The commands to play outside of fights.
+    attack_policy, reaction_policy: function
+        See combatsim.PolicyIO.
+    seed: int
+        The seed of the game's random number generator.
+    stats: ClassStats
+        Where to add the results.
+    """
+    io = combatsim.PolicyIO(attack_policy, reaction_policy, classname, script)
+    gamedata = main.start_game(gameworld, io, seed, render=False)
+    io.gamedata = gamedata
+    recorder = _FightRecorder(gamedata, stats)
+    gamedata.events.subscribe(recorder)
+    main.game_loop(gamedata)
+    recorder.end()
+    stats.runs += 1
+    player = gamedata.player
+    if player.is_dead() or len(gamedata.encounter) > 0:
+        cause = player.get_cause_of_death()
+        if cause == None:
+            # The fight went on for too long
+            cause = "timeout"
+        stats.causes[cause] = stats.causes.get(cause, 0) + 1
+    else:
+        stats.wins += 1
+    return gamedata
+
+# The world, loaded once in each worker process
+_worker_world = None
+
+def _init_worker(level, directory):
+    global _worker_world
+    _worker_world = main.load_content(level=level, directory=directory)
+
+def _play_chunk(job):
+    classname, chunk, runs, seed, script, attack_policy, reaction_policy = job
+    gameworld = _worker_world
+    # String seeds are hashed the same way in every process
+    rng = random.Random("{}:{}:{}".format(seed, classname, chunk))
+    stats = ClassStats()
+    attack = combatsim.ATTACK_POLICIES[attack_policy]
+    reaction = combatsim.REACTION_POLICIES[reaction_policy]
+    for _ in range(runs):
+        play_run(gameworld, classname, script, attack, reaction, rng.getrandbits(32), stats)
+    return classname, chunk, stats
+
+def run_balance(classnames, script, runs, seed=0, jobs=None, level=main.FILE_LEVEL, directory=None,
+        attack_policy="greedy", reaction_policy="best", chunk_size=CHUNK_SIZE, on_chunk=None):
+    """
+    Play runs of every class across a pool of processes. Returns a dictionary
+    of class name -> ClassStats.
+
+    Parameters
+    ----------
+    classnames: list[str]
+        The classes to play.
+    script: list[str]
+        The commands to play in each run; see play_run.
+    runs: int
+        The number of runs per class.
+    seed: int
+        The random seed.
+    jobs: int
+        The number of processes, or None for one per CPU.
+    level, directory: str
+        The content to load in each process; see main.load_content.
+    attack_policy, reaction_policy: str
+        Names of combatsim policies.
+    chunk_size: int
+        The number of runs that a process plays at a time.
+    on_chunk: function(classname, chunk, ClassStats)
+        Called in this process as each chunk finishes.
+    """
+    work = []
+    for classname in classnames:
+        for chunk, start in enumerate(range(0, runs, chunk_size)):
+            work.append((classname, chunk, min(chunk_size, runs - start), seed, script,
+                attack_policy, reaction_policy))
+    results = {classname: ClassStats() for classname in classnames}
+    if jobs == None:
+        jobs = os.cpu_count() or 1
+    with multiprocessing.Pool(jobs, _init_worker, (level, directory)) as pool:
+        for classname, chunk, stats in pool.imap_unordered(_play_chunk, work):
+            results[classname].merge(stats)
+            if on_chunk != None:
+                on_chunk(classname, chunk, stats)
+    return results
+
+def write_csv(path, results):
+    """
+    Write one row per class and room on the route, plus one row per class
+    for the whole run (with an empty room).
+    """
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["class", "room", "runs", "win_rate", "fights", "death_rate", "avg_rounds"]
+            + ["avg_loss_" + name for name in combatsim.STAT_NAMES])
+        for classname, stats in results.items():
+            data = stats.to_dict()
+            writer.writerow([classname, "", data["runs"], data["win_rate"], "", "", "", "", "", "", ""])
+            for roomname, roomstats in data["rooms"].items():
+                loss = roomstats["avg_stat_loss"]
+                writer.writerow([classname, roomname, "", "", roomstats["fights"], roomstats["death_rate"],
+                    roomstats["avg_rounds"]] + [loss[name.upper()] for name in combatsim.STAT_NAMES])
+
+def format_table(results):
+    """
+    Format results as a human-readable table.
+    """
+    lines = ["{:<10} {:>7}  {}".format("CLASS", "WIN%", "DEATHS")]
+    for classname, stats in results.items():
+        data = stats.to_dict()
+        causes = ", ".join("{} {}".format(cause, count) for cause, count in sorted(data["causes"].items()))
+        lines.append("{:<10} {:>6.1f}%  {}".format(classname, data["win_rate"] * 100, causes))
+    lines.append("")
+    lines.append("{:<10} {:<16} {:>7} {:>7} {:>6} {:>6} {:>6} {:>6}".format(
+        "CLASS", "ROOM", "DEATH%", "ROUNDS", "STR", "DEX", "WIS", "SOUL"))
+    for classname, stats in results.items():
+        for roomname, roomstats in stats.to_dict()["rooms"].items():
+            loss = roomstats["avg_stat_loss"]
+            lines.append("{:<10} {:<16} {:>6.1f}% {:>7.2f} {:>6.2f} {:>6.2f} {:>6.2f} {:>6.2f}".format(
+                classname, roomname, roomstats["death_rate"] * 100, roomstats["avg_rounds"],
+                loss["STR"], loss["DEX"], loss["WIS"], loss["SOUL"]))
+    return "\n".join(lines)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Play many runs of every class and report balance statistics.")
+    parser.add_argument("-n", "--runs", type=int, default=10000, help="runs per class")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="processes to use (default: one per CPU)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="runs per unit of work")
+    parser.add_argument("--class", dest="classes", nargs="+", metavar="CLASS", help="classes to play (default: all)")
+    parser.add_argument("--route", nargs="+", metavar="ROOM",
+        help="rooms to walk through (default: the shortest winning route)")
+    parser.add_argument("--world", default=main.FILE_LEVEL, help="level file to play")
+    parser.add_argument("--directory", default=None, help="folder containing the content files")
+    parser.add_argument("--attack-policy", choices=sorted(combatsim.ATTACK_POLICIES), default="greedy")
+    parser.add_argument("--reaction-policy", choices=sorted(combatsim.REACTION_POLICIES), default="best")
+    parser.add_argument("--csv", help="write results to this CSV file")
+    parser.add_argument("--stream", help="append each finished chunk's results to this file, as JSON lines")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+    gameworld = main.load_content(level=args.world, directory=args.directory)
+    classnames = args.classes or sorted(gameworld.classdefs)
+    for classname in classnames:
+        if classname not in gameworld.classdefs:
+            parser.error("unknown class '{}'".format(classname))
+    if args.route:
+        route = args.route
+        for roomname in route:
+            if roomname not in gameworld.rooms:
+                parser.error("unknown room '{}'".format(roomname))
+        try:
+            script = route_script(gameworld, route)
+        except ValueError as e:
+            parser.error(str(e))
+    else:
+        script = analyzer.analyze(gameworld).winning_script
+        if script == None:
+            parser.error("the world can't be won; give a --route")
+        route = find_route(gameworld, script)
+    streamfile = None
+    on_chunk = None
+    if args.stream:
+        streamfile = open(args.stream, "a")
+        def on_chunk(classname, chunk, stats):
+            data = stats.to_dict()
+            data["class"] = classname
+            data["chunk"] = chunk
+            streamfile.write(json.dumps(data) + "\n")
+            streamfile.flush()
+    try:
+        results = run_balance(classnames, script, args.runs, args.seed, args.jobs, args.world, args.directory,
+            args.attack_policy, args.reaction_policy, args.chunk_size, on_chunk)
+    finally:
+        if streamfile != None:
+            streamfile.close()
+    if args.csv:
+        write_csv(args.csv, results)
+    if args.json:
+        print(json.dumps({"route": route, "classes": {classname: stats.to_dict()
+            for classname, stats in results.items()}}, indent=4))
+    else:
+        print("Route: " + " -> ".join(route))
+        print(format_table(results))
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark.
+
+Measures how many bytes each game session and each spawned enemy takes, using
+tracemalloc. Shared content (the world, item prototypes) is loaded before
+measuring, so only per-session and per-enemy memory is counted.
+
+Run with e.g. `python bench_memory.py -n 2000`.
+"""
+import sys
+assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
+
+import argparse
+import gc
+import json
+import tracemalloc
+import character
+import gameio
+import main
+
+def measure(create, count):
+    """
+    Get the average number of bytes allocated by each call to create. The
+    created objects are kept alive until they have all been measured.
+
+    Parameters
+    ----------
+    create: function(int) -> any
+        Creates one object; called with 0, 1, ... count - 1.
+    count: int
+        The number of objects to create.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [create(i) for i in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+def create_session(gameworld, classname):
+    """
+    Create a game for the given class, and enter the first room.
+    """
+    player = character.create_character(gameworld.classdefs[classname], gameworld.item_prototypes)
+    gamedata = main.GameData(gameworld, player, gameio.NullIO())
+    main.enter_location(gamedata, "WHOUS")
+    return gamedata
+
+def create_enemy(gameworld, enemyname):
+    """
+    Spawn an enemy.
+    """
+    return gameworld.enemy_prototypes[enemyname].spawn()
+
+def run(gameworld, count):
+    """
+    Measure every class's sessions and every enemy. Returns a dictionary with
+    "sessions" and "enemies", which map names to bytes per object.
+    """
+    results = {"sessions": {}, "enemies": {}}
+    for classname in sorted(gameworld.classdefs):
+        results["sessions"][classname] = measure(lambda i: create_session(gameworld, classname), count)
+    for enemyname in gameworld.enemy_names:
+        results["enemies"][enemyname] = measure(lambda i: create_enemy(gameworld, enemyname), count)
+    return results
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Measure memory used per session and per enemy.")
+    parser.add_argument("-n", "--count", type=int, default=1000,
+        help="number of objects to create for each measurement")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+    results = run(main.load_content(), args.count)
+    if args.json:
+        print(json.dumps(results, indent=4))
+        return
+    for kind, title in (("sessions", "SESSION"), ("enemies", "ENEMY")):
+        print("{:<10} {:>10}".format(title, "BYTES"))
+        for name, size in results[kind].items():
+            print("{:<10} {:>10.0f}".format(name, size))
+        print("{:<10} {:>10.0f}".format("average", sum(results[kind].values()) / len(results[kind])))
+        print()
+
+if __name__ == '__main__':
+    main_cli()
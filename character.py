@@ -1,5 +1,33 @@
+import dice
+import gameio
 import gameitem
 import gameutil
+import inventory
+
+# Actions that every character can use without any items. Actions are never
+# modified, so every character shares these.
+BASIC_ATTACK = gameitem.GameActionAttack("punch", None, {
+    "name": "Unarmed attack",
+    "target": "single",
+    "stat": "STR",
+    "bonus": 0,
+    "damage": 1,
+    "info": "Deals 1 damage."
+})
+BASIC_AVOID = gameitem.GameActionDefend("dodge", None, {
+    "name": "Dodge",
+    "stat": "DEX",
+    "bonus": 0,
+    "resist": "physical"
+})
+BASIC_RESIST = gameitem.GameActionDefend("resist", None, {
+    "name": "Resist",
+    "stat": "WIS",
+    "bonus": 0,
+    "resist": "mental"
+})
+BASIC_ATTACKS = (BASIC_ATTACK,)
+BASIC_REACTIONS = (BASIC_AVOID, BASIC_RESIST)
 
 class Character:
     """
@@ -15,44 +43,37 @@ class Character:
         The wisdom stat
     soul: CharacterStat
         The soul stat
-    inventory: list[GameItem]
+    inventory: Inventory
         The player's inventory
     """
+    __slots__ = ("strength", "dexterity", "wisdom", "soul", "barricade", "inventory",
+        "basicattack", "basicavoid", "basicresist", "_format_key", "_format_text")
     def __init__(self):
         self.strength = gameutil.CharacterStat(3)
         self.dexterity = gameutil.CharacterStat(3)
         self.wisdom = gameutil.CharacterStat(3)
         self.soul = gameutil.CharacterStat(3)
         self.barricade = 0
-        self.inventory = []
-        self.basicattack = gameitem.GameActionAttack("punch", None, {
-            "name": "Unarmed attack",
-            "target": "single",
-            "stat": "STR",
-            "bonus": 0,
-            "damage": 1,
-            "info": "Deals 1 damage."
-        })
-        self.basicavoid = gameitem.GameActionDefend("dodge", None, {
-            "name": "Dodge",
-            "stat": "DEX",
-            "bonus": 0,
-            "resist": "physical"
-        })
-        self.basicresist = gameitem.GameActionDefend("resist", None, {
-            "name": "Resist",
-            "stat": "WIS",
-            "bonus": 0,
-            "resist": "mental"
-        })
+        self.basicattack = BASIC_ATTACK
+        self.basicavoid = BASIC_AVOID
+        self.basicresist = BASIC_RESIST
+        self.inventory = inventory.Inventory(BASIC_ATTACKS, BASIC_REACTIONS)
+        self._format_key = None
+        self._format_text = None
     def format_string(self):
         """
-        Format the player's information
+        Format the player's information. The text is cached until a stat
+        changes.
         """
-        return gameutil.FMT_STAT.format("STR ") + self.strength.format_string() + " " \
-            + gameutil.FMT_STAT.format("DEX ") + self.dexterity.format_string() + " " \
-            + gameutil.FMT_STAT.format("WIS ") + self.wisdom.format_string() + " " \
-            + gameutil.FMT_STAT.format("SOUL ") + self.soul.format_string() + " "
+        key = (self.strength.value, self.strength.maxvalue, self.dexterity.value, self.dexterity.maxvalue,
+            self.wisdom.value, self.wisdom.maxvalue, self.soul.value, self.soul.maxvalue)
+        if key != self._format_key:
+            self._format_key = key
+            self._format_text = gameutil.FMT_STAT.format("STR ") + self.strength.format_string() + " " \
+                + gameutil.FMT_STAT.format("DEX ") + self.dexterity.format_string() + " " \
+                + gameutil.FMT_STAT.format("WIS ") + self.wisdom.format_string() + " " \
+                + gameutil.FMT_STAT.format("SOUL ") + self.soul.format_string() + " "
+        return self._format_text
     def get_carrying_capacity(self):
         """
         Get the player's carrying capacity. Unused.
@@ -62,12 +83,8 @@ class Character:
         """
         Get a list of attacks that the player can perform.
         """
-        ls = [self.basicattack]
-        for item in self.inventory:
-            for attack in item.attacks.values():
-                ls.append(attack)
-        return ls
-    def get_defense_roll(self, dtype):
+        return self.inventory.get_attacks()
+    def get_defense_roll(self, dtype, attack_total=None, io=None, attack_dice=None):
         """
         Get the player's defense roll, returns an integer as the number of dice
         that should be rolled.
@@ -76,30 +93,48 @@ class Character:
         ----------
         dtype: str
             The damage type
+        attack_total: int
+            The enemy's attack roll. If given, the chance to block the attack
+            is shown for each reaction.
+        io: GameIO
+            Where to ask the player which reaction to use.
+        attack_dice: int
+            The number of dice the enemy rolls to attack, if the roll isn't
+            known yet. If given, the chance to block the attack is shown for
+            each reaction.
         """
-        available_reactions = []
-        for item in self.inventory:
-            for reaction in item.reactions.values():
-                if reaction.does_resist(dtype):
-                    available_reactions.append(reaction)
-        if self.basicavoid.does_resist(dtype):
-            available_reactions.append(self.basicavoid)
-        if self.basicresist.does_resist(dtype):
-            available_reactions.append(self.basicresist)
+        available_reactions = self.get_reactions(dtype)
         if len(available_reactions) == 0:
             return 0
-        reaction = gameutil.choose_from_list(available_reactions, False, "Choose a reaction")
+        descriptions = None
+        if attack_total != None:
+            descriptions = [dice.format_chance(dice.p_sum_at_least(
+                reaction.get_defense(self) + self.barricade, attack_total)) + " to block"
+                for reaction in available_reactions]
+        elif attack_dice != None:
+            descriptions = [dice.format_chance(1 - dice.p_greater(attack_dice,
+                reaction.get_defense(self) + self.barricade)) + " to block"
+                for reaction in available_reactions]
+        reaction = gameutil.choose_from_list(available_reactions, False, "Choose a reaction",
+            descriptions, io=io)
         return reaction.get_defense(self) + self.barricade
+    def get_reactions(self, dtype):
+        """
+        Get a list of reactions that the player can use against the given
+        damage type.
+
+        Parameters
+        ----------
+        dtype: str
+            The damage type
+        """
+        return self.inventory.get_reactions(dtype)
     def get_use_actions(self):
         """
         Get the player's use actions.
         """
-        ls = []
-        for item in self.inventory:
-            for attack in item.actions.values():
-                ls.append(attack)
-        return ls
-    def get_stat(self, name, cancancelchoose=False, chooseprompt="Choose a stat to use"):
+        return self.inventory.get_use_actions()
+    def get_stat(self, name, cancancelchoose=False, chooseprompt="Choose a stat to use", io=None):
         """
         Get a player's stat.
 
@@ -113,7 +148,12 @@ class Character:
         chooseprompt: str
             If the stat is "choose", then this is the promp that the player
             will see when selecting a stat.
+        io: GameIO
+            Where to ask the player if the stat is "choose". Defaults to the
+            terminal.
         """
+        if io == None:
+            io = gameio.TERMINAL
         if name == "str":
             return self.strength
         elif name == "dex":
@@ -126,12 +166,12 @@ class Character:
             return None
         elif name == "choose":
             stats = ["STR", "DEX", "WIS", "SOUL"]
-            value = gameutil.choose_from_list(stats, cancancelchoose, chooseprompt, None, gameutil.FMT_STAT)
+            value = gameutil.choose_from_list(stats, cancancelchoose, chooseprompt, None, gameutil.FMT_STAT, io)
             if value == None:
                 return None
-            return self.get_stat(value.lower(), cancancelchoose)
+            return self.get_stat(value.lower(), cancancelchoose, io=io)
         else:
-            print("Unknown stat name '{}'".format(name))
+            io.print("Unknown stat name '{}'".format(name))
             return None
     def has_item(self, itemname):
         """
@@ -140,10 +180,7 @@ class Character:
         itemname: str
             The name of the item.
         """
-        for item in self.inventory:
-            if item.fullname == itemname:
-                return True
-        return False
+        return self.inventory.has(itemname)
     def is_dead(self):
         """
         Returns true if player is kill
@@ -167,7 +204,7 @@ class Character:
     def do_turn(self, gamedata):
         self.barricade = 0
 
-def generate_character(classdefs, itemdefs):
+def generate_character(classdefs, prototypes, io=None):
     """
     Create a new character.
 
@@ -175,15 +212,29 @@ def generate_character(classdefs, itemdefs):
     ----------
     classdefs: dict[str -> dict]
         Class definitions.
-    itemdefs: dict[str -> dict]
-        Item definitions
+    prototypes: dict[str -> ItemPrototype]
+        Item prototypes
+    io: GameIO
+        Where to ask the player for their class. Defaults to the terminal.
     """
-    player = Character()
     classlist = [name for name in classdefs]
     classlist.sort()
     classdescs = [classdefs[name]["description"] for name in classlist]
-    chosen_class_name = gameutil.choose_from_list(classlist, False, "What is your class?", classdescs)
-    chosen_class_data = classdefs[chosen_class_name]
+    chosen_class_name = gameutil.choose_from_list(classlist, False, "What is your class?", classdescs, io=io)
+    return create_character(classdefs[chosen_class_name], prototypes)
+
+def create_character(chosen_class_data, prototypes):
+    """
+    Create a new character of the given class.
+
+    Parameters
+    ----------
+    chosen_class_data: dict
+        The class definition.
+    prototypes: dict[str -> ItemPrototype]
+        Item prototypes
+    """
+    player = Character()
     if "stat_max" in chosen_class_data:
         class_stats = chosen_class_data["stat_max"]
         if "STR" in class_stats:
@@ -206,5 +257,5 @@ def generate_character(classdefs, itemdefs):
             player.soul.setvalue(class_values["SOUL"])
     if "items" in chosen_class_data:
         for item in chosen_class_data["items"]:
-            player.inventory.append(gameitem.GameItem(item, itemdefs[item]))
+            player.inventory.add(prototypes[item].create())
     return player
\ No newline at end of file
@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Headless combat simulator.
+
+Plays fights in a game without any input or output, with the game's own
+rules: each round is the game's 'attack' or 'use' command, so the player's
+action goes through GameAction.use and the enemies' turns through
+Encounter.take_turns. The questions that the game would ask the player are
+answered by policies instead (see PolicyIO): an attack policy picks each
+round's action and target, and a reaction policy picks how the player reacts
+to each attack.
+
+Because every die is rolled by the game, one core simulates about 550,000
+fights per minute, rather than the millions that a copy of the rules could
+(the copy drifted from the game, so it was removed). The target is at least
+FIGHTS_PER_MINUTE on one core, which tests/test_combatsim.py checks; run
+several processes at once for more.
+
+Run this script directly to print win rates for every class against every
+enemy, e.g. `python combatsim.py -n 10000`.
+"""
+import sys
+assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
+
+import argparse
+import json
+import random
+import character
+import dice
+import gameio
+import gameitem
+import main
+
+STAT_NAMES = ["str", "dex", "wis", "soul"]
+# Fights that take longer than this are considered lost (e.g. a player who can
+# only barricade against an enemy that can only wait).
+MAX_ROUNDS = 200
+# The number of fights that one core should simulate each minute
+FIGHTS_PER_MINUTE = 300000
+
+def _get_stats(player):
+    return [player.strength, player.dexterity, player.wisdom, player.soul]
+
+def _get_stat(player, name):
+    if name == "choose":
+        # Pick the stat that would roll the most dice
+        return max(_get_stats(player), key=lambda stat: stat.value)
+    return player.get_stat(name)
+
+def _attack_dice(player, action):
+    return gameitem.get_stat_dice(_get_stat(player, action.stat), action.stat_negate) + action.bonus
+
+def greedy_attack_policy(player, encounter, rng):
+    """
+    Attack policy which heals when a stat is about to run out, and otherwise
+    picks the attack with the highest expected damage against the weakest
+    enemy, using the exact chance to hit.
+
+    Returns a tuple (action, target), where target may be None.
+
+    Parameters
+    ----------
+    player: Character
+        The player.
+    encounter: Encounter
+        The living enemies.
+    rng: random.Random
+        The random number generator to use.
+    """
+    if min(stat.value for stat in _get_stats(player)) <= 1:
+        for action in player.get_use_actions():
+            if isinstance(action, gameitem.GameActionHeal):
+                return (action, None)
+    target = min(encounter, key=lambda enemy: enemy.health.value)
+    defense = target.get_defense_value()
+    best = player.basicattack
+    best_value = -1
+    for action in player.get_attacks():
+        if isinstance(action, gameitem.GameActionAttack):
+            value = dice.p_at_least(_attack_dice(player, action), defense) * action.damage
+            if action.target == "all":
+                value *= len(encounter)
+            elif action.target == "random":
+                value *= action.random_count
+            if value > best_value:
+                best = action
+                best_value = value
+    return (best, target)
+
+def random_attack_policy(player, encounter, rng):
+    """
+    Attack policy which picks a random attack against a random enemy.
+
+    Parameters
+    ----------
+    player: Character
+        The player.
+    encounter: Encounter
+        The living enemies.
+    rng: random.Random
+        The random number generator to use.
+    """
+    return (rng.choice(player.get_attacks()), rng.choice(encounter))
+
+def best_reaction_policy(player, reactions, rng):
+    """
+    Reaction policy which picks the reaction that rolls the most dice.
+
+    Parameters
+    ----------
+    player: Character
+        The player.
+    reactions: list[GameAction]
+        The reactions that the player can use.
+    rng: random.Random
+        The random number generator to use.
+    """
+    return max(reactions, key=lambda reaction: reaction.get_defense(player))
+
+def random_reaction_policy(player, reactions, rng):
+    """
+    Reaction policy which picks a random reaction.
+
+    Parameters
+    ----------
+    player: Character
+        The player.
+    reactions: list[GameAction]
+        The reactions that the player can use.
+    rng: random.Random
+        The random number generator to use.
+    """
+    return rng.choice(reactions)
+
+class PolicyIO(gameio.NullIO):
+    """
+    IO that plays the player's side of a game with policies. While the
+    player is fighting, each line of input is the 'attack' or 'use' command,
+    and the game's menus are answered by the policies (see GameIO.chooser).
+    Outside of fights, the given lines are read, e.g. the commands that walk
+    a route.
+
+    Attributes
+    ----------
+    gamedata: GameData
+        The game that is being played. It must be set before the game reads
+        input while fighting.
+    attack_policy: function(player, encounter, rng) -> (GameAction, GameEnemy)
+        Chooses the player's action and target each round.
+    reaction_policy: function(player, reactions, rng) -> GameAction
+        Chooses how the player reacts to attacks.
+    classname: str
+        The class to choose when the game asks for one.
+    rounds: int
+        The number of rounds played in the current fight. Once it reaches
+        MAX_ROUNDS, input ends.
+    typed: list[str]
+        Every line the player would have typed, including the answers to
+        menus. Playing them with the same seed plays the same game.
+    """
+    def __init__(self, attack_policy=None, reaction_policy=None, classname=None, lines=()):
+        super().__init__(lines)
+        if attack_policy == None:
+            attack_policy = greedy_attack_policy
+        if reaction_policy == None:
+            reaction_policy = best_reaction_policy
+        self.gamedata = None
+        self.attack_policy = attack_policy
+        self.reaction_policy = reaction_policy
+        self.classname = classname
+        self.rounds = 0
+        self.typed = []
+        self.chooser = self.choose
+        self._action = None
+        self._target = None
+    def input(self, prompt=""):
+        gamedata = self.gamedata
+        if gamedata != None and len(gamedata.encounter) > 0 and not gamedata.player.is_dead():
+            if self.rounds >= MAX_ROUNDS:
+                raise EOFError()
+            self.rounds += 1
+            line = self.next_command()
+        else:
+            self.rounds = 0
+            line = super().input(prompt)
+        self.typed.append(line)
+        return line
+    def next_command(self):
+        """
+        Pick the player's action for this round with the attack policy, and
+        return the command that uses it.
+        """
+        player = self.gamedata.player
+        self._action, self._target = self.attack_policy(player, self.gamedata.encounter, self.gamedata.rng)
+        if self._action in player.get_use_actions():
+            return "use"
+        return "attack"
+    def choose(self, options, cancancel, prompt):
+        """
+        Answer one of the game's menus. Raises ValueError for menus that no
+        policy answers.
+        """
+        answer = _ANSWERS.get(prompt)
+        if answer == None:
+            raise ValueError("No policy answers '{}'".format(prompt))
+        index = answer(self, options)
+        self.typed.append(str(index + 1))
+        return index
+
+def _answer_class(io, options):
+    return options.index(io.classname)
+
+def _answer_action(io, options):
+    for i, action in enumerate(options):
+        if action is io._action:
+            return i
+    return 0
+
+def _answer_target(io, options):
+    for i, enemy in enumerate(options):
+        if enemy is io._target:
+            return i
+    return 0
+
+def _answer_reaction(io, options):
+    reaction = io.reaction_policy(io.gamedata.player, options, io.gamedata.rng)
+    return options.index(reaction)
+
+def _answer_heal_stat(io, options):
+    # Heal the stat that is missing the most
+    player = io.gamedata.player
+    return min(range(len(options)), key=lambda i: player.get_stat(options[i].lower()).value
+        - player.get_stat(options[i].lower()).maxvalue)
+
+def _answer_attack_stat(io, options):
+    # Attack with the stat that rolls the most dice
+    player = io.gamedata.player
+    return max(range(len(options)), key=lambda i: player.get_stat(options[i].lower()).value)
+
+# How PolicyIO answers each of the game's menus, by prompt
+_ANSWERS = {
+    "What is your class?": _answer_class,
+    "Choose an attack": _answer_action,
+    "Choose an item to use": _answer_action,
+    "Choose an enemy to attack": _answer_target,
+    "Choose a reaction": _answer_reaction,
+    "Choose a stat to heal": _answer_heal_stat,
+    "Choose a stat to use": _answer_attack_stat
+}
+
+class CombatResult:
+    """
+    The outcome of a single simulated encounter.
+
+    Attributes
+    ----------
+    won: bool
+        True if the player defeated every enemy.
+    rounds: int
+        The number of rounds the encounter lasted.
+    stat_loss: list[int]
+        How much of each stat (STR, DEX, WIS, SOUL) the player lost.
+    cause: str
+        The player's cause of death, or None if the player survived.
+    """
+    def __init__(self, won, rounds, stat_loss, cause):
+        self.won = won
+        self.rounds = rounds
+        self.stat_loss = stat_loss
+        self.cause = cause
+
+def simulate_encounter(gamedata, enemies=()):
+    """
+    Fight until either the player or every enemy is dead, playing the
+    player's rounds with the game's IO, which must be a PolicyIO. Fights that
+    last MAX_ROUNDS rounds are lost.
+
+    Parameters
+    ----------
+    gamedata: GameData
+        The game. Its player and enemies are modified.
+    enemies: list[GameEnemy]
+        Enemies to add to the game's encounter.
+    """
+    player = gamedata.player
+    io = gamedata.io
+    for enemy in enemies:
+        gamedata.encounter.add(enemy)
+    start = [stat.value for stat in _get_stats(player)]
+    io.rounds = 0
+    while len(gamedata.encounter) > 0 and not player.is_dead() and io.rounds < MAX_ROUNDS:
+        main.game_turn(gamedata, io.input("> "))
+    stat_loss = [a - stat.value for a, stat in zip(start, _get_stats(player))]
+    return CombatResult(len(gamedata.encounter) == 0, io.rounds, stat_loss, player.get_cause_of_death())
+
+class MatchupStats:
+    """
+    Aggregated results of many encounters between one class and one group of
+    enemies.
+
+    Attributes
+    ----------
+    fights: int
+        The number of simulated encounters.
+    wins: int
+        The number of encounters the player won.
+    rounds: int
+        The total number of rounds over all encounters.
+    stat_loss: list[int]
+        The total loss of each stat (STR, DEX, WIS, SOUL) over all encounters.
+    causes: dict[str -> int]
+        The number of deaths for each cause of death.
+    """
+    def __init__(self):
+        self.fights = 0
+        self.wins = 0
+        self.rounds = 0
+        self.stat_loss = [0, 0, 0, 0]
+        self.causes = {}
+    def add(self, result):
+        """
+        Add a single encounter's result.
+
+        Parameters
+        ----------
+        result: CombatResult
+            The result to add.
+        """
+        self.fights += 1
+        if result.won:
+            self.wins += 1
+        self.rounds += result.rounds
+        for i, value in enumerate(result.stat_loss):
+            self.stat_loss[i] += value
+        if result.cause != None:
+            self.causes[result.cause] = self.causes.get(result.cause, 0) + 1
+    def to_dict(self):
+        """
+        Convert these statistics into a JSON-compatible dictionary of averages.
+        """
+        fights = max(self.fights, 1)
+        return {
+            "fights": self.fights,
+            "win_rate": self.wins / fights,
+            "avg_rounds": self.rounds / fights,
+            "avg_stat_loss": {name.upper(): loss / fights
+                for name, loss in zip(STAT_NAMES, self.stat_loss)},
+            "causes": dict(self.causes)
+        }
+
+def new_game(gameworld, classname, attack_policy=None, reaction_policy=None, seed=None):
+    """
+    Create a game, without entering any room, whose player is played by a
+    PolicyIO.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world.
+    classname: str
+        The player's class.
+    attack_policy, reaction_policy: function
+        See PolicyIO.
+    seed: int
+        The seed of the game's random number generator, which is also used
+        by the policies.
+    """
+    io = PolicyIO(attack_policy, reaction_policy, classname)
+    player = character.create_character(gameworld.classdefs[classname], gameworld.item_prototypes)
+    gamedata = main.GameData(gameworld, player, io, seed, render=False)
+    io.gamedata = gamedata
+    return gamedata
+
+def run_matchup(gameworld, classname, enemynames, runs, attack_policy=greedy_attack_policy,
+        reaction_policy=best_reaction_policy, rng=random):
+    """
+    Simulate many encounters between one class and a group of enemies. Each
+    encounter is a new game, seeded from rng.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world.
+    classname: str
+        The player's class.
+    enemynames: list[str]
+        The names of the enemies in the encounter.
+    runs: int
+        The number of encounters to simulate.
+    """
+    prototypes = [gameworld.enemy_prototypes[name] for name in enemynames]
+    stats = MatchupStats()
+    for _ in range(runs):
+        gamedata = new_game(gameworld, classname, attack_policy, reaction_policy, rng.getrandbits(32))
+        stats.add(simulate_encounter(gamedata, [prototype.spawn() for prototype in prototypes]))
+    return stats
+
+ATTACK_POLICIES = {
+    "greedy": greedy_attack_policy,
+    "random": random_attack_policy
+}
+
+REACTION_POLICIES = {
+    "best": best_reaction_policy,
+    "random": random_reaction_policy
+}
+
+def run_all(gameworld, encounters, runs, attack_policy=greedy_attack_policy,
+        reaction_policy=best_reaction_policy, rng=random):
+    """
+    Simulate every class against every encounter. Returns a dictionary of
+    class name -> encounter name -> MatchupStats.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world.
+    encounters: dict[str -> list[str]]
+        The encounters to simulate, where keys are display names and values
+        are lists of enemy names.
+    """
+    results = {}
+    for classname in sorted(gameworld.classdefs):
+        results[classname] = {}
+        for name, enemynames in encounters.items():
+            results[classname][name] = run_matchup(gameworld, classname, enemynames, runs,
+                attack_policy, reaction_policy, rng)
+    return results
+
+def format_table(results):
+    """
+    Format simulation results as a human-readable table.
+
+    Parameters
+    ----------
+    results: dict[str -> dict[str -> MatchupStats]]
+        The results, as returned by run_all.
+    """
+    lines = ["{:<10} {:<16} {:>7} {:>7} {:>6} {:>6} {:>6} {:>6}".format(
+        "CLASS", "ENCOUNTER", "WIN%", "ROUNDS", "STR", "DEX", "WIS", "SOUL")]
+    for classname, matchups in results.items():
+        for name, stats in matchups.items():
+            data = stats.to_dict()
+            loss = data["avg_stat_loss"]
+            lines.append("{:<10} {:<16} {:>6.1f}% {:>7.2f} {:>6.2f} {:>6.2f} {:>6.2f} {:>6.2f}".format(
+                classname, name, data["win_rate"] * 100, data["avg_rounds"],
+                loss["STR"], loss["DEX"], loss["WIS"], loss["SOUL"]))
+    return "\n".join(lines)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate combat between every class and enemy.")
+    parser.add_argument("-n", "--runs", type=int, default=1000,
+        help="number of encounters to simulate per matchup")
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--attack-policy", choices=sorted(ATTACK_POLICIES), default="greedy")
+    parser.add_argument("--reaction-policy", choices=sorted(REACTION_POLICIES), default="best")
+    parser.add_argument("--encounter", nargs="+", metavar="ENEMY",
+        help="simulate a single encounter with these enemies instead of every enemy")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+    gameworld = main.load_content()
+    if args.encounter:
+        enemynames = [name.upper() for name in args.encounter]
+        for name in enemynames:
+            if name not in gameworld.enemy_prototypes:
+                parser.error("unknown enemy '{}'".format(name))
+        encounters = {"+".join(enemynames): enemynames}
+    else:
+        encounters = {name: [name] for name in gameworld.enemydefs}
+    results = run_all(gameworld, encounters, args.runs,
+        ATTACK_POLICIES[args.attack_policy], REACTION_POLICIES[args.reaction_policy],
+        random.Random(args.seed))
+    if args.json:
+        print(json.dumps({classname: {name: stats.to_dict() for name, stats in matchups.items()}
+            for classname, matchups in results.items()}, indent=4))
+    else:
+        print(format_table(results))
+
+if __name__ == '__main__':
+    main_cli()
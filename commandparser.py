@@ -0,0 +1,200 @@
+"""
+Name lookup for player commands.
+
+Verbs, exits, objects and enemies are stored in tries, so that the player can
+type any unambiguous abbreviation of a name (e.g. 'mo n' for 'move north').
+Looking a name up takes time proportional to the length of the input, no
+matter how many names there are.
+"""
+
+# Returned by Trie.find when more than one name starts with the input
+AMBIGUOUS = object()
+
+# Names that can be used in place of a verb
+VERB_SYNONYMS = {
+    "go": "move",
+    "walk": "move",
+    "l": "look",
+    "x": "look",
+    "examine": "look",
+    "inspect": "look",
+    "get": "take",
+    "grab": "take",
+    "i": "inventory",
+    "inv": "inventory",
+    "fight": "attack",
+    "hit": "attack",
+}
+
+# Names that can be used in place of an exit, if the room has that exit
+EXIT_SYNONYMS = {
+    "n": "north",
+    "s": "south",
+    "e": "east",
+    "w": "west",
+    "u": "up",
+    "d": "down",
+    "in": "inside",
+    "out": "outside",
+}
+
+def normalize(text):
+    """
+    Get the form of a name that is stored in a trie: lowercase, with words
+    separated by single spaces.
+    """
+    return " ".join(text.lower().split())
+
+class _Node:
+    __slots__ = ("children", "value", "unique")
+    def __init__(self):
+        self.children = {}
+        # The value of the name that ends at this node, or None
+        self.value = None
+        # The only value of every name that starts with this node's prefix,
+        # or AMBIGUOUS if there are several
+        self.unique = None
+
+class Trie:
+    """
+    Maps names to values. A name can be found by typing all of it, or any
+    prefix that only one value's names start with. A value may have several
+    names, e.g. synonyms.
+
+    Names are normalized (see normalize) when they are added and found.
+    """
+    __slots__ = ("_root", "_names")
+    def __init__(self, names=None):
+        """
+        Parameters
+        ----------
+        names: dict[str -> any]
+            Names to add.
+        """
+        self._root = _Node()
+        self._names = {}
+        if names != None:
+            for name, value in names.items():
+                self.add(name, value)
+    def add(self, name, value):
+        """
+        Add a name. If the name was already added, it keeps its first value.
+
+        Parameters
+        ----------
+        name: str
+            The name.
+        value: any
+            The value to find the name by; must not be None.
+        """
+        name = normalize(name)
+        if len(name) == 0 or name in self._names:
+            return
+        self._names[name] = value
+        node = self._root
+        path = [node]
+        for c in name:
+            child = node.children.get(c)
+            if child == None:
+                child = _Node()
+                node.children[c] = child
+            node = child
+            path.append(node)
+        node.value = value
+        for node in path:
+            if node.unique == None:
+                node.unique = value
+            elif node.unique is not AMBIGUOUS and node.unique != value:
+                node.unique = AMBIGUOUS
+    def find(self, text):
+        """
+        Find the value of a name. Returns the value of the name if text is a
+        whole name, otherwise the value of the names that start with text.
+        Returns AMBIGUOUS if names with different values start with text,
+        and None if no name does.
+
+        Parameters
+        ----------
+        text: str
+            The name or abbreviation that the player typed.
+        """
+        text = normalize(text)
+        if len(text) == 0:
+            return None
+        node = self._root
+        for c in text:
+            node = node.children.get(c)
+            if node == None:
+                return None
+        if node.value != None:
+            return node.value
+        return node.unique
+    def __contains__(self, name):
+        return normalize(name) in self._names
+    def __len__(self):
+        return len(self._names)
+
+def add_with_words(trie, name, value):
+    """
+    Add a name, and every trailing part of it that starts at a word, e.g.
+    'massive spider' and 'spider'.
+    """
+    words = normalize(name).split(" ")
+    for i in range(len(words)):
+        trie.add(" ".join(words[i:]), value)
+
+def build_exit_index(exits):
+    """
+    Build the trie of a room's exits, where values are exit indices.
+
+    Parameters
+    ----------
+    exits: sequence[world.Exit]
+        The room's exits.
+    """
+    trie = Trie()
+    for i, exitdata in enumerate(exits):
+        trie.add(exitdata.exit, i)
+    for synonym, name in EXIT_SYNONYMS.items():
+        for i, exitdata in enumerate(exits):
+            if normalize(exitdata.exit) == name:
+                trie.add(synonym, i)
+                break
+    return trie
+
+def build_object_index(objectnames):
+    """
+    Build the trie of a room's objects, where values are object names.
+
+    Parameters
+    ----------
+    objectnames: iterable[str]
+        The names of the room's objects.
+    """
+    trie = Trie()
+    objectnames = list(objectnames)
+    for objectname in objectnames:
+        trie.add(objectname, objectname)
+    for objectname in objectnames:
+        add_with_words(trie, objectname, objectname)
+    return trie
+
+def build_enemy_index(prototypes):
+    """
+    Build the trie of a room's enemies, where values are enemy prototypes.
+    Enemies can be found by their short name, display name or plural name.
+
+    Parameters
+    ----------
+    prototypes: iterable[gameenemy.EnemyPrototype]
+        The room's enemies.
+    """
+    trie = Trie()
+    prototypes = list(prototypes)
+    for prototype in prototypes:
+        trie.add(prototype.shortname, prototype)
+        trie.add(prototype.name, prototype)
+    for prototype in prototypes:
+        add_with_words(trie, prototype.name, prototype)
+        add_with_words(trie, prototype.nameplural, prototype)
+    return trie
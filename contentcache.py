@@ -0,0 +1,191 @@
+"""
+A cache of the game's content files.
+
+Parsing and checking every content file on each launch is wasted work when the
+files rarely change. The first launch parses the JSON files, checks them, and
+writes everything to a single bundle file with marshal. Later launches load
+the bundle with one read. Levels in the Zork schema are converted to the
+native format (see worldimport) before they are checked and cached.
+
+Each source file's modification time, size and SHA-1 hash are stored in the
+bundle. The bundle is used as is when every file's time and size still match.
+Otherwise the files are hashed; if the hashes still match (e.g. the files were
+only touched), then the bundle's times are updated, and if they don't, the
+bundle is rebuilt. Each set of files (e.g. each level) has its own bundle, and
+marshal data is only readable by the Python version that wrote it, so the
+bundle's name includes a hash of the file names and the interpreter's cache
+tag.
+
+When the files are parsed, the content can also be linked (see
+world.link_tables); the tables that linking returns are cached in the bundle
+too, so that later launches don't link the content again.
+"""
+import hashlib
+import json
+import marshal
+import os
+import sys
+import worldimport
+
+BUNDLE_VERSION = 3
+BUNDLE_DIR = "__pycache__"
+
+class ContentError(Exception):
+    """
+    Raised when the content files are invalid.
+
+    Attributes
+    ----------
+    problems: list[str]
+        Every problem that was found.
+    """
+    def __init__(self, problems):
+        super().__init__("Invalid game content:\n  " + "\n  ".join(problems))
+        self.problems = problems
+
+def _check_dict(problems, where, value):
+    if not isinstance(value, dict):
+        problems.append("{} should be an object".format(where))
+        return False
+    return True
+
+def check_content(content):
+    """
+    Check that the content has the expected shape, and return a list of
+    problems that were found.
+
+    Parameters
+    ----------
+    content: dict[str -> any]
+        The parsed content, with the keys "level", "items", "classes" and
+        "enemies".
+    """
+    problems = []
+    for key in ("level", "items", "classes", "enemies"):
+        _check_dict(problems, key, content.get(key))
+    if len(problems) > 0:
+        return problems
+    for roomname, room in content["level"].items():
+        where = "room '{}'".format(roomname)
+        if not _check_dict(problems, where, room):
+            continue
+        exits = room.get("exits", [])
+        if not isinstance(exits, list):
+            problems.append("{}: exits should be a list".format(where))
+            exits = []
+        for i, exitdata in enumerate(exits):
+            if not _check_dict(problems, "{} exit {}".format(where, i), exitdata):
+                continue
+            for key in ("exit", "target"):
+                if not isinstance(exitdata.get(key), str):
+                    problems.append("{} exit {}: missing '{}'".format(where, i, key))
+        for key in ("items", "interact"):
+            if key in room:
+                _check_dict(problems, "{}: {}".format(where, key), room[key])
+        if not isinstance(room.get("encounter", []), list):
+            problems.append("{}: encounter should be a list".format(where))
+    for key, kind in (("items", "item"), ("classes", "class"), ("enemies", "enemy")):
+        for name, value in content[key].items():
+            _check_dict(problems, "{} '{}'".format(kind, name), value)
+    return problems
+
+def _stat(path):
+    info = os.stat(path)
+    return [info.st_mtime_ns, info.st_size]
+
+def _read_bundle(path):
+    try:
+        with open(path, "rb") as bundlefile:
+            bundle = marshal.loads(bundlefile.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(bundle, dict) or bundle.get("version") != BUNDLE_VERSION:
+        return None
+    return bundle
+
+def _write_bundle(path, bundle):
+    # Write to a temporary file first, so that another process never reads a
+    # partially written bundle.
+    temppath = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temppath, "wb") as bundlefile:
+            bundlefile.write(marshal.dumps(bundle))
+        os.replace(temppath, path)
+    except OSError:
+        # The cache is optional; the game works without it.
+        try:
+            os.remove(temppath)
+        except OSError:
+            pass
+
+def bundle_path(directory, files):
+    """
+    Get the path of the bundle for content files in a directory.
+
+    Parameters
+    ----------
+    directory: str
+        The folder that contains the content files.
+    files: dict[str -> str]
+        Maps each content key (e.g. "level") to its file name.
+    """
+    key = hashlib.sha1(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(directory, BUNDLE_DIR,
+        "content.{}.{}.bundle".format(key, sys.implementation.cache_tag))
+
+def load_content_files(directory, files, use_cache=True, link=None):
+    """
+    Load content files, using the bundle if it is up to date. Raises
+    ContentError if the content is invalid, and OSError or ValueError if a file
+    can't be read or parsed.
+
+    Parameters
+    ----------
+    directory: str
+        The folder that contains the content files.
+    files: dict[str -> str]
+        Maps each content key (e.g. "level") to its file name.
+    use_cache: bool
+        If false, the bundle is neither read nor written.
+    link: function(content) -> any
+        If given, called with the content whenever the files are parsed, e.g.
+        world.link_tables. It may raise ContentError. What it returns must be
+        marshallable; it is cached with the content and returned as
+        content["tables"].
+    """
+    paths = {key: os.path.join(directory, name) for key, name in files.items()}
+    stats = {key: _stat(path) for key, path in paths.items()}
+    cachepath = bundle_path(directory, files)
+    bundle = _read_bundle(cachepath) if use_cache else None
+    if bundle != None and link != None and "tables" not in bundle["content"]:
+        # Written without linking
+        bundle = None
+    if bundle != None and bundle["files"] == files and bundle["stats"] == stats:
+        return bundle["content"]
+    sources = {}
+    hashes = {}
+    for key, path in paths.items():
+        with open(path, "rb") as sourcefile:
+            sources[key] = sourcefile.read()
+        hashes[key] = hashlib.sha1(sources[key]).hexdigest()
+    if bundle != None and bundle["files"] == files and bundle["hashes"] == hashes:
+        content = bundle["content"]
+    else:
+        content = {key: json.loads(source.decode("utf-8")) for key, source in sources.items()}
+        if isinstance(content.get("level"), dict):
+            content["level"] = worldimport.convert_level(content["level"])
+        problems = check_content(content)
+        if len(problems) > 0:
+            raise ContentError(problems)
+        if link != None:
+            content["tables"] = link(content)
+    if use_cache:
+        _write_bundle(cachepath, {
+            "version": BUNDLE_VERSION,
+            "files": files,
+            "stats": stats,
+            "hashes": hashes,
+            "content": content
+        })
+    return content
@@ -0,0 +1,193 @@
+"""
+Exact probabilities for rolls of six-sided dice.
+
+Every roll in the game is a sum of some number of d6, and every check compares
+two such sums. The distributions are computed by convolution and cached, so
+looking up a probability is a table lookup.
+"""
+import bisect
+from fractions import Fraction
+import gameutil
+
+SIDES = 6
+# Largest total bonus (item bonus plus barricade) that is precomputed. Larger
+# rolls are still supported, they are just computed on first use.
+MAX_BONUS = 6
+MAX_PRECOMPUTED_DICE = gameutil.MAX_STAT_VALUE + MAX_BONUS
+
+# _counts[n][s] is the number of ways that n dice can sum to s.
+_counts = [(1,)]
+# _cumulative[n][s] is the probability that n dice sum to s or less.
+_cumulative = [(1.0,)]
+_at_least = {}
+_greater = {}
+
+def _extend(num):
+    while len(_counts) <= num:
+        prev = _counts[-1]
+        counts = [0] * (len(prev) + SIDES)
+        for total, ways in enumerate(prev):
+            if ways != 0:
+                for face in range(1, SIDES + 1):
+                    counts[total + face] += ways
+        _counts.append(tuple(counts))
+        outcomes = SIDES ** (len(_counts) - 1)
+        cumulative = []
+        running = 0
+        for ways in counts:
+            running += ways
+            cumulative.append(running / outcomes)
+        _cumulative.append(tuple(cumulative))
+
+def distribution(num):
+    """
+    Get the distribution of the sum of 'num' dice, as a tuple where the value
+    at index s is the number of ways that the dice can sum to s. There are
+    SIDES ** num possible outcomes in total.
+
+    Parameters
+    ----------
+    num: int
+        The number of dice.
+    """
+    num = max(num, 0)
+    if num >= len(_counts):
+        _extend(num)
+    return _counts[num]
+
+def p_sum_at_least(num, total):
+    """
+    Get the probability that 'num' dice sum to at least 'total'.
+
+    Parameters
+    ----------
+    num: int
+        The number of dice.
+    total: int
+        The target sum.
+    """
+    num = max(num, 0)
+    if num >= len(_cumulative):
+        _extend(num)
+    if total <= 0:
+        return 1.0
+    cumulative = _cumulative[num]
+    if total >= len(cumulative):
+        return 0.0
+    return 1.0 - cumulative[total - 1]
+
+def _contest(num_a, num_b, strict):
+    dist_a = distribution(num_a)
+    dist_b = distribution(num_b)
+    ways = 0
+    running = 0
+    # Walk the sums of 'a' in increasing order, keeping a running total of the
+    # ways that 'b' rolls lower (or equal, if not strict).
+    b_index = 0
+    for total, count in enumerate(dist_a):
+        limit = total if strict else total + 1
+        while b_index < limit and b_index < len(dist_b):
+            running += dist_b[b_index]
+            b_index += 1
+        ways += count * running
+    return Fraction(ways, SIDES ** (max(num_a, 0) + max(num_b, 0)))
+
+def exact_p_at_least(num_a, num_b):
+    """
+    Get the exact probability that 'num_a' dice roll a sum greater than or
+    equal to 'num_b' dice, as a Fraction.
+
+    Parameters
+    ----------
+    num_a: int
+        The number of dice on the first side.
+    num_b: int
+        The number of dice on the second side.
+    """
+    return _contest(num_a, num_b, False)
+
+def exact_p_greater(num_a, num_b):
+    """
+    Get the exact probability that 'num_a' dice roll a sum strictly greater
+    than 'num_b' dice, as a Fraction.
+
+    Parameters
+    ----------
+    num_a: int
+        The number of dice on the first side.
+    num_b: int
+        The number of dice on the second side.
+    """
+    return _contest(num_a, num_b, True)
+
+def p_at_least(num_a, num_b):
+    """
+    Get the probability that 'num_a' dice roll a sum greater than or equal to
+    'num_b' dice. This is the chance that the player hits an enemy.
+
+    Parameters
+    ----------
+    num_a: int
+        The number of dice on the first side.
+    num_b: int
+        The number of dice on the second side.
+    """
+    key = (num_a, num_b)
+    value = _at_least.get(key)
+    if value == None:
+        value = float(exact_p_at_least(num_a, num_b))
+        _at_least[key] = value
+    return value
+
+def p_greater(num_a, num_b):
+    """
+    Get the probability that 'num_a' dice roll a sum strictly greater than
+    'num_b' dice. This is the chance that an enemy hits the player.
+
+    Parameters
+    ----------
+    num_a: int
+        The number of dice on the first side.
+    num_b: int
+        The number of dice on the second side.
+    """
+    key = (num_a, num_b)
+    value = _greater.get(key)
+    if value == None:
+        value = float(exact_p_greater(num_a, num_b))
+        _greater[key] = value
+    return value
+
+def sample_sum(rng, num):
+    """
+    Roll 'num' dice and return their sum, using a single random number.
+
+    Parameters
+    ----------
+    rng: random.Random
+        The random number generator to use.
+    num: int
+        The number of dice.
+    """
+    num = max(num, 0)
+    if num >= len(_cumulative):
+        _extend(num)
+    cumulative = _cumulative[num]
+    return min(bisect.bisect_right(cumulative, rng.random()), len(cumulative) - 1)
+
+def format_chance(probability):
+    """
+    Format a probability as a percentage.
+
+    Parameters
+    ----------
+    probability: float
+        The probability to format.
+    """
+    return "{:.0f}%".format(probability * 100)
+
+_extend(MAX_PRECOMPUTED_DICE)
+for _a in range(MAX_PRECOMPUTED_DICE + 1):
+    for _b in range(MAX_PRECOMPUTED_DICE + 1):
+        p_at_least(_a, _b)
+        p_greater(_a, _b)
@@ -0,0 +1,219 @@
+"""
+Graph of the exits between rooms, for finding paths.
+
+The graph is built once per world and shared. Each game keeps a Router, which
+caches a tree of shortest paths through explored rooms towards each set of
+rooms that the player has gone to. A tree leads to its rooms from every room
+that can reach them, so it stays valid wherever the player moves. It is only
+found again when the player explores a new room, or when one of the locked
+exits that the tree depends on opens or closes; flags that lock other exits,
+or no exit at all, don't affect it.
+"""
+import commandparser
+import gameflags
+
+# Number of route trees that each game keeps
+ROUTE_CACHE_SIZE = 16
+
+class ExitGraph:
+    """
+    Every room's exits, with the flags that lock them.
+
+    Attributes
+    ----------
+    edges: dict[str -> tuple[(int, str, str)]]
+        For each room, (exit index, target room, flag) for each exit. flag is
+        the name of the flag that locks the exit, or None.
+    incoming: dict[str -> tuple[(str, int, str)]]
+        For each room, (source room, exit index, flag) for each exit that
+        leads to it.
+    rooms: mapping[str -> world.Room]
+        The world's rooms, for checking whether locked exits are open.
+    room_index: commandparser.Trie
+        Finds rooms by their display name, or the end of it (e.g. 'bridge'
+        for 'Rickety bridge'), as a tuple of room names.
+    gate_mask: int
+        Bits of the boolean flags that lock exits.
+    gate_values: tuple[int]
+        Slots of the non-boolean flags that lock exits.
+    gate_extra: tuple[str]
+        Flags without a slot that lock exits.
+    """
+    __slots__ = ("edges", "incoming", "rooms", "room_index", "gate_mask", "gate_values", "gate_extra")
+    def __init__(self, level, rooms, flag_layout):
+        """
+        The graph is built from the level's data, so that rooms don't need to
+        be linked until a path goes through one of their locked exits.
+
+        Parameters
+        ----------
+        level: dict[str -> dict]
+            The level's rooms. Every exit must lead to one of them.
+        rooms: mapping[str -> world.Room]
+            The world's rooms.
+        flag_layout: gameflags.FlagLayout
+            The world's flag slots.
+        """
+        self.edges = {}
+        self.rooms = rooms
+        incoming = {roomname: [] for roomname in level}
+        gateflags = set()
+        namerooms = {}
+        for roomname, room in level.items():
+            edges = []
+            for i, exitdata in enumerate(room.get("exits", [])):
+                flag = exitdata.get("flag")
+                if flag != None:
+                    gateflags.add(flag)
+                edges.append((i, exitdata["target"], flag))
+                incoming[exitdata["target"]].append((roomname, i, flag))
+            self.edges[roomname] = tuple(edges)
+            words = commandparser.normalize(room.get("name", roomname)).split(" ")
+            for i in range(len(words)):
+                namerooms.setdefault(" ".join(words[i:]), []).append(roomname)
+        self.incoming = {roomname: tuple(sources) for roomname, sources in incoming.items()}
+        self.room_index = commandparser.Trie()
+        for name, roomnames in namerooms.items():
+            self.room_index.add(name, tuple(roomnames))
+        gate_mask = 0
+        gate_values = []
+        gate_extra = []
+        for flag in sorted(gateflags):
+            slot = flag_layout.slots.get(flag)
+            if slot == None:
+                gate_extra.append(flag)
+                continue
+            kind, index = slot
+            if kind == gameflags.KIND_BOOL:
+                gate_mask |= 1 << index
+            else:
+                gate_values.append(index)
+        self.gate_mask = gate_mask
+        self.gate_values = tuple(gate_values)
+        self.gate_extra = tuple(gate_extra)
+    def gate_state(self, flags):
+        """
+        Get the values of every flag that locks an exit. Exits are locked and
+        unlocked the same way as long as this doesn't change.
+
+        Parameters
+        ----------
+        flags: gameflags.Flags
+            A game's flags.
+        """
+        mask = self.gate_mask
+        return (flags.isset & mask, flags.bits & mask,
+            tuple(flags.values[i] for i in self.gate_values),
+            tuple(flags.extra.get(name) for name in self.gate_extra))
+
+class RouteTree:
+    """
+    The shortest paths through explored rooms towards a set of rooms.
+
+    Attributes
+    ----------
+    next_hop: dict[str -> (int, str)]
+        For each room that can reach the targets, (exit index, next room) to
+        take, or None for the targets themselves.
+    gates: tuple[(world.Exit, bool)]
+        Every locked exit that was looked at while finding the paths, and
+        whether it was open. The tree is valid as long as none of them
+        change.
+    gate_state: tuple
+        The graph's gate state (see ExitGraph.gate_state) when the tree was
+        last checked.
+    explored_version: int
+        The game's explored_version when the tree was found.
+    """
+    __slots__ = ("next_hop", "gates", "gate_state", "explored_version")
+    def __init__(self, graph, targets, explored, flags, explored_version):
+        # Breadth first search backwards from the targets, over open exits
+        # out of explored rooms
+        next_hop = {target: None for target in targets}
+        gates = {}
+        frontier = list(next_hop)
+        while len(frontier) > 0:
+            nextfrontier = []
+            for roomname in frontier:
+                for source, exitindex, flag in graph.incoming[roomname]:
+                    if source in next_hop or source not in explored:
+                        continue
+                    if flag != None:
+                        gate = graph.rooms[source].exits[exitindex]
+                        isopen = gate.is_open(flags)
+                        gates[gate] = isopen
+                        if not isopen:
+                            continue
+                    next_hop[source] = (exitindex, roomname)
+                    nextfrontier.append(source)
+            frontier = nextfrontier
+        self.next_hop = next_hop
+        self.gates = tuple(gates.items())
+        self.gate_state = graph.gate_state(flags)
+        self.explored_version = explored_version
+    def is_valid(self, graph, flags, explored_version):
+        """
+        Returns true if the paths are still the shortest ones.
+        """
+        if explored_version != self.explored_version:
+            return False
+        state = graph.gate_state(flags)
+        if state != self.gate_state:
+            for gate, isopen in self.gates:
+                if gate.is_open(flags) != isopen:
+                    return False
+            # Only exits that the tree doesn't depend on changed
+            self.gate_state = state
+        return True
+    def path_from(self, roomname):
+        """
+        Get the exit index to take in each room along the way from a room to
+        the closest target, or None if there is no open path.
+        """
+        if roomname not in self.next_hop:
+            return None
+        path = []
+        while self.next_hop[roomname] != None:
+            exitindex, roomname = self.next_hop[roomname]
+            path.append(exitindex)
+        return path
+
+class Router:
+    """
+    Finds paths for one game, caching a RouteTree for each of the last
+    ROUTE_CACHE_SIZE sets of target rooms.
+    """
+    __slots__ = ("_trees",)
+    def __init__(self):
+        self._trees = {}
+    def find_tree(self, gamedata, targets):
+        """
+        Get the up to date RouteTree towards the target rooms.
+
+        Parameters
+        ----------
+        targets: iterable[str]
+            The names of the rooms to go to.
+        """
+        graph = gamedata.world.graph
+        key = tuple(sorted(targets))
+        tree = self._trees.pop(key, None)
+        if tree == None or not tree.is_valid(graph, gamedata.flags, gamedata.explored_version):
+            tree = RouteTree(graph, key, gamedata.explored, gamedata.flags, gamedata.explored_version)
+        # Keep the most recently used trees last
+        self._trees[key] = tree
+        if len(self._trees) > ROUTE_CACHE_SIZE:
+            del self._trees[next(iter(self._trees))]
+        return tree
+    def find_path(self, gamedata, targets):
+        """
+        Find the shortest path through explored rooms from the player's room
+        to the closest of the target rooms. Returns the exit index to take in
+        each room along the way, or None if there is no open path.
+
+        Parameters
+        ----------
+        targets: iterable[str]
+            The names of the rooms to go to.
+        """
+        return self.find_tree(gamedata, targets).path_from(gamedata.room)
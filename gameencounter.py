@@ -0,0 +1,215 @@
+import gameevents
+import gameutil
+
+# Enemies of the same type take their turns together once there are at least
+# this many of them, so that large groups don't ask the player to react to
+# every single attack.
+BATCH_SIZE = 4
+# Encounters with more enemies than this remove dead enemies by swapping the
+# last enemy into their place, which doesn't keep the enemies in order.
+STABLE_REMOVE_SIZE = 64
+
+class Encounter:
+    """
+    The enemies that the player is fighting.
+
+    The number of living enemies of each type is kept up to date as enemies
+    are added and removed, so describing the encounter doesn't depend on how
+    many enemies there are. Removing an enemy takes constant time.
+
+    Attributes
+    ----------
+    enemies: list[GameEnemy]
+        The enemies. They are in the order they appeared, unless enemies were
+        removed while there were more than STABLE_REMOVE_SIZE of them.
+    counts: dict[EnemyPrototype -> int]
+        The number of enemies of each type.
+    version: int
+        Incremented whenever an enemy is added or removed.
+    """
+    __slots__ = ("enemies", "counts", "version", "_positions", "_dying", "_text")
+    def __init__(self, enemies=()):
+        self.enemies = []
+        self.counts = {}
+        self._positions = {}
+        self.version = 0
+        self._dying = []
+        self._text = None
+        for enemy in enemies:
+            self.add(enemy)
+    def _changed(self):
+        self.version += 1
+        self._text = None
+    def add(self, enemy):
+        """
+        Add an enemy.
+        """
+        self._positions[enemy] = len(self.enemies)
+        self.enemies.append(enemy)
+        self.counts[enemy.prototype] = self.counts.get(enemy.prototype, 0) + 1
+        if enemy.is_dead():
+            self._dying.append(enemy)
+        self._changed()
+    def damage(self, enemy, amount):
+        """
+        Damage an enemy. Enemies that die are removed by remove_dead.
+
+        Parameters
+        ----------
+        enemy: GameEnemy
+            The enemy to damage.
+        amount: int
+            The amount of damage.
+        """
+        if enemy.is_dead():
+            return
+        enemy.health.subtract(amount)
+        if enemy.is_dead():
+            self._dying.append(enemy)
+    def remove_dead(self):
+        """
+        Remove every dead enemy. Returns the removed enemies, in order. This
+        does nothing unless an enemy has died since the last call.
+        """
+        dead = self._dying
+        if len(dead) == 0:
+            return dead
+        self._dying = []
+        positions = self._positions
+        if len(dead) > 1:
+            dead.sort(key=positions.__getitem__)
+        if len(self.enemies) <= STABLE_REMOVE_SIZE:
+            self.enemies = [enemy for enemy in self.enemies if not enemy.is_dead()]
+            positions.clear()
+            for i, enemy in enumerate(self.enemies):
+                positions[enemy] = i
+        else:
+            enemies = self.enemies
+            # Remove from the back first, so that enemies which are swapped
+            # into place are never ones that are about to be removed.
+            for enemy in reversed(dead):
+                i = positions.pop(enemy)
+                last = enemies.pop()
+                if last is not enemy:
+                    enemies[i] = last
+                    positions[last] = i
+        for enemy in dead:
+            count = self.counts[enemy.prototype] - 1
+            if count == 0:
+                del self.counts[enemy.prototype]
+            else:
+                self.counts[enemy.prototype] = count
+        self._changed()
+        return dead
+    def find(self, prototype):
+        """
+        Find the first enemy of the given type, or None if there is no such
+        enemy. Enemies are found by name with Room.enemy_index.
+
+        Parameters
+        ----------
+        prototype: EnemyPrototype
+            The type of enemy to look for.
+        """
+        if prototype not in self.counts:
+            return None
+        for enemy in self.enemies:
+            if enemy.prototype is prototype:
+                return enemy
+        return None
+    def describe(self):
+        """
+        Describe the enemies, e.g. "2 Goblins and a Massive Spider".
+        """
+        if self._text == None:
+            groups = {}
+            for prototype, count in self.counts.items():
+                group = groups.get(prototype.name)
+                if group == None:
+                    groups[prototype.name] = [prototype.nameplural, count]
+                else:
+                    group[0] = min(group[0], prototype.nameplural)
+                    group[1] += count
+            self._text = gameutil.format_enemy_groups(sorted((name, plural, count)
+                for name, (plural, count) in groups.items()))
+        return self._text
+    def take_turns(self, gamedata):
+        """
+        Perform every enemy's turn, in order. Once there are BATCH_SIZE or
+        more enemies of the same type, they take their turns together when the
+        first of them would.
+        """
+        player = gamedata.player
+        groups = None
+        for prototype, count in self.counts.items():
+            if count >= BATCH_SIZE:
+                groups = {}
+                break
+        if groups == None:
+            for enemy in self.enemies:
+                if not player.is_dead():
+                    enemy.do_turn(gamedata)
+            return
+        for enemy in self.enemies:
+            if self.counts[enemy.prototype] >= BATCH_SIZE:
+                groups.setdefault(enemy.prototype, []).append(enemy)
+        for enemy in self.enemies:
+            if player.is_dead():
+                break
+            group = groups.get(enemy.prototype)
+            if group == None:
+                enemy.do_turn(gamedata)
+            elif len(group) > 0:
+                _take_group_turn(gamedata, group)
+                group.clear()
+    def replace(self, enemies):
+        """
+        Replace every enemy.
+        """
+        self.enemies = []
+        self.counts = {}
+        self._positions = {}
+        self._dying = []
+        for enemy in enemies:
+            self.add(enemy)
+    def __iter__(self):
+        return iter(self.enemies)
+    def __len__(self):
+        return len(self.enemies)
+    def __getitem__(self, index):
+        return self.enemies[index]
+
+def _take_group_turn(gamedata, group):
+    """
+    Perform the turns of a group of enemies of the same type. Enemies that
+    perform the same action with the same roll act together.
+    """
+    batches = {}
+    idle = []
+    # What each enemy's turn changes, so that it can be undone for enemies
+    # that never get to act
+    started = {}
+    for enemy in group:
+        started[enemy] = (enemy.curse, enemy.next_action)
+        action = enemy.begin_turn(gamedata.rng)
+        if action == None:
+            idle.append(enemy)
+        else:
+            batches.setdefault((action, action.get_batch_key(enemy)), []).append(enemy)
+    if len(idle) == 1:
+        gamedata.events.emit(gameevents.EnemyIdle(idle[0].name))
+    elif len(idle) > 1:
+        gamedata.events.emit(gameevents.EnemyIdle(idle[0].nameplural))
+    batches = list(batches.items())
+    for i, ((action, _), enemies) in enumerate(batches):
+        if gamedata.player.is_dead():
+            # The rest of the group never acts, so it keeps its curse turn
+            # and next action
+            for _, enemies in batches[i:]:
+                for enemy in enemies:
+                    enemy.curse, enemy.next_action = started[enemy]
+            break
+        if len(enemies) == 1:
+            action.use(gamedata, enemies[0])
+        else:
+            action.use_batch(gamedata, enemies)
@@ -1,3 +1,5 @@
+import dice
+import gameevents
 import gameutil
 import random
 
@@ -5,33 +7,68 @@ class EnemyAction:
     """
     Enemy Action
     """
+    __slots__ = ("next_action",)
     def __init__(self, attackname, attackdef):
         self.next_action = attackdef.get("next-action")
         if self.next_action != None:
             self.next_action = parse_enemy_action("anonymous-action", self.next_action)
-    def use(self, player, enemy):
+    def use(self, gamedata, enemy):
         """
         Use the enemy's attack
 
         Parameters
         ----------
-        player: Character
-            The player to attack
+        gamedata: GameData
+            The game state. The enemy attacks its player.
         enemy: GameEnemy
             The enemy that is attacking
         """
-        self._game_use(player, enemy)
+        self._game_use(gamedata, enemy)
         enemy.next_action = self.next_action
-    def _game_use(self, player, enemy):
+    def get_batch_key(self, enemy):
+        """
+        Get a value which is the same for enemies of the same type that can
+        use this action together, e.g. their roll.
+
+        Parameters
+        ----------
+        enemy: GameEnemy
+            The enemy that is using the action.
+        """
+        return None
+    def use_batch(self, gamedata, enemies):
+        """
+        Use the attack for a group of enemies of the same type that have the
+        same batch key (see get_batch_key) at once.
+
+        Parameters
+        ----------
+        gamedata: GameData
+            The game state. The enemies attack its player.
+        enemies: list[GameEnemy]
+            The enemies that are attacking.
+        """
+        self._game_use_batch(gamedata, enemies)
+        for enemy in enemies:
+            enemy.next_action = self.next_action
+    def _game_use(self, gamedata, enemy):
         """
         Do not call directly!
         """
-        print("Nothing to do!")
+        gamedata.io.print("Nothing to do!")
+    def _game_use_batch(self, gamedata, enemies):
+        """
+        Do not call directly!
+        """
+        for enemy in enemies:
+            self._game_use(gamedata, enemy)
 
 class EnemyAttack(EnemyAction):
     """
     Enemy attack
     """
+    __slots__ = ("description", "description_hit", "description_miss", "damage", "stats",
+        "roll", "damage_type")
     def __init__(self, attackname, attackdef):
         super().__init__(attackname, attackdef)
         self.description = attackdef.get("desc", "It attacks you")
@@ -48,41 +85,57 @@ class EnemyAttack(EnemyAction):
         if self.damage_type not in ["physical", "mental"]:
             print("WARNING: damage type '{}' not recognized.".format(self.damage_type))
             self.damage_type = "physical"
-    def _game_use(self, player, enemy):
-        print(self.description)
-        input("The {} is rolling {}d6 to attack...".format(enemy.name, self.roll))
-        dice_attack = enemy.get_attack_roll(self.roll)
+    def _game_use(self, gamedata, enemy):
+        events = gamedata.events
+        player = gamedata.player
+        dice_attack = enemy.get_attack_roll(self.roll, gamedata.rng)
+        events.emit(gameevents.EnemyAttacked(enemy, self, dice_attack))
         dice_attack_total = sum(dice_attack)
-        dice_attack_fmt = gameutil.FMT_BAD.format(' '.join((str(x) for x in dice_attack)))
-        dice_attack_total_fmt = gameutil.FMT_BAD.format(dice_attack_total)
-        print("The {} rolled [{}] = {}".format(enemy.name, dice_attack_fmt, dice_attack_total_fmt))
-        player_roll = player.get_defense_roll(self.damage_type)
-        input("Rolling {}d6 for to defend...".format(player_roll))
-        dice_player = gameutil.roll_dice(player_roll, 6)
-        dice_player_total = sum(dice_player)
-        dice_player_fmt = gameutil.FMT_GOOD.format(' '.join((str(x) for x in dice_player)))
-        dice_player_total_fmt = gameutil.FMT_GOOD.format(dice_player_total)
-        print("You rolled [{}] = {}".format(dice_player_fmt, dice_player_total_fmt))
-        if dice_attack_total > dice_player_total:
-            print(self.description_hit)
-            fmt_damage = ["{} {}".format(gameutil.FMT_BAD.format(self.damage),
-                gameutil.FMT_STAT.format(stat.upper())) for stat in self.stats]
-            print("You took {} damage!".format(gameutil.join_list_pretty(fmt_damage)))
+        player_roll = player.get_defense_roll(self.damage_type, dice_attack_total, gamedata.io)
+        dice_player = gameutil.roll_dice(player_roll, 6, gamedata.rng)
+        events.emit(gameevents.PlayerDefended(dice_player))
+        if dice_attack_total > sum(dice_player):
+            events.emit(gameevents.PlayerHit(self))
             for stat in self.stats:
                 playerstat = player.get_stat(stat)
                 playerstat.subtract(self.damage)
         else:
-            print(self.description_miss)
+            events.emit(gameevents.PlayerDodged(self))
+    def get_batch_key(self, enemy):
+        return enemy.get_attack_value(self.roll)
+    def _game_use_batch(self, gamedata, enemies):
+        events = gamedata.events
+        player = gamedata.player
+        count = len(enemies)
+        attack_dice = enemies[0].get_attack_value(self.roll)
+        events.emit(gameevents.HordeAttacked(enemies, self))
+        player_roll = player.get_defense_roll(self.damage_type, io=gamedata.io, attack_dice=attack_dice)
+        events.emit(gameevents.HordeRolled(attack_dice, player_roll))
+        # Each attack is an independent contest between the same dice, so only
+        # the exact chance that an attack hits is needed.
+        chance = dice.p_greater(attack_dice, player_roll)
+        hits = 0
+        for _ in range(count):
+            if gamedata.rng.random() < chance:
+                hits += 1
+                for stat in self.stats:
+                    player.get_stat(stat).subtract(self.damage)
+                if player.is_dead():
+                    break
+        events.emit(gameevents.HordeResolved(self, hits, count))
 
 class EnemyActionWait(EnemyAction):
     """
     Enemy wait
     """
+    __slots__ = ("description",)
     def __init__(self, attackname, attackdef):
         super().__init__(attackname, attackdef)
         self.description = attackdef.get("desc", "It attacks you")
-    def _game_use(self, player, enemy):
-        print(self.description)
+    def _game_use(self, gamedata, enemy):
+        gamedata.events.emit(gameevents.EnemyWaited(self, 1))
+    def _game_use_batch(self, gamedata, enemies):
+        gamedata.events.emit(gameevents.EnemyWaited(self, len(enemies)))
 
 def parse_enemy_action(actionname, actiondata):
     atype = actiondata.get("type")
@@ -94,30 +147,83 @@ def parse_enemy_action(actionname, actiondata):
         print("Unknown enemy attack type '{}'".format(atype))
         return None
 
-class GameEnemy:
+class EnemyPrototype:
     """
-    Game enemy
+    The parts of an enemy that are the same for every copy of it, including
+    its parsed actions. A prototype is built once per enemy definition and
+    shared by every enemy spawned from it, so neither it nor its actions may
+    be modified.
     """
+    __slots__ = ("shortname", "name", "look", "nameplural", "max_health", "description", "defense",
+        "attacks")
     def __init__(self, enemyname, enemydata):
         self.shortname = enemyname
         self.name = enemydata.get("name", enemyname)
         self.look = enemydata.get("look", "It's a {}".format(self.name))
         self.nameplural = enemydata.get("plural", self.name + "s")
-        self.health = gameutil.EnemyHealth(enemydata.get("health", 1))
+        self.max_health = enemydata.get("health", 1)
         self.description = enemydata.get("desc", "")
         self.defense = enemydata.get("defense", 1)
-        self.attacks = []
-        self.next_action = None
+        attacks = []
         if "actions" in enemydata:
             for actionname, actiondata in enemydata["actions"].items():
                 action = parse_enemy_action(actionname, actiondata)
                 if action != None:
-                    self.attacks.append(action)
+                    attacks.append(action)
+        self.attacks = tuple(attacks)
+    def spawn(self):
+        """
+        Create a new enemy from this prototype.
+        """
+        return GameEnemy(self)
+
+def build_prototypes(enemydefs):
+    """
+    Build a prototype for every enemy definition.
+
+    Parameters
+    ----------
+    enemydefs: dict[str -> dict]
+        Enemy definitions.
+    """
+    return {enemyname: EnemyPrototype(enemyname, enemydata) for enemyname, enemydata in enemydefs.items()}
+
+class GameEnemy:
+    """
+    Game enemy. Only its health, curse and next action belong to the enemy
+    itself; everything else is shared with its prototype.
+    """
+    __slots__ = ("prototype", "health", "next_action", "curse")
+    def __init__(self, prototype):
+        self.prototype = prototype
+        self.health = gameutil.EnemyHealth(prototype.max_health)
+        self.next_action = None
         # -1 is no curse.
         # Player's attack sets curses to 1. This way, curse doesn't get removed
         # for the player's next attack. Curse is also decremented *before* the
         # enemy's attack so that their attack is only cursed for 1 turn.
         self.curse = -1
+    @property
+    def shortname(self):
+        return self.prototype.shortname
+    @property
+    def name(self):
+        return self.prototype.name
+    @property
+    def look(self):
+        return self.prototype.look
+    @property
+    def nameplural(self):
+        return self.prototype.nameplural
+    @property
+    def description(self):
+        return self.prototype.description
+    @property
+    def defense(self):
+        return self.prototype.defense
+    @property
+    def attacks(self):
+        return self.prototype.attacks
     def get_defense_value(self):
         """
         Get this enemy's defense value
@@ -126,44 +232,64 @@ class GameEnemy:
         if self.curse >= 0 and defense > 1:
             defense -= 1
         return defense
-    def get_defense_roll(self):
+    def get_defense_roll(self, rng=random):
         """
         Roll defense
 
         Returns a list[int] of dice values
         """
-        return gameutil.roll_dice(self.get_defense_value(), 6)
-    def get_attack_roll(self, roll):
+        return gameutil.roll_dice(self.get_defense_value(), 6, rng)
+    def get_attack_value(self, roll):
         """
-        Roll attack
+        Get the number of dice this enemy rolls for an attack.
 
-        Returns a list[int] of dice values.
+        Parameters
+        ----------
+        roll: int
+            The attack's base roll.
         """
         if self.curse >= 0 and roll > 1:
             roll -= 1
-        return gameutil.roll_dice(roll, 6)
+        return roll
+    def get_attack_roll(self, roll, rng=random):
+        """
+        Roll attack
+
+        Returns a list[int] of dice values.
+        """
+        return gameutil.roll_dice(self.get_attack_value(roll), 6, rng)
     def is_dead(self):
         """
         Returns true if the enemy is dead
         """
         return self.health.value == 0
-    def do_turn(self, gamedata):
+    def begin_turn(self, rng=random):
         """
-        Perform this enemy's turn
+        Start this enemy's turn. Returns the action that the enemy will use,
+        or None if it can't do anything.
+
+        Parameters
+        ----------
+        rng: random.Random
+            The random number generator that picks the action.
         """
         self.curse = self.curse - 1
         if len(self.attacks) == 0:
-            print("The {} can't do anything.".format(self.name))
+            return None
+        action = self.next_action
+        self.next_action = None
+        if action == None:
+            action = rng.choice(self.attacks)
+        return action
+    def do_turn(self, gamedata):
+        """
+        Perform this enemy's turn
+        """
+        action = self.begin_turn(gamedata.rng)
+        if action == None:
+            gamedata.events.emit(gameevents.EnemyIdle(self.name))
         else:
-            if self.next_action != None:
-                a = self.next_action
-                self.next_action = None
-                a.use(gamedata.player, self)
-            elif len(self.attacks) > 0:
-                atk = random.choice(self.attacks)
-                atk.use(gamedata.player, self)
-            else:
-                print("Does nothing")
+            action.use(gamedata, self)
     def fmt_name(self):
         return gameutil.FMT_ENEMY.format(self.name)
     def __str__(self):
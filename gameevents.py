@@ -0,0 +1,564 @@
+"""
+Events that the game emits for combat and world effects.
+
+Rolls, hits, misses, curses, deaths and level effects (items given and
+removed, flags set) are emitted as events into the game's EventBus rather than
+printed. TextRenderer turns them into the text the player sees; other
+subscribers (loggers, analytics, network clients) can receive the same events
+without parsing text. A game without a TextRenderer never formats any of it,
+which is most of the cost of a fight.
+"""
+import gameutil
+
+class Event:
+    """
+    Something that happened in a game.
+    """
+    __slots__ = ()
+
+class ItemGiven(Event):
+    """
+    The player got an item from the level.
+
+    Attributes
+    ----------
+    item: gameitem.GameItem
+        The item that was given.
+    """
+    __slots__ = ("item",)
+    def __init__(self, item):
+        self.item = item
+
+class ItemRemoved(Event):
+    """
+    The level took items from the player. Not emitted if the player didn't
+    have any.
+
+    Attributes
+    ----------
+    itemname: str
+        The name of the item that was removed.
+    removeall: bool
+        True if every such item was removed, rather than one.
+    """
+    __slots__ = ("itemname", "removeall")
+    def __init__(self, itemname, removeall):
+        self.itemname = itemname
+        self.removeall = removeall
+
+class FlagSet(Event):
+    """
+    The level set a flag.
+
+    Attributes
+    ----------
+    flag: str
+        The flag's name.
+    value: any
+        The flag's new value.
+    """
+    __slots__ = ("flag", "value")
+    def __init__(self, flag, value):
+        self.flag = flag
+        self.value = value
+
+class EncounterStarted(Event):
+    """
+    The player was ambushed by the enemies in a room. The enemies are
+    described when the event is created, since the encounter changes as the
+    fight goes on.
+
+    Attributes
+    ----------
+    description: str
+        The enemies, e.g. "2 Goblins and a Massive Spider" (see
+        gameencounter.Encounter.describe).
+    counts: dict[str -> int]
+        The number of each enemy, by its name in the content, e.g. "GOBLIN".
+    """
+    __slots__ = ("description", "counts")
+    def __init__(self, description, counts):
+        self.description = description
+        self.counts = counts
+
+class AttackBegan(Event):
+    """
+    The player used an action against an enemy.
+
+    Attributes
+    ----------
+    target: gameenemy.GameEnemy
+        The enemy that is being attacked.
+    kind: str
+        "attack" or "curse".
+    """
+    __slots__ = ("target", "kind")
+    def __init__(self, target, kind):
+        self.target = target
+        self.kind = kind
+
+class PlayerRolled(Event):
+    """
+    The player rolled to attack.
+
+    Attributes
+    ----------
+    dice: list[int]
+        The value of each die.
+    stat_dice: int
+        How many of the dice came from the player's stat.
+    bonus: int
+        How many of the dice came from the action's bonus.
+    """
+    __slots__ = ("dice", "stat_dice", "bonus")
+    def __init__(self, dice, stat_dice, bonus):
+        self.dice = dice
+        self.stat_dice = stat_dice
+        self.bonus = bonus
+
+class EnemyDefended(Event):
+    """
+    An enemy rolled to defend against the player's attack.
+
+    Attributes
+    ----------
+    enemy: gameenemy.GameEnemy
+        The enemy that defended.
+    dice: list[int]
+        The value of each die.
+    """
+    __slots__ = ("enemy", "dice")
+    def __init__(self, enemy, dice):
+        self.enemy = enemy
+        self.dice = dice
+
+class EnemyDamaged(Event):
+    """
+    The player hit an enemy.
+
+    Attributes
+    ----------
+    enemy: gameenemy.GameEnemy
+        The enemy that was hit.
+    damage: int
+        The damage dealt.
+    """
+    __slots__ = ("enemy", "damage")
+    def __init__(self, enemy, damage):
+        self.enemy = enemy
+        self.damage = damage
+
+class EnemyCursed(Event):
+    """
+    The player cursed an enemy.
+
+    Attributes
+    ----------
+    enemy: gameenemy.GameEnemy
+        The enemy that was cursed.
+    turns: int
+        How many turns the curse lasts.
+    """
+    __slots__ = ("enemy", "turns")
+    def __init__(self, enemy, turns):
+        self.enemy = enemy
+        self.turns = turns
+
+class AttackMissed(Event):
+    """
+    The player's attack or curse missed an enemy.
+
+    Attributes
+    ----------
+    enemy: gameenemy.GameEnemy
+        The enemy that was missed.
+    """
+    __slots__ = ("enemy",)
+    def __init__(self, enemy):
+        self.enemy = enemy
+
+class EnemyKilled(Event):
+    """
+    An enemy died and was removed from the encounter.
+
+    Attributes
+    ----------
+    enemy: gameenemy.GameEnemy
+        The enemy that died.
+    """
+    __slots__ = ("enemy",)
+    def __init__(self, enemy):
+        self.enemy = enemy
+
+class EncounterCleared(Event):
+    """
+    The last enemy of an encounter died.
+
+    Attributes
+    ----------
+    room: str
+        The room whose encounter was beaten.
+    """
+    __slots__ = ("room",)
+    def __init__(self, room):
+        self.room = room
+
+class EnemyAttacked(Event):
+    """
+    An enemy attacked the player and rolled its attack.
+
+    Attributes
+    ----------
+    enemy: gameenemy.GameEnemy
+        The enemy that attacked.
+    action: gameenemy.EnemyActionAttack
+        The attack it used.
+    dice: list[int]
+        The value of each die.
+    """
+    __slots__ = ("enemy", "action", "dice")
+    def __init__(self, enemy, action, dice):
+        self.enemy = enemy
+        self.action = action
+        self.dice = dice
+
+class PlayerDefended(Event):
+    """
+    The player rolled to defend against an enemy's attack.
+
+    Attributes
+    ----------
+    dice: list[int]
+        The value of each die.
+    """
+    __slots__ = ("dice",)
+    def __init__(self, dice):
+        self.dice = dice
+
+class PlayerHit(Event):
+    """
+    An enemy's attack hit the player.
+
+    Attributes
+    ----------
+    action: gameenemy.EnemyActionAttack
+        The attack that hit.
+    """
+    __slots__ = ("action",)
+    def __init__(self, action):
+        self.action = action
+
+class PlayerDodged(Event):
+    """
+    An enemy's attack missed the player.
+
+    Attributes
+    ----------
+    action: gameenemy.EnemyActionAttack
+        The attack that missed.
+    """
+    __slots__ = ("action",)
+    def __init__(self, action):
+        self.action = action
+
+class HordeAttacked(Event):
+    """
+    Enemies of the same type attacked the player at once (see
+    gameencounter.BATCH_SIZE).
+
+    Attributes
+    ----------
+    enemies: list[gameenemy.GameEnemy]
+        The enemies that attacked.
+    action: gameenemy.EnemyActionAttack
+        The attack they used.
+    """
+    __slots__ = ("enemies", "action")
+    def __init__(self, enemies, action):
+        self.enemies = enemies
+        self.action = action
+
+class HordeRolled(Event):
+    """
+    The dice that each attack of a horde is decided by.
+
+    Attributes
+    ----------
+    attack_dice: int
+        The number of dice each enemy rolls to attack.
+    defense_dice: int
+        The number of dice the player rolls to defend against each.
+    """
+    __slots__ = ("attack_dice", "defense_dice")
+    def __init__(self, attack_dice, defense_dice):
+        self.attack_dice = attack_dice
+        self.defense_dice = defense_dice
+
+class HordeResolved(Event):
+    """
+    How many of a horde's attacks hit the player.
+
+    Attributes
+    ----------
+    action: gameenemy.EnemyActionAttack
+        The attack that was used.
+    hits: int
+        The number of attacks that hit.
+    count: int
+        The number of attacks.
+    """
+    __slots__ = ("action", "hits", "count")
+    def __init__(self, action, hits, count):
+        self.action = action
+        self.hits = hits
+        self.count = count
+
+class EnemyWaited(Event):
+    """
+    Enemies used an action that does nothing.
+
+    Attributes
+    ----------
+    action: gameenemy.EnemyActionWait
+        The action that was used.
+    count: int
+        The number of enemies that used it together.
+    """
+    __slots__ = ("action", "count")
+    def __init__(self, action, count):
+        self.action = action
+        self.count = count
+
+class EnemyIdle(Event):
+    """
+    Enemies had no action that they could use.
+
+    Attributes
+    ----------
+    name: str
+        The enemy's name, or the plural name if there is more than one.
+    """
+    __slots__ = ("name",)
+    def __init__(self, name):
+        self.name = name
+
+class GameWon(Event):
+    """
+    The player reached the end.
+    """
+    __slots__ = ()
+
+class PlayerDied(Event):
+    """
+    The player ran out of a stat.
+
+    Attributes
+    ----------
+    cause: str
+        The stat that ran out; see Character.get_cause_of_death.
+    fighting: bool
+        True if the player died during a fight.
+    """
+    __slots__ = ("cause", "fighting")
+    def __init__(self, cause, fighting):
+        self.cause = cause
+        self.fighting = fighting
+
+class EventBus:
+    """
+    Passes a game's events to everything that is subscribed to them.
+
+    Attributes
+    ----------
+    subscribers: list[function(Event)]
+        Called with each event, in the order they subscribed.
+    """
+    __slots__ = ("subscribers",)
+    def __init__(self):
+        self.subscribers = []
+    def subscribe(self, subscriber):
+        """
+        Call a function with every event from now on.
+        """
+        self.subscribers.append(subscriber)
+    def unsubscribe(self, subscriber):
+        """
+        Stop calling a function that was subscribed.
+        """
+        self.subscribers.remove(subscriber)
+    def emit(self, event):
+        """
+        Pass an event to every subscriber.
+        """
+        for subscriber in self.subscribers:
+            subscriber(event)
+
+def _format_dice(fmt, dice):
+    return "[{}] = {}".format(fmt.format(" ".join(str(x) for x in dice)), fmt.format(sum(dice)))
+
+def _format_damage(damage, stats):
+    fmt_damage = ["{} {}".format(gameutil.FMT_BAD.format(damage), gameutil.FMT_STAT.format(stat.upper()))
+        for stat in stats]
+    return "You took {} damage!".format(gameutil.join_list_pretty(fmt_damage))
+
+def _render_nothing(io, event):
+    pass
+
+def _render_item_given(io, event):
+    io.print(gameutil.FMT_IMPORTANT.format("You got the {}".format(event.item.name)))
+
+def _render_encounter_started(io, event):
+    io.print("You were ambushed by {}!".format(event.description))
+
+def _render_attack_began(io, event):
+    if event.kind == "curse":
+        io.print("Cursing {}".format(event.target.name))
+    else:
+        io.print("Attacking {}".format(event.target.name))
+
+def _render_player_rolled(io, event):
+    if event.bonus == 0:
+        io.pause("Rolling {}d6 to attack...".format(event.stat_dice))
+    else:
+        io.pause("Rolling {}d6 + {}d6...".format(event.stat_dice, event.bonus))
+    io.print("You rolled: {}".format(_format_dice(gameutil.FMT_GOOD, event.dice)))
+
+def _render_enemy_defended(io, event):
+    io.pause("The {} is rolling {}d6 for defense...".format(event.enemy.name, len(event.dice)))
+    io.print("The {} rolled {}".format(event.enemy.name, _format_dice(gameutil.FMT_BAD, event.dice)))
+
+def _render_enemy_damaged(io, event):
+    io.print("You hit the {} for {} damage!".format(event.enemy.name, gameutil.FMT_GOOD.format(event.damage)))
+
+def _render_enemy_cursed(io, event):
+    plural = ""
+    if event.turns > 1:
+        plural = "s"
+    io.print("You cursed the {} for {} turn{}!".format(event.enemy.name, event.turns, plural))
+
+def _render_attack_missed(io, event):
+    io.print("You missed the {}.".format(event.enemy.name))
+
+def _render_enemy_killed(io, event):
+    io.print("You killed the {}!".format(gameutil.FMT_ENEMY.format(event.enemy.name)))
+
+def _render_encounter_cleared(io, event):
+    io.print("You defeated all of the enemies!")
+    io.pause()
+
+def _render_enemy_attacked(io, event):
+    io.print(event.action.description)
+    io.pause("The {} is rolling {}d6 to attack...".format(event.enemy.name, event.action.roll))
+    io.print("The {} rolled {}".format(event.enemy.name, _format_dice(gameutil.FMT_BAD, event.dice)))
+
+def _render_player_defended(io, event):
+    io.pause("Rolling {}d6 for to defend...".format(len(event.dice)))
+    io.print("You rolled {}".format(_format_dice(gameutil.FMT_GOOD, event.dice)))
+
+def _render_player_hit(io, event):
+    io.print(event.action.description_hit)
+    io.print(_format_damage(event.action.damage, event.action.stats))
+
+def _render_player_dodged(io, event):
+    io.print(event.action.description_miss)
+
+def _render_horde_attacked(io, event):
+    io.print("{} {} attack at once!".format(len(event.enemies),
+        gameutil.FMT_ENEMY.format(event.enemies[0].nameplural)))
+    io.print(event.action.description)
+
+def _render_horde_rolled(io, event):
+    io.pause("They each roll {}d6 to attack, and you roll {}d6 to defend against each...".format(
+        event.attack_dice, event.defense_dice))
+
+def _render_horde_resolved(io, event):
+    action = event.action
+    if event.hits == 0:
+        io.print(action.description_miss)
+        io.print("All {} attacks missed you.".format(event.count))
+    else:
+        io.print(action.description_hit)
+        io.print("{} of {} attacks hit you!".format(gameutil.FMT_BAD.format(event.hits), event.count))
+        io.print(_format_damage(action.damage * event.hits, action.stats))
+
+def _render_enemy_waited(io, event):
+    if event.count == 1:
+        io.print(event.action.description)
+    else:
+        io.print("{} (x{})".format(event.action.description, event.count))
+
+def _render_enemy_idle(io, event):
+    io.print("The {} can't do anything.".format(event.name))
+
+def _render_game_won(io, event):
+    io.print("Congratulations, you win!")
+    io.pause()
+
+# What is printed when the player dies, by cause of death and whether they
+# were fighting
+_DEATH_TEXT = {
+    ("str", False): ["You perish from your physical injuries.",
+        "Congratulations, your death wasn't slow and painful!"],
+    ("dex", True): ["You fall to the ground and are unable to get back up.",
+        "Unable to defend yourself any longer, your enemies finish you off.",
+        "Congratulations, you died with honor!"],
+    ("dex", False): ["You fall to the ground and are unable to get back up.",
+        "You lay in place in agony, and eventually die of dehydration.",
+        "Congratulations, your body decomposed peacefully!"],
+    ("wis", True): ["You lose the will to defend yourself, and you stare blankly as your enemies finish you off.",
+        "Congratulations, you... uh, at least you tried?"],
+    ("wis", False): ["You lose the will to continue onward, and you run back home.",
+        "Congratulations, you lived!"],
+    ("soul", False): ["You succumb to the darkness. You slowly feel your soul start to slip away,\n"
+        "and another one takes its place.",
+        "Congratulations, your body is still technically alive!"]
+}
+_DEATH_TEXT[("str", True)] = _DEATH_TEXT[("str", False)]
+_DEATH_TEXT[("soul", True)] = _DEATH_TEXT[("soul", False)]
+
+def _render_player_died(io, event):
+    for line in _DEATH_TEXT.get((event.cause, event.fighting), []):
+        io.print(gameutil.FMT_IMPORTANT.format(line))
+    io.pause()
+
+_RENDERERS = {
+    ItemGiven: _render_item_given,
+    ItemRemoved: _render_nothing,
+    FlagSet: _render_nothing,
+    EncounterStarted: _render_encounter_started,
+    AttackBegan: _render_attack_began,
+    PlayerRolled: _render_player_rolled,
+    EnemyDefended: _render_enemy_defended,
+    EnemyDamaged: _render_enemy_damaged,
+    EnemyCursed: _render_enemy_cursed,
+    AttackMissed: _render_attack_missed,
+    EnemyKilled: _render_enemy_killed,
+    EncounterCleared: _render_encounter_cleared,
+    EnemyAttacked: _render_enemy_attacked,
+    PlayerDefended: _render_player_defended,
+    PlayerHit: _render_player_hit,
+    PlayerDodged: _render_player_dodged,
+    HordeAttacked: _render_horde_attacked,
+    HordeRolled: _render_horde_rolled,
+    HordeResolved: _render_horde_resolved,
+    EnemyWaited: _render_enemy_waited,
+    EnemyIdle: _render_enemy_idle,
+    GameWon: _render_game_won,
+    PlayerDied: _render_player_died
+}
+
+class TextRenderer:
+    """
+    Writes events to an IO as the text the player reads. Events of types it
+    doesn't know are ignored.
+
+    Attributes
+    ----------
+    io: GameIO
+        Where the text is written.
+    """
+    __slots__ = ("io",)
+    def __init__(self, io):
+        self.io = io
+    def __call__(self, event):
+        _RENDERERS.get(type(event), _render_nothing)(self.io, event)
@@ -0,0 +1,154 @@
+"""
+Story flags.
+
+Every flag that the content uses is found when the world is loaded, and given
+a slot in a FlagLayout. Flags that are only ever set to true or false are
+packed into a bitset; other flags get a slot in a list of values. A game's
+flags are then a Flags object, which is only a few bytes for boolean flags.
+"""
+
+KIND_BOOL = 0
+KIND_VALUE = 1
+
+# The value of a value slot whose flag hasn't been set
+_UNSET = object()
+
+def _slot_get_bool(flags, index, default):
+    mask = 1 << index
+    if flags.isset & mask:
+        return (flags.bits & mask) != 0
+    return default
+
+def _slot_set_bool(flags, index, value):
+    mask = 1 << index
+    flags.isset |= mask
+    if value:
+        flags.bits |= mask
+    else:
+        flags.bits &= ~mask
+
+def _slot_get_value(flags, index, default):
+    value = flags.values[index]
+    if value is _UNSET:
+        return default
+    return value
+
+def _slot_set_value(flags, index, value):
+    flags.values[index] = value
+
+_GETTERS = (_slot_get_bool, _slot_get_value)
+_SETTERS = (_slot_set_bool, _slot_set_value)
+
+class FlagLayout:
+    """
+    Assigns a slot to every flag that is used by the content.
+
+    Attributes
+    ----------
+    bool_names: tuple[str]
+        Names of the boolean flags. A name's index is its bit.
+    value_names: tuple[str]
+        Names of the other flags. A name's index is its slot in Flags.values.
+    slots: dict[str -> (int, int)]
+        The kind (KIND_BOOL or KIND_VALUE) and index of each flag.
+    """
+    __slots__ = ("bool_names", "value_names", "slots")
+    def __init__(self, flagvalues):
+        """
+        Parameters
+        ----------
+        flagvalues: dict[str -> list]
+            Every flag name, and every value that the content sets it to.
+        """
+        bool_names = []
+        value_names = []
+        for name in sorted(flagvalues):
+            if all(value is True or value is False for value in flagvalues[name]):
+                bool_names.append(name)
+            else:
+                value_names.append(name)
+        self.bool_names = tuple(bool_names)
+        self.value_names = tuple(value_names)
+        self.slots = {}
+        for i, name in enumerate(bool_names):
+            self.slots[name] = (KIND_BOOL, i)
+        for i, name in enumerate(value_names):
+            self.slots[name] = (KIND_VALUE, i)
+    def accessors(self, name):
+        """
+        Get functions that read and write a flag, for use by compiled actions.
+        Returns (get, set, index), where get(flags, index, default) reads the
+        flag and set(flags, index, value) writes it. Returns None if the flag
+        has no slot.
+
+        Parameters
+        ----------
+        name: str
+            The flag's name.
+        """
+        if name not in self.slots:
+            return None
+        kind, index = self.slots[name]
+        return _GETTERS[kind], _SETTERS[kind], index
+
+class Flags:
+    """
+    The values of a game's flags.
+
+    Attributes
+    ----------
+    layout: FlagLayout
+        The slot of each flag.
+    isset: int
+        Bitset of the boolean flags that have been set.
+    bits: int
+        Bitset of the boolean flags' values.
+    values: list
+        Values of the other flags.
+    extra: dict[str -> any]
+        Flags that have no slot, e.g. ones set by actions that were compiled
+        while the game was running.
+    """
+    __slots__ = ("layout", "isset", "bits", "values", "extra")
+    def __init__(self, layout):
+        self.layout = layout
+        self.isset = 0
+        self.bits = 0
+        self.values = [_UNSET] * len(layout.value_names)
+        self.extra = {}
+    def get(self, name, default=None):
+        """
+        Get a flag's value by its name, or default if it hasn't been set.
+        """
+        slot = self.layout.slots.get(name)
+        if slot == None:
+            return self.extra.get(name, default)
+        return _GETTERS[slot[0]](self, slot[1], default)
+    def set(self, name, value):
+        """
+        Set a flag's value by its name.
+        """
+        slot = self.layout.slots.get(name)
+        if slot == None:
+            self.extra[name] = value
+        else:
+            _SETTERS[slot[0]](self, slot[1], value)
+    def value_items(self):
+        """
+        Get (index, value) for each value slot that has been set.
+        """
+        return [(i, value) for i, value in enumerate(self.values) if value is not _UNSET]
+    def items(self):
+        """
+        Get (name, value) for every flag that has been set.
+        """
+        layout = self.layout
+        result = [(name, (self.bits >> i & 1) != 0) for i, name in enumerate(layout.bool_names)
+            if self.isset >> i & 1]
+        result.extend((layout.value_names[i], value) for i, value in self.value_items())
+        result.extend(self.extra.items())
+        return result
+    def __contains__(self, name):
+        return self.get(name, _UNSET) is not _UNSET
+    def __len__(self):
+        return len(self.items())
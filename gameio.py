@@ -0,0 +1,196 @@
+import builtins
+import hashlib
+import json
+
+class GameIO:
+    """
+    Where the game reads player input from and writes its output to.
+
+    Attributes
+    ----------
+    interactive: bool
+        If false, then pauses (e.g. "Press enter to continue...") do not wait
+        for input.
+    chooser: function(options, cancancel, prompt) -> int
+        If set, answers the game's menus (see gameutil.choose_index_from_list)
+        instead of the player: it is given the options, whether the menu can
+        be cancelled and the menu's prompt, and returns the index of the
+        chosen option, or None to cancel. The menu isn't written.
+    """
+    def __init__(self, interactive=True):
+        self.interactive = interactive
+        self.chooser = None
+    def print(self, *args, sep=" ", end="\n"):
+        """
+        Write output. Same arguments as the builtin print.
+        """
+        pass
+    def input(self, prompt=""):
+        """
+        Read a line of input. Raises EOFError if there is no more input.
+
+        Parameters
+        ----------
+        prompt: str
+            The prompt to show before reading.
+        """
+        raise EOFError()
+    def pause(self, prompt="Press enter to continue..."):
+        """
+        Wait for the player to press enter, unless this IO is not interactive.
+
+        Parameters
+        ----------
+        prompt: str
+            The prompt to show.
+        """
+        if self.interactive:
+            self.input(prompt)
+        else:
+            self.print(prompt)
+
+class TerminalIO(GameIO):
+    """
+    Reads from and writes to the terminal.
+    """
+    def print(self, *args, sep=" ", end="\n"):
+        builtins.print(*args, sep=sep, end=end)
+    def input(self, prompt=""):
+        return builtins.input(prompt)
+
+class ScriptedIO(GameIO):
+    """
+    Reads input from a list of lines and stores output in memory.
+
+    Attributes
+    ----------
+    lines: list[str]
+        The input lines that have not been read yet.
+    output: list[str]
+        Every piece of output that has been written, including prompts.
+    echo: bool
+        If true, then each input line is written to the output after its
+        prompt, like it would appear on a terminal.
+    """
+    def __init__(self, lines, interactive=False, echo=True):
+        super().__init__(interactive)
+        self.lines = list(lines)
+        self.lines.reverse()
+        self.output = []
+        self.echo = echo
+    def print(self, *args, sep=" ", end="\n"):
+        self.output.append(sep.join(str(x) for x in args) + end)
+    def input(self, prompt=""):
+        self.output.append(prompt)
+        if len(self.lines) == 0:
+            raise EOFError()
+        line = self.lines.pop()
+        if self.echo:
+            self.output.append(line + "\n")
+        return line
+    def get_output(self):
+        """
+        Get everything that has been written as a single string.
+        """
+        return "".join(self.output)
+
+class NullIO(GameIO):
+    """
+    Reads input from a list of lines and discards all output.
+    """
+    def __init__(self, lines=(), interactive=False):
+        super().__init__(interactive)
+        self.lines = list(lines)
+        self.lines.reverse()
+    def input(self, prompt=""):
+        if len(self.lines) == 0:
+            raise EOFError()
+        return self.lines.pop()
+    def pause(self, prompt="Press enter to continue..."):
+        if self.interactive:
+            self.input(prompt)
+
+class RecordingIO(GameIO):
+    """
+    Passes everything through to another IO, while recording each line of
+    input and a digest of everything that is written.
+
+    If given a log file, the session is written to it as JSON lines: first an
+    object with the game's seed and level, then each input line as a string
+    as soon as it is read, and finally an object with the digest once close
+    is called. replay.py plays such a log again.
+
+    Attributes
+    ----------
+    inner: GameIO
+        The IO that is being recorded.
+    lines: list[str]
+        Every line of input that has been read, not counting pauses.
+    logfile: file
+        The text file that the session is written to, or None.
+    """
+    def __init__(self, inner, logfile=None, seed=None, level=None):
+        super().__init__(inner.interactive)
+        self.inner = inner
+        self.lines = []
+        self.logfile = logfile
+        self._digest = hashlib.sha1()
+        if logfile != None:
+            self._write({"seed": seed, "level": level})
+    def _write(self, value):
+        self.logfile.write(json.dumps(value) + "\n")
+        self.logfile.flush()
+    def print(self, *args, sep=" ", end="\n"):
+        self._digest.update((sep.join(str(x) for x in args) + end).encode("utf-8"))
+        self.inner.print(*args, sep=sep, end=end)
+    def input(self, prompt=""):
+        self._digest.update(prompt.encode("utf-8"))
+        line = self.inner.input(prompt)
+        self.lines.append(line)
+        if self.logfile != None:
+            self._write(line)
+        return line
+    def pause(self, prompt="Press enter to continue..."):
+        # Pauses are recorded the same way whether or not they wait, so a
+        # session played on a terminal replays the same without waiting.
+        self._digest.update(prompt.encode("utf-8"))
+        self.inner.pause(prompt)
+    def digest(self):
+        """
+        Get a digest of everything that has been written so far, including
+        prompts. The same game with the same input always has the same digest.
+        """
+        return self._digest.hexdigest()
+    def mark(self):
+        """
+        Get a mark of everything that has been recorded so far, for rewind.
+        """
+        position = None
+        if self.logfile != None:
+            position = self.logfile.tell()
+        return (len(self.lines), self._digest.copy(), position)
+    def rewind(self, mark):
+        """
+        Forget everything that was recorded after a mark was taken, e.g. when
+        a game is restored to how it was at that time.
+
+        Parameters
+        ----------
+        mark: tuple
+            The mark, as returned by mark.
+        """
+        count, digest, position = mark
+        del self.lines[count:]
+        self._digest = digest.copy()
+        if position != None:
+            self.logfile.seek(position)
+            self.logfile.truncate()
+    def close(self):
+        """
+        Write the digest to the log file, if there is one.
+        """
+        if self.logfile != None:
+            self._write({"digest": self.digest()})
+
+# Used by functions that are not given an IO to use.
+TERMINAL = TerminalIO()
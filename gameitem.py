@@ -1,12 +1,40 @@
+import dice
+import gameevents
 import gameutil
-import random
 
-def choose_enemy(gamedata):
+def choose_enemy(gamedata, attack_dice=None):
     """
     Choose an enemy to attack
+
+    Parameters
+    ----------
+    attack_dice: int
+        The number of dice that the player will roll to attack. If given, the
+        chance to hit each enemy is shown.
     """
+    descriptions = None
+    if attack_dice != None:
+        descriptions = [dice.format_chance(dice.p_at_least(attack_dice, enemy.get_defense_value()))
+            + " to hit" for enemy in gamedata.encounter]
     return gameutil.choose_from_list(gamedata.encounter, True,
-        "Choose an enemy to attack", None, gameutil.FMT_NONE)
+        "Choose an enemy to attack", descriptions, gameutil.FMT_NONE, gamedata.io)
+
+def get_stat_dice(stat, stat_negate):
+    """
+    Get the number of dice that a player stat contributes to a roll.
+
+    Parameters
+    ----------
+    stat: CharacterStat
+        The player's stat, or None if the roll does not use a stat.
+    stat_negate: bool
+        If true, the stat is negated to (stat.maxvalue - stat.value + 1).
+    """
+    if stat == None:
+        return 0
+    if stat_negate:
+        return stat.maxvalue - stat.value + 1
+    return stat.value
 
 ATTACK_MISS = 0
 ATTACK_HIT = 1
@@ -29,32 +57,13 @@ def try_attack_enemy(gamedata, target, stat, stat_negate, attack_bonus):
     attack_bonus: int
         The attack bonus.
     """
-    player_stat = gamedata.player.get_stat(stat, False)
-    dice_stat = None
-    player_stat_value = 0
-    if player_stat != None:
-        if stat_negate:
-            player_stat_value = player_stat.maxvalue - player_stat.value + 1
-        else:
-            player_stat_value = player_stat.value
-        dice_stat = gameutil.roll_dice(player_stat_value + attack_bonus, 6)
-    else:
-        dice_stat = gameutil.roll_dice(attack_bonus, 6)
-    if attack_bonus == 0:
-        input("Rolling {}d6 to attack...".format(player_stat_value))
-    else:
-        input("Rolling {}d6 + {}d6...".format(player_stat_value, attack_bonus))
-    fmt_stat = gameutil.FMT_GOOD.format(' '.join((str(x) for x in dice_stat)))
-    roll_total = sum(dice_stat)
-    fmt_roll_total = gameutil.FMT_GOOD.format(roll_total)
-    print("You rolled: [{}] = {}".format(fmt_stat, fmt_roll_total))
-    input("The {} is rolling {}d6 for defense...".format(target.name, target.get_defense_value()))
-    target_dice = target.get_defense_roll()
-    target_roll_total = sum(target_dice)
-    fmt_target = gameutil.FMT_BAD.format(' '.join((str(x) for x in target_dice)))
-    fmt_target_roll_total = gameutil.FMT_BAD.format(target_roll_total)
-    print("The {} rolled [{}] = {}".format(target.name, fmt_target, fmt_target_roll_total))
-    if roll_total >= target_roll_total:
+    player_stat = gamedata.player.get_stat(stat, False, io=gamedata.io)
+    player_stat_value = get_stat_dice(player_stat, stat_negate)
+    dice_stat = gameutil.roll_dice(player_stat_value + attack_bonus, 6, gamedata.rng)
+    gamedata.events.emit(gameevents.PlayerRolled(dice_stat, player_stat_value, attack_bonus))
+    target_dice = target.get_defense_roll(gamedata.rng)
+    gamedata.events.emit(gameevents.EnemyDefended(target, target_dice))
+    if sum(dice_stat) >= sum(target_dice):
         return ATTACK_HIT
     else:
         return ATTACK_MISS
@@ -63,6 +72,7 @@ class GameAction:
     """
     A game action. Can be a use item, attack, defend, etc.
     """
+    __slots__ = ("name", "info", "single_use", "parentitem")
     def __init__(self, attackname, parentitem, attackdef):
         self.name = attackdef.get("name", attackname)
         self.info = attackdef.get("info")
@@ -73,6 +83,17 @@ class GameAction:
         Format the action's information
         """
         return ""
+    def get_attack_dice(self, player):
+        """
+        Get the number of dice that the player would roll to attack with this
+        action, or None if it can't be known before the action is used.
+
+        Parameters
+        ----------
+        player: Character
+            The player
+        """
+        return None
     def get_defense(self, player):
         """
         Get the defense roll.
@@ -93,18 +114,25 @@ class GameAction:
             The damage type to resist.
         """
         return False
-    def use(self, gamedata):
+    def use(self, gamedata, item=None):
         """
         Use this item.
+
+        Parameters
+        ----------
+        item: GameItem
+            The copy of the item that is being used (see
+            Inventory.get_use_items and get_attack_items). If the action is
+            single use, this copy is removed.
         """
         self._game_use(gamedata, {})
-        if self.single_use:
-            gamedata.player.inventory.remove(self.parentitem)
+        if self.single_use and item != None:
+            gamedata.player.inventory.remove(item)
     def _game_use(self, gamedata, shared):
         """
         Please don't use this method directly.
         """
-        print("Nothing to do.")
+        gamedata.io.print("Nothing to do.")
     def __str__(self):
         info = self.format_info().strip()
         if info != "":
@@ -121,6 +149,7 @@ class GameActionAttack(GameAction):
     """
     Attack action
     """
+    __slots__ = ("target", "random_count", "stat", "stat_negate", "bonus", "damage")
     def __init__(self, attackname, parentitem, attackdef):
         super().__init__(attackname, parentitem, attackdef)
         self.target = attackdef.get("target", "single")
@@ -139,14 +168,18 @@ class GameActionAttack(GameAction):
             return gameutil.FMT_STAT.format(c + self.stat.upper())
         else:
             return gameutil.FMT_STAT.format(c + self.stat.upper()) + "+" + str(self.bonus)
+    def get_attack_dice(self, player):
+        if self.stat == "choose":
+            return None
+        return get_stat_dice(player.get_stat(self.stat), self.stat_negate) + self.bonus
     def _attack(self, gamedata, target):
-        print("Attacking {}".format(target.name))
+        gamedata.events.emit(gameevents.AttackBegan(target, "attack"))
         status = try_attack_enemy(gamedata, target, self.stat, self.stat_negate, self.bonus)
         if status == ATTACK_HIT:
-            print("You hit the {} for {} damage!".format(target.name, gameutil.FMT_GOOD.format(self.damage)))
-            target.health.subtract(self.damage)
+            gamedata.events.emit(gameevents.EnemyDamaged(target, self.damage))
+            gamedata.encounter.damage(target, self.damage)
         elif status == ATTACK_MISS:
-            print("You missed the {}.".format(target.name))
+            gamedata.events.emit(gameevents.AttackMissed(target))
         else:
             return False
         return True
@@ -155,7 +188,7 @@ class GameActionAttack(GameAction):
             # Theoretically could be used so that a single attack could hit twice
             target = shared.get("target")
             if target == None:
-                target = choose_enemy(gamedata)
+                target = choose_enemy(gamedata, self.get_attack_dice(gamedata.player))
                 if target == None:
                     return False
                 shared["target"] = target
@@ -166,18 +199,19 @@ class GameActionAttack(GameAction):
         elif self.target == "random":
             for _i in range(self.random_count):
                 if len(gamedata.encounter) > 0:
-                    enemy = random.choice(gamedata.encounter)
+                    enemy = gamedata.rng.choice(gamedata.encounter)
                     self._attack(gamedata, enemy)
                     gamedata.remove_dead_enemies()
                 else:
                     break
         else:
-            print("Unknown target value '{}'".format(self.target))
+            gamedata.io.print("Unknown target value '{}'".format(self.target))
 
 class GameActionCurse(GameAction):
     """
     Curse action
     """
+    __slots__ = ("target", "stat", "stat_negate", "bonus", "amount")
     def __init__(self, attackname, parentitem, attackdef):
         super().__init__(attackname, parentitem, attackdef)
         self.target = attackdef.get("target", "single")
@@ -195,24 +229,25 @@ class GameActionCurse(GameAction):
             return gameutil.FMT_STAT.format(c + self.stat.upper())
         else:
             return gameutil.FMT_STAT.format(c + self.stat.upper()) + "+" + str(self.bonus)
+    def get_attack_dice(self, player):
+        if self.stat == "choose":
+            return None
+        return get_stat_dice(player.get_stat(self.stat), self.stat_negate) + self.bonus
     def _game_use(self, gamedata, shared):
         # Theoretically could be used so that a single attack could hit twice
         target = shared.get("target")
         if target == None:
-            target = choose_enemy(gamedata)
+            target = choose_enemy(gamedata, self.get_attack_dice(gamedata.player))
             if target == None:
                 return False
             shared["target"] = target
-        print("Cursing {}".format(target.name))
+        gamedata.events.emit(gameevents.AttackBegan(target, "curse"))
         status = try_attack_enemy(gamedata, target, self.stat, self.stat_negate, self.bonus)
         if status == ATTACK_HIT:
-            plural = ""
-            if self.amount > 1:
-                plural = "s"
-            print("You cursed the {} for {} turn{}!".format(target.name, self.amount, plural))
+            gamedata.events.emit(gameevents.EnemyCursed(target, self.amount))
             target.curse = max(target.curse, self.amount)
         elif status == ATTACK_MISS:
-            print("You missed the {}.".format(target.name))
+            gamedata.events.emit(gameevents.AttackMissed(target))
         else:
             return False
         return True
@@ -221,6 +256,7 @@ class GameActionDefend(GameAction):
     """
     Defend action
     """
+    __slots__ = ("stat", "stat_negate", "bonus", "resist")
     def __init__(self, attackname, parentitem, attackdef):
         super().__init__(attackname, parentitem, attackdef)
         self.stat = attackdef.get("stat", "none").lower()
@@ -241,14 +277,7 @@ class GameActionDefend(GameAction):
         else:
             return gameutil.FMT_STAT.format(c + self.stat.upper()) + "+" + str(self.bonus)
     def get_defense(self, player):
-        stat = player.get_stat(self.stat)
-        value = 0
-        if stat != None:
-            if self.stat_negate:
-                value = stat.maxvalue - stat.value + 1
-            else:
-                value = stat.value
-        return value + self.bonus
+        return get_stat_dice(player.get_stat(self.stat), self.stat_negate) + self.bonus
     def does_resist(self, typename):
         return self.resist == "all" or self.resist == typename
 
@@ -256,6 +285,7 @@ class GameActionHeal(GameAction):
     """
     Heal action
     """
+    __slots__ = ("stat", "amount")
     def __init__(self, attackname, parentitem, attackdef):
         super().__init__(attackname, parentitem, attackdef)
         self.stat = attackdef.get("stat", "none").lower()
@@ -263,7 +293,7 @@ class GameActionHeal(GameAction):
     def format_info(self):
         return "+{}".format(gameutil.FMT_GOOD.format(self.amount))
     def _game_use(self, gamedata, shared):
-        stat = gamedata.player.get_stat(self.stat, True, "Choose a stat to heal")
+        stat = gamedata.player.get_stat(self.stat, True, "Choose a stat to heal", gamedata.io)
         if stat != None:
             stat.add(self.amount)
             return True
@@ -273,6 +303,7 @@ class GameActionBarricade(GameAction):
     """
     Barricade action
     """
+    __slots__ = ("amount",)
     def __init__(self, attackname, parentitem, attackdef):
         super().__init__(attackname, parentitem, attackdef)
         self.amount = attackdef.get("amount", 1)
@@ -299,17 +330,20 @@ def generate_abilities(actions, item, itemlist):
         else:
             print("Unrecognized attack type '{}'".format(atype))
 
-class GameItem:
+class ItemPrototype:
     """
-    A game item
+    The parts of an item that are the same for every copy of it. A prototype
+    is built once per item definition and shared by every GameItem made from
+    it, along with its actions, so it must not be modified.
     """
+    __slots__ = ("fullname", "name", "weight", "max_durability", "desc", "unlisted", "actions",
+        "attacks", "reactions")
     def __init__(self, itemname, itemdef):
         self.fullname = itemname
         self.name = itemdef.get("name", itemname)
         self.weight = itemdef.get("weight", 0)
         self.max_durability = itemdef.get("durability", 1)
         self.desc = itemdef.get("desc", "")
-        self.durability = self.max_durability
         self.unlisted = itemdef.get("unlisted", False)
         self.actions = {}
         self.attacks = {}
@@ -319,4 +353,57 @@ class GameItem:
         if "actions" in itemdef:
             generate_abilities(self.actions, self, itemdef["actions"])
         if "reactions" in itemdef:
-            generate_abilities(self.reactions, self, itemdef["reactions"])
\ No newline at end of file
+            generate_abilities(self.reactions, self, itemdef["reactions"])
+    def create(self):
+        """
+        Create a new item from this prototype.
+        """
+        return GameItem(self)
+
+class GameItem:
+    """
+    A game item. Only its durability belongs to the item itself; everything
+    else is shared with the other items made from the same prototype.
+    """
+    __slots__ = ("prototype", "durability")
+    def __init__(self, prototype):
+        self.prototype = prototype
+        self.durability = prototype.max_durability
+    @property
+    def fullname(self):
+        return self.prototype.fullname
+    @property
+    def name(self):
+        return self.prototype.name
+    @property
+    def weight(self):
+        return self.prototype.weight
+    @property
+    def max_durability(self):
+        return self.prototype.max_durability
+    @property
+    def desc(self):
+        return self.prototype.desc
+    @property
+    def unlisted(self):
+        return self.prototype.unlisted
+    @property
+    def actions(self):
+        return self.prototype.actions
+    @property
+    def attacks(self):
+        return self.prototype.attacks
+    @property
+    def reactions(self):
+        return self.prototype.reactions
+
+def build_prototypes(itemdefs):
+    """
+    Build a prototype for every item definition.
+
+    Parameters
+    ----------
+    itemdefs: dict[str -> dict]
+        Item definitions.
+    """
+    return {itemname: ItemPrototype(itemname, itemdef) for itemname, itemdef in itemdefs.items()}
@@ -1,3 +1,4 @@
+import gameio
 import random
 
 MAX_STAT_VALUE = 10
@@ -32,6 +33,7 @@ class CharacterStat:
         The actual value of this stat. The value is always restricted to the
         range [0, maxvalue].
     """
+    __slots__ = ("maxvalue", "value")
     def __init__(self, maxvalue):
         if maxvalue < 1:
             maxvalue = 1
@@ -125,6 +127,7 @@ class EnemyHealth:
         The actual health value. The value is always restricted to the
         range [0, maxvalue].
     """
+    __slots__ = ("maxvalue", "value")
     def __init__(self, maxvalue):
         if maxvalue < 1:
             maxvalue = 1
@@ -194,39 +197,26 @@ def join_list_pretty(ls):
     else:
         return ", ".join((str(x) for x in ls[:-1])) + ", and " + str(ls[-1])
 
-def gen_ambush_text(encounter):
+def format_enemy_groups(groups):
     """
-    Turn a list of enemies into a human-readable string.
-    If there are multiple enemies of the same type, then their names are combined;
-    e.g. if there are two enemies named "Spider", then they become "2 Spiders".
+    Turn groups of enemies into a human-readable string, e.g.
+    "2 Goblins and a Massive Spider".
 
     Parameters
     ----------
-    encounter: list[GameEnemy]
-        The list of enemies.
+    groups: list[(str, str, int)]
+        The name, plural name, and number of enemies in each group, in the
+        order they should be listed.
     """
-    ls = [(x.name, x.nameplural) for x in encounter]
-    ls.sort()
-    ls2 = []
-    num = 0
-    name = ""
-    for value in ls:
-        if value[0] == name:
-            num += 1
+    ls = []
+    for name, plural, num in groups:
+        if num == 1:
+            ls.append("a " + FMT_ENEMY.format(name))
         else:
-            if num == 1:
-                ls2.append("a " + FMT_ENEMY.format(value[0]))
-            elif num > 1:
-                ls2.append("{} {}".format(num, FMT_ENEMY.format(value[1])))
-            name = value[0]
-            num = 1
-    if num == 1:
-        ls2.append("a " + FMT_ENEMY.format(value[0]))
-    elif num > 1:
-        ls2.append("{} {}".format(num, FMT_ENEMY.format(value[1])))
-    return join_list_pretty(ls2)
+            ls.append("{} {}".format(num, FMT_ENEMY.format(plural)))
+    return join_list_pretty(ls)
 
-def choose_from_list(ls, cancancel, prompt, descriptions=None, fmt=FMT_OPTION):
+def choose_from_list(ls, cancancel, prompt, descriptions=None, fmt=FMT_OPTION, io=None):
     """
     Ask the player to choose an option from a list of options.
 
@@ -240,7 +230,24 @@ def choose_from_list(ls, cancancel, prompt, descriptions=None, fmt=FMT_OPTION):
         selection. In this case, this function may return None.
     prompt: str
         The prompt to give the player.
+    io: GameIO
+        Where to ask the player. Defaults to the terminal.
     """
+    index = choose_index_from_list(ls, cancancel, prompt, descriptions, fmt, io)
+    if index == None:
+        return None
+    return ls[index]
+
+def choose_index_from_list(ls, cancancel, prompt, descriptions=None, fmt=FMT_OPTION, io=None):
+    """
+    Ask the player to choose an option from a list of options, and return
+    the option's index rather than the option, or None if the player
+    cancelled. Parameters are the same as choose_from_list's.
+    """
+    if io == None:
+        io = gameio.TERMINAL
+    if io.chooser != None:
+        return io.chooser(ls, cancancel, prompt)
     if cancancel:
         prompt = prompt + " [or 'cancel' to cancel]"
     prompt = prompt + ": "
@@ -252,21 +259,21 @@ def choose_from_list(ls, cancancel, prompt, descriptions=None, fmt=FMT_OPTION):
         namestr = str(name)
         spacelen = maxlen + 1 - len(namestr)
         namestr = fmt.format(namestr)
-        print("    {}. {}{}    {}".format(FMT_IMPORTANT.format(i + 1), namestr, " " * spacelen, desc))
+        io.print("    {}. {}{}    {}".format(FMT_IMPORTANT.format(i + 1), namestr, " " * spacelen, desc))
     index = -1
     while not index in range(len(ls)):
         try:
-            ivalue = input(prompt).lower().strip()
+            ivalue = io.input(prompt).lower().strip()
             if ivalue == "cancel" and cancancel:
                 return None
             index = int(ivalue) - 1
             if index not in range(len(ls)):
-                print("Input is not valid.")
+                io.print("Input is not valid.")
         except ValueError:
-            print("Input is not valid.")
-    return ls[index]
+            io.print("Input is not valid.")
+    return index
 
-def roll_dice(num, sides):
+def roll_dice(num, sides, rng=random):
     """
     Roll dice with the given number of sides.
 
@@ -276,5 +283,8 @@ def roll_dice(num, sides):
         The number of dice to roll.
     sides:
         The number of sides each dice has.
+    rng: random.Random
+        The random number generator to use, usually the game's own (see
+        GameData.rng).
     """
-    return [random.randint(1, sides) for _ in range(num)]
\ No newline at end of file
+    return [rng.randint(1, sides) for _ in range(num)]
\ No newline at end of file
@@ -0,0 +1,352 @@
+"""
+Instrumentation of the game loop.
+
+An Instrumentation wraps each player command and the functions that do most
+of the game's work (rendering, updating, entering rooms, level actions and
+combat) so that every call records its wall time, CPU time and the number of
+memory blocks it allocated into histograms. Nothing is wrapped until enable
+is called, so the game runs exactly as fast as before when instrumentation
+is off.
+
+Times are inclusive: a 'move' command includes the time spent in enter_room,
+which is also recorded on its own. Wall time includes any time that a command
+spends waiting for input (e.g. choosing an attack), while CPU time doesn't.
+
+Metrics can be written as JSON or in the Prometheus text format; see
+Metrics.write. profile runs a function under cProfile and writes its stats,
+which pstats, snakeviz, flameprof and similar tools can read.
+"""
+import cProfile
+import gameencounter
+import gameenemy
+import gameitem
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Histogram bucket i counts values below 2**i (nanoseconds for times); the
+# last bucket counts everything larger.
+BUCKETS = 36
+
+# Functions of the main module that are timed
+MAIN_FUNCTIONS = ("update", "render", "interact_with", "execute_level_action", "enter_room",
+    "do_enemy_turn")
+# Other functions and methods that are timed, as (owner, attribute, name)
+COMBAT_FUNCTIONS = (
+    (gameencounter.Encounter, "take_turns", "Encounter.take_turns"),
+    (gameenemy.EnemyAction, "use", "EnemyAction.use"),
+    (gameenemy.EnemyAction, "use_batch", "EnemyAction.use_batch"),
+    (gameitem.GameAction, "use", "GameAction.use"),
+    (gameitem, "try_attack_enemy", "try_attack_enemy")
+)
+
+class Histogram:
+    """
+    A histogram with power of two buckets, so recording a value is a single
+    bit_length call.
+
+    Attributes
+    ----------
+    buckets: list[int]
+        The number of values in each bucket; see BUCKETS.
+    count: int
+        The number of values recorded.
+    total: int
+        The sum of every value recorded.
+    """
+    __slots__ = ("buckets", "count", "total")
+    def __init__(self):
+        self.buckets = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+    def observe(self, value):
+        """
+        Record a value. Negative values are counted in the first bucket.
+        """
+        self.count += 1
+        self.total += value
+        index = value.bit_length() if value > 0 else 0
+        self.buckets[min(index, BUCKETS - 1)] += 1
+    def quantile(self, q):
+        """
+        Get an upper bound of the q'th quantile (e.g. 0.99), i.e. the upper
+        bound of the bucket that it falls in. Returns None if the quantile is
+        in the last bucket or nothing was recorded.
+        """
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets[:-1]):
+            seen += count
+            if seen >= rank:
+                return 2 ** i
+        return None
+
+class CallStats:
+    """
+    What was recorded for one command or function.
+
+    Attributes
+    ----------
+    wall: Histogram
+        Wall time of each call, in nanoseconds.
+    cpu: Histogram
+        CPU time of each call on its thread, in nanoseconds.
+    blocks: Histogram
+        The number of memory blocks that each call left allocated. Blocks
+        that it freed are subtracted, so this can be negative.
+    """
+    __slots__ = ("wall", "cpu", "blocks", "_lock")
+    def __init__(self, lock):
+        self.wall = Histogram()
+        self.cpu = Histogram()
+        self.blocks = Histogram()
+        self._lock = lock
+    def record(self, wall, cpu, blocks):
+        """
+        Record a call.
+
+        Parameters
+        ----------
+        wall, cpu: int
+            Nanoseconds taken.
+        blocks: int
+            Memory blocks allocated.
+        """
+        # Histogram.observe, inlined since this runs on every call
+        with self._lock:
+            for histogram, value in ((self.wall, wall), (self.cpu, cpu), (self.blocks, blocks)):
+                histogram.count += 1
+                histogram.total += value
+                index = value.bit_length() if value > 0 else 0
+                histogram.buckets[index if index < BUCKETS else BUCKETS - 1] += 1
+    def to_dict(self):
+        calls = max(self.wall.count, 1)
+        return {
+            "calls": self.wall.count,
+            "wall_seconds": self.wall.total / 1e9,
+            "cpu_seconds": self.cpu.total / 1e9,
+            "mean_wall_ms": self.wall.total / calls / 1e6,
+            "mean_cpu_ms": self.cpu.total / calls / 1e6,
+            "mean_blocks": self.blocks.total / calls,
+            "p50_wall_ms": _ns_to_ms(self.wall.quantile(0.5)),
+            "p99_wall_ms": _ns_to_ms(self.wall.quantile(0.99)),
+            "wall_buckets": list(self.wall.buckets),
+            "cpu_buckets": list(self.cpu.buckets),
+            "blocks_buckets": list(self.blocks.buckets)
+        }
+
+def _ns_to_ms(value):
+    return None if value == None else value / 1e6
+
+class Metrics:
+    """
+    Every command's and function's CallStats. Safe to record into from many
+    threads, e.g. the server's games.
+
+    Attributes
+    ----------
+    commands: dict[str -> CallStats]
+        Stats of each player command, by name.
+    functions: dict[str -> CallStats]
+        Stats of each instrumented function, by name.
+    """
+    __slots__ = ("commands", "functions", "_lock")
+    def __init__(self):
+        self.commands = {}
+        self.functions = {}
+        self._lock = threading.Lock()
+    def get(self, table, name):
+        """
+        Get the CallStats of a command or function, creating it if needed.
+
+        Parameters
+        ----------
+        table: dict[str -> CallStats]
+            Either commands or functions.
+        name: str
+            The command or function's name.
+        """
+        with self._lock:
+            stats = table.get(name)
+            if stats == None:
+                stats = table[name] = CallStats(self._lock)
+            return stats
+    def to_dict(self):
+        with self._lock:
+            return {
+                "commands": {name: stats.to_dict() for name, stats in sorted(self.commands.items())},
+                "functions": {name: stats.to_dict() for name, stats in sorted(self.functions.items())}
+            }
+    def to_prometheus(self, prefix="game"):
+        """
+        Format the metrics in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        prefix: str
+            Prepended to every metric's name.
+        """
+        lines = []
+        with self._lock:
+            for kind, table in (("command", self.commands), ("function", self.functions)):
+                for metric, attr, scale, unit in (("wall", "wall", 1e-9, "seconds"),
+                        ("cpu", "cpu", 1e-9, "seconds"), ("allocated", "blocks", 1, "blocks")):
+                    name = "{}_{}_{}_{}".format(prefix, kind, metric, unit)
+                    lines.append("# TYPE {} histogram".format(name))
+                    for label, stats in sorted(table.items()):
+                        _format_histogram(lines, name, '{}="{}"'.format(kind, _escape(label)),
+                            getattr(stats, attr), scale)
+        return "\n".join(lines) + "\n"
+    def write(self, path):
+        """
+        Write the metrics to a file, replacing it at once so that readers
+        never see a partial file. Files ending in '.json' are written as JSON,
+        anything else in the Prometheus text format.
+        """
+        if path.endswith(".json"):
+            text = json.dumps(self.to_dict(), indent=4)
+        else:
+            text = self.to_prometheus()
+        temppath = path + ".tmp"
+        with open(temppath, "w", encoding="utf-8") as outfile:
+            outfile.write(text)
+        os.replace(temppath, path)
+
+def _escape(label):
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_histogram(lines, name, labels, histogram, scale):
+    cumulative = 0
+    for i, count in enumerate(histogram.buckets[:-1]):
+        cumulative += count
+        lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, repr(2 ** i * scale), cumulative))
+    lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, histogram.count))
+    lines.append("{}_sum{{{}}} {}".format(name, labels, repr(histogram.total * scale)))
+    lines.append("{}_count{{{}}} {}".format(name, labels, histogram.count))
+
+def _timed(stats, func):
+    """
+    Wrap a function so that each call is recorded into stats.
+    """
+    wall_ns = time.perf_counter_ns
+    cpu_ns = time.thread_time_ns
+    allocated = sys.getallocatedblocks
+    record = stats.record
+    def timed(*args, **kwargs):
+        wall = wall_ns()
+        cpu = cpu_ns()
+        blocks = allocated()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Don't count the block that holds the starting count
+            blocks = allocated() - blocks - 1
+            record(wall_ns() - wall, cpu_ns() - cpu, blocks)
+    timed.__wrapped__ = func
+    return timed
+
+def _timed_interact(metrics, func):
+    # interact handles several commands; record each under its own name
+    wall_ns = time.perf_counter_ns
+    cpu_ns = time.thread_time_ns
+    allocated = sys.getallocatedblocks
+    commands = metrics.commands
+    def timed_interact(gamedata, action, args):
+        wall = wall_ns()
+        cpu = cpu_ns()
+        blocks = allocated()
+        try:
+            return func(gamedata, action, args)
+        finally:
+            blocks = allocated() - blocks - 1
+            stats = commands.get(action)
+            if stats == None:
+                stats = metrics.get(commands, action)
+            stats.record(wall_ns() - wall, cpu_ns() - cpu, blocks)
+    timed_interact.__wrapped__ = func
+    return timed_interact
+
+class Instrumentation:
+    """
+    Records how long the game's commands and functions take into a Metrics.
+
+    Attributes
+    ----------
+    metrics: Metrics
+        Where calls are recorded.
+    enabled: bool
+        Whether the game's functions are currently wrapped.
+    """
+    __slots__ = ("metrics", "enabled", "_patches")
+    def __init__(self, game, metrics=None):
+        """
+        Parameters
+        ----------
+        game: module
+            The game's main module. When main.py is run as a script this is
+            __main__ rather than main, so it must be given explicitly.
+        metrics: Metrics
+            Where to record calls. A new one is created if not given.
+        """
+        if metrics == None:
+            metrics = Metrics()
+        self.metrics = metrics
+        self.enabled = False
+        # (owner, attribute, wrapper) for each function to wrap
+        patches = []
+        for name, action in game.PLAYER_ACTIONS.items():
+            patches.append((action, "func", _timed(metrics.get(metrics.commands, name), action.func)))
+        patches.append((game, "interact", _timed_interact(metrics, game.interact)))
+        for name in MAIN_FUNCTIONS:
+            stats = metrics.get(metrics.functions, name)
+            patches.append((game, name, _timed(stats, getattr(game, name))))
+        for owner, attr, name in COMBAT_FUNCTIONS:
+            stats = metrics.get(metrics.functions, name)
+            patches.append((owner, attr, _timed(stats, getattr(owner, attr))))
+        self._patches = patches
+    def enable(self):
+        """
+        Start recording. Affects every game in this process.
+        """
+        if not self.enabled:
+            for owner, attr, wrapper in self._patches:
+                setattr(owner, attr, wrapper)
+            self.enabled = True
+    def disable(self):
+        """
+        Stop recording, and restore the original functions.
+        """
+        if self.enabled:
+            for owner, attr, wrapper in self._patches:
+                setattr(owner, attr, wrapper.__wrapped__)
+            self.enabled = False
+
+def profile(path, func, *args, **kwargs):
+    """
+    Call a function under cProfile, write its stats to a file, and return the
+    function's result. View the file with e.g. `python -m pstats PATH`, or
+    turn it into a flame graph with flameprof.
+
+    Parameters
+    ----------
+    path: str
+        Where to write the stats.
+    func: function
+        The function to call with the remaining arguments.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+
+def print_profile(path, limit=20):
+    """
+    Print the functions in a profile that took the most cumulative time.
+    """
+    pstats.Stats(path).sort_stats("cumulative").print_stats(limit)
@@ -0,0 +1,183 @@
+class Inventory:
+    """
+    The items that the player is carrying.
+
+    Items are kept in the order they were added. The number of items with
+    each name is indexed, and the attack, use and reaction lists are cached
+    until an item is added or removed. The cached lists are shared, so they
+    must not be modified.
+
+    Actions belong to item prototypes, so copies of the same item list the
+    same action objects. get_attack_items and get_use_items tell which item
+    each entry of the attack and use lists came from.
+
+    Attributes
+    ----------
+    base_attacks: sequence[GameAction]
+        Attacks that can be performed without any items. They are listed
+        before the items' attacks.
+    base_reactions: sequence[GameAction]
+        Reactions that can be used without any items. They are listed after
+        the items' reactions.
+    version: int
+        Incremented whenever an item is added or removed.
+    """
+    __slots__ = ("base_attacks", "base_reactions", "version", "_items", "_counts", "_attacks",
+        "_attack_items", "_use_actions", "_use_items", "_reactions")
+    def __init__(self, base_attacks=(), base_reactions=()):
+        self.base_attacks = base_attacks
+        self.base_reactions = base_reactions
+        self.version = 0
+        self._items = []
+        self._counts = {}
+        self._attacks = None
+        self._attack_items = None
+        self._use_actions = None
+        self._use_items = None
+        self._reactions = {}
+    def _changed(self):
+        self.version += 1
+        self._attacks = None
+        self._attack_items = None
+        self._use_actions = None
+        self._use_items = None
+        self._reactions.clear()
+    def add(self, item):
+        """
+        Add an item.
+        """
+        self._items.append(item)
+        self._counts[item.fullname] = self._counts.get(item.fullname, 0) + 1
+        self._changed()
+    def _forget(self, item):
+        count = self._counts[item.fullname] - 1
+        if count == 0:
+            del self._counts[item.fullname]
+        else:
+            self._counts[item.fullname] = count
+    def remove(self, item):
+        """
+        Remove a specific item, rather than any item with the same name.
+        Raises ValueError if it isn't in the inventory.
+        """
+        for i, other in enumerate(self._items):
+            if other is item:
+                self._items.pop(i)
+                self._forget(item)
+                self._changed()
+                return
+        raise ValueError("The item is not in the inventory")
+    def remove_named(self, itemname, removeall=False):
+        """
+        Remove the first item with the given name, or every item with the
+        name if removeall is true. Returns the number of items removed.
+
+        Parameters
+        ----------
+        itemname: str
+            The item's name, e.g. "SWORD".
+        removeall: bool
+            If true, remove every item with the name.
+        """
+        count = self._counts.get(itemname, 0)
+        if count == 0:
+            return 0
+        if removeall:
+            self._items = [item for item in self._items if item.fullname != itemname]
+            del self._counts[itemname]
+        else:
+            for i, item in enumerate(self._items):
+                if item.fullname == itemname:
+                    self._items.pop(i)
+                    self._forget(item)
+                    count = 1
+                    break
+        self._changed()
+        return count
+    def replace(self, items):
+        """
+        Replace every item.
+        """
+        self._items = list(items)
+        self._counts = {}
+        for item in self._items:
+            self._counts[item.fullname] = self._counts.get(item.fullname, 0) + 1
+        self._changed()
+    def count(self, itemname):
+        """
+        Get the number of items with the given name.
+        """
+        return self._counts.get(itemname, 0)
+    def has(self, itemname):
+        """
+        Returns true if there is at least one item with the given name.
+        """
+        return itemname in self._counts
+    def get_attacks(self):
+        """
+        Get every attack that can be performed, starting with the base attacks.
+        """
+        if self._attacks == None:
+            attacks = list(self.base_attacks)
+            items = [None] * len(attacks)
+            for item in self._items:
+                attacks.extend(item.attacks.values())
+                items.extend([item] * len(item.attacks))
+            self._attacks = attacks
+            self._attack_items = items
+        return self._attacks
+    def get_attack_items(self):
+        """
+        Get the item that each attack in get_attacks belongs to, in the same
+        order. Base attacks belong to None.
+        """
+        self.get_attacks()
+        return self._attack_items
+    def get_use_actions(self):
+        """
+        Get every item's use actions.
+        """
+        if self._use_actions == None:
+            actions = []
+            items = []
+            for item in self._items:
+                actions.extend(item.actions.values())
+                items.extend([item] * len(item.actions))
+            self._use_actions = actions
+            self._use_items = items
+        return self._use_actions
+    def get_use_items(self):
+        """
+        Get the item that each action in get_use_actions belongs to, in the
+        same order.
+        """
+        self.get_use_actions()
+        return self._use_items
+    def get_reactions(self, dtype):
+        """
+        Get every reaction that can be used against the given damage type,
+        ending with the base reactions.
+
+        Parameters
+        ----------
+        dtype: str
+            The damage type, e.g. "physical".
+        """
+        reactions = self._reactions.get(dtype)
+        if reactions == None:
+            reactions = []
+            for item in self._items:
+                for reaction in item.reactions.values():
+                    if reaction.does_resist(dtype):
+                        reactions.append(reaction)
+            for reaction in self.base_reactions:
+                if reaction.does_resist(dtype):
+                    reactions.append(reaction)
+            self._reactions[dtype] = reactions
+        return reactions
+    def __iter__(self):
+        return iter(self._items)
+    def __len__(self):
+        return len(self._items)
+    def __getitem__(self, index):
+        return self._items[index]
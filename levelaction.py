@@ -0,0 +1,193 @@
+import gameevents
+import gameutil
+
+def _noop(gamedata):
+    pass
+
+def _compile_sequence(actions, linker):
+    funcs = tuple(compile_level_action(item, linker) for item in actions)
+    if len(funcs) == 0:
+        return _noop
+    elif len(funcs) == 1:
+        return funcs[0]
+    def run_sequence(gamedata):
+        for func in funcs:
+            func(gamedata)
+    return run_sequence
+
+def _compile_print(text):
+    formatted = gameutil.FMT_IMPORTANT.format(text)
+    def run_print(gamedata):
+        gamedata.io.print(formatted)
+    return run_print
+
+def _compile_branch(action, key, linker):
+    if key in action:
+        return compile_level_action(action.get(key), linker)
+    return _noop
+
+def _flag_slot(linker, flag):
+    if linker == None:
+        return None
+    return linker.flag(flag)
+
+def _compile_setflag(action, linker):
+    flag = action.get("flag")
+    value = action.get("value")
+    slot = _flag_slot(linker, flag)
+    event = gameevents.FlagSet(flag, value)
+    if slot == None:
+        def run_setflag(gamedata):
+            gamedata.flags.set(flag, value)
+            gamedata.events.emit(event)
+        return run_setflag
+    _, setter, index = slot
+    def run_setflag_slot(gamedata):
+        setter(gamedata.flags, index, value)
+        gamedata.events.emit(event)
+    return run_setflag_slot
+
+def _compile_if(action, linker):
+    flagname = action.get("flag")
+    default = action.get("default")
+    testvalue = action.get("value", None)
+    on_true = _compile_branch(action, "true", linker)
+    on_false = _compile_branch(action, "false", linker)
+    slot = _flag_slot(linker, flagname)
+    if slot == None:
+        def getter(flags, index, default):
+            return flags.get(flagname, default)
+        index = None
+    else:
+        getter, _, index = slot
+    if testvalue == None:
+        def run_if(gamedata):
+            value = getter(gamedata.flags, index, default)
+            if value or value == None:
+                on_true(gamedata)
+            else:
+                on_false(gamedata)
+    else:
+        def run_if(gamedata):
+            if getter(gamedata.flags, index, default) == testvalue:
+                on_true(gamedata)
+            else:
+                on_false(gamedata)
+    return run_if
+
+def _compile_has(action, linker):
+    itemname = action.get("item")
+    if linker != None:
+        linker.item(itemname)
+    on_true = _compile_branch(action, "true", linker)
+    on_false = _compile_branch(action, "false", linker)
+    def run_has(gamedata):
+        if gamedata.player.has_item(itemname):
+            on_true(gamedata)
+        else:
+            on_false(gamedata)
+    return run_has
+
+def _compile_give(action, linker):
+    itemname = action.get("item")
+    if linker == None:
+        def run_give(gamedata):
+            item = gamedata.world.item_prototypes[itemname].create()
+            gamedata.player.inventory.add(item)
+            gamedata.events.emit(gameevents.ItemGiven(item))
+        return run_give
+    prototype = linker.item(itemname)
+    def run_give_linked(gamedata):
+        item = prototype.create()
+        gamedata.player.inventory.add(item)
+        gamedata.events.emit(gameevents.ItemGiven(item))
+    return run_give_linked
+
+def _compile_remove(action, linker):
+    itemname = action.get("item")
+    if linker != None:
+        linker.item(itemname)
+    removeall = action.get("remove-all", False)
+    event = gameevents.ItemRemoved(itemname, removeall)
+    def run_remove(gamedata):
+        if gamedata.player.inventory.remove_named(itemname, removeall) > 0:
+            gamedata.events.emit(event)
+    return run_remove
+
+def _compile_unknown(atype, linker):
+    if linker != None:
+        linker.problem("unknown level action '{}'".format(atype))
+    def run_unknown(gamedata):
+        gamedata.io.print("Unknown level action '{}'".format(atype))
+    return run_unknown
+
+def _run_invalid(gamedata):
+    gamedata.io.print("Not a valid level action type")
+
+_COMPILERS = {
+    "setflag": _compile_setflag,
+    "if": _compile_if,
+    "has": _compile_has,
+    "give": _compile_give,
+    "remove": _compile_remove,
+}
+
+def collect_flags(action, flagvalues):
+    """
+    Find every flag that a level action reads or sets.
+
+    Parameters
+    ----------
+    action: str, list, or dict
+        The action to search.
+    flagvalues: dict[str -> list]
+        Each flag that is found is added to this dictionary, along with every
+        value that the action sets it to.
+    """
+    if isinstance(action, list):
+        for item in action:
+            collect_flags(item, flagvalues)
+    elif isinstance(action, dict):
+        atype = action.get("type")
+        flag = action.get("flag")
+        if atype == "setflag" and flag != None:
+            flagvalues.setdefault(flag, []).append(action.get("value"))
+        elif atype == "if" and flag != None:
+            flagvalues.setdefault(flag, [])
+        if atype in ("if", "has"):
+            for key in ("true", "false"):
+                if key in action:
+                    collect_flags(action[key], flagvalues)
+
+def compile_level_action(action, linker=None):
+    """
+    Compile a level action into a function which performs it.
+
+    The action tree is only inspected once; the returned function takes the
+    game state as its only argument and does no type dispatch of its own.
+
+    Parameters
+    ----------
+    action: str, list, or dict
+        The action to compile. See main.execute_level_action for the format.
+    linker: world.Linker
+        If given, item names are resolved to their definitions and flags to
+        their slots while compiling, and any problems are reported to it.
+        Otherwise items and flags are looked up by name when the action runs.
+    """
+    if isinstance(action, list):
+        return _compile_sequence(action, linker)
+    elif isinstance(action, str):
+        return _compile_print(action)
+    elif isinstance(action, dict):
+        atype = action.get("type")
+        if atype == "print":
+            return _compile_print(action.get("text"))
+        elif atype in _COMPILERS:
+            return _COMPILERS[atype](action, linker)
+        else:
+            return _compile_unknown(atype, linker)
+    else:
+        if linker != None:
+            linker.problem("not a valid level action")
+        return _run_invalid
@@ -3,11 +3,20 @@ import sys, os
 # Check to make sure we are running the correct version of Python
 assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
 
+import argparse
 import character
-import json
+import commandparser
+import contentcache
+import exitgraph
+import random
 import gameutil
-import gameenemy
-import gameitem
+import gameencounter
+import gameevents
+import gameflags
+import gameio
+import instrument
+import levelaction
+import world
 
 # The game and item description files (in the same folder as this script)
 FILE_LEVEL = 'level.json'
@@ -16,80 +25,86 @@ FILE_CLASSES = "classes.json"
 FILE_ENEMIES = "enemies.json"
 INTERACT_COMMANDS = ["look", "search", "take", "open"]
 END_EXITS = ["END"]
+# The room that the player starts in, if the world has it; otherwise the
+# player starts in the world's first room
+START_ROOM = "WHOUS"
+# Number of actions that execute_level_action keeps compiled
+LEVEL_ACTION_CACHE_SIZE = 256
 
-def load_json(name: str):
-    """
-    Load the contents of the files into the game and items dictionaries. You can largely ignore this
-    Sorry it's messy, I'm trying to account for any potential craziness with the file location
+# id(action) -> (action, compiled action), most recently used last. The
+# action is kept so that its id isn't reused while it's cached.
+_compiled_actions = {}
+
+def load_sources(use_cache=True, level=FILE_LEVEL, directory=None):
     """
+    Load the game's content files. Returns a dictionary with the keys "level",
+    "items", "classes" and "enemies". The files are cached in a bundle (see
+    contentcache), so they are only parsed and linked again when they change;
+    if the cache is used, "tables" holds what world.link_tables returned.
+
+    Parameters
+    ----------
+    use_cache: bool
+        If false, always parse the files.
+    level: str
+        The level file, relative to the content folder or absolute. Worlds
+        in the Zork schema (e.g. zork.json) are converted automatically.
+    directory: str
+        The folder that contains the content files, e.g. one written by
+        worldgen. Defaults to this script's folder.
+    """
+    __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+    if directory != None:
+        __location__ = os.path.realpath(directory)
+    files = {"level": level, "items": FILE_ITEMS, "classes": FILE_CLASSES, "enemies": FILE_ENEMIES}
+    # Cached content is linked once, when its bundle is written
+    link = world.link_tables if use_cache else None
     try:
-        __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
-        with open(os.path.join(__location__, name)) as json_file: 
-            return json.load(json_file)
-    except:
+        return contentcache.load_content_files(__location__, files, use_cache, link)
+    except contentcache.ContentError as e:
+        print(e)
+        os._exit(1)
+    except (OSError, ValueError):
         print("There was a problem reading either the game or item file.")
         os._exit(1)
 
-def preprocess_level_items(roomname, room):
+def load_content(use_cache=True, level=FILE_LEVEL, directory=None):
     """
-    Preprocesses a room's data so that all of its defined items can be interacted with.
-    """
-    if not "items" in room:
-        return
-    items = room["items"]
-    if not "interact" in room:
-        room["interact"] = {}
-    interact = room["interact"]
-    for itemname, itemdef in items.items():
-        if itemname in interact:
-            continue
-        # Unique, but a level could check if a specific item was taken anyways
-        flag = "@{}_{}".format(roomname, itemname)
-        itemkey = itemdef.get("item")
-        data = {
-            "take": {
-                "type": "if",
-                "flag": flag,
-                "default": True,
-                "true": [
-                    {
-                        "type": "give",
-                        "item": itemkey
-                    }, {
-                        "type": "setflag",
-                        "flag": flag,
-                        "value": False
-                    }
-                ],
-                "false": "You already took the {}.".format(itemname)
-            },
-            "look": {
-                "type": "if",
-                "flag": flag,
-                "default": True,
-                "true": itemdef.get("look", "There is a {}.".format(itemname)),
-                "false": "You already took the {}.".format(itemname)
-            }
-        }
-        interact[itemname] = data
+    Load the game's content files into a World.
+
+    Parameters
+    ----------
+    use_cache: bool
+        If false, always parse the files.
+    level: str
+        The level file; see load_sources.
+    directory: str
+        The folder that contains the content files; see load_sources.
+    """
+    sources = load_sources(use_cache, level, directory)
+    try:
+        return world.World(sources["level"], sources["items"], sources["classes"], sources["enemies"],
+            sources.get("tables"))
+    except contentcache.ContentError as e:
+        print(e)
+        os._exit(1)
 
+def new_seed():
+    """
+    Pick a seed for a new game.
+    """
+    return random.getrandbits(32)
 
 class GameData:
     """
-    A class that contains the entire game's state.
+    A class that contains a single game's state. The world itself is shared,
+    so creating a game is cheap.
 
     Attributes
     ----------
 
-    level: dict[str -> dict]
-        A dictionary of level data where keys are level names and values are
-        level definitions.
-    items: dict[str -> dict]
-        A dictionary of item data where keys are item names and values are item
-        definitions.
-    enemydefs: dict[str -> dict]
-        A dictionary of enemy data where keys are enemy names and values are
-        enemy definitions.
+    world: World
+        The world that the game takes place in.
     player: Character
         The player state of the game.
     room: str
@@ -101,47 +116,76 @@ class GameData:
     actions: dict[str -> PlayerAction]
         A dictionary of actions that the player can take; keys are action names
         and values are action definition
-    """
-    def __init__(self, leveldata, itemdata, player, enemydefs):
-        self.level = leveldata
-        for roomname, room in self.level.items():
-            preprocess_level_items(roomname, room)
-        self.items = itemdata
+    commands: commandparser.Trie
+        Finds a command's name from what the player typed; see
+        build_command_index.
+    io: GameIO
+        Where the game reads input from and writes output to.
+    flags: gameflags.Flags
+        Flags set by level actions.
+    explored: dict[str -> bool]
+        Rooms that the player has entered.
+    explored_version: int
+        Incremented whenever explored changes.
+    cleared_combats: dict[str -> bool]
+        Rooms whose encounter has been beaten.
+    encounter: gameencounter.Encounter
+        The enemies that the player is fighting.
+    routes: exitgraph.Router
+        Finds paths for the 'goto' action.
+    render_key: tuple
+        What the cached room text was rendered for; see render_room.
+    render_text: str
+        The cached room text.
+    seed: int
+        The seed of the game's random number generator.
+    rng: random.Random
+        The game's own random number generator; every roll in the game is
+        drawn from it, so a game played with the same seed and input always
+        plays out the same way.
+    events: gameevents.EventBus
+        Where combat and level effects are emitted. Unless the game was
+        created with render=False, a gameevents.TextRenderer writes them to io.
+    """
+    __slots__ = ("io", "world", "player", "room", "lastroom", "finished", "actions", "commands", "flags",
+        "explored", "explored_version", "cleared_combats", "encounter", "routes", "render_key", "render_text",
+        "seed", "rng", "events")
+    def __init__(self, gameworld, player, io=None, seed=None, render=True):
+        if io == None:
+            io = gameio.TERMINAL
+        if seed == None:
+            seed = new_seed()
+        self.io = io
+        self.world = gameworld
         self.player = player
-        self.enemydefs = enemydefs
         self.room = ""
         self.lastroom = ""
         self.finished = False
-        self.actions = {
-            "help": PlayerAction(action_help, "You're already using this, dummy!"),
-            "stats": PlayerAction(action_stat, "Gives information on your current stats."),
-            "quit": PlayerAction(action_quit, "Quit the game."),
-            "move": PlayerAction(action_move, "Move to another room."),
-            "inventory": PlayerAction(action_inventory, "List inventory items."),
-            "use": PlayerAction(action_use, "Use an item"),
-            "attack": PlayerAction(action_attack, "Attack an enemy")
-        }
-        self.flags = {}
+        self.actions = PLAYER_ACTIONS
+        self.commands = PLAYER_COMMANDS
+        self.flags = gameflags.Flags(gameworld.flag_layout)
         self.explored = {}
+        self.explored_version = 0
         self.cleared_combats = {}
-        self.encounter = []
+        self.encounter = gameencounter.Encounter()
+        self.routes = exitgraph.Router()
+        self.render_key = None
+        self.render_text = None
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.events = gameevents.EventBus()
+        if render:
+            self.events.subscribe(gameevents.TextRenderer(io))
     def remove_dead_enemies(self):
         """
         Removes enemies whose health is zero from the encounter.
         """
-        i = 0
-        prevlen = len(self.encounter)
-        while i < len(self.encounter):
-            enemy = self.encounter[i]
-            if enemy.is_dead():
-                self.encounter.pop(i)
-                print("You killed the {}!".format(gameutil.FMT_ENEMY.format(enemy.name)))
-            else:
-                i += 1
-        if len(self.encounter) == 0 and prevlen > 0:
+        dead = self.encounter.remove_dead()
+        for enemy in dead:
+            self.events.emit(gameevents.EnemyKilled(enemy))
+        if len(self.encounter) == 0 and len(dead) > 0:
             self.cleared_combats[self.room] = True
-            print("You defeated all of the enemies!")
-            input("Press enter to continue...")
+            self.events.emit(gameevents.EncounterCleared(self.room))
 
 class PlayerAction:
     """
@@ -164,34 +208,34 @@ def action_help(gamedata, args):
     The 'help' action
     """
     if len(args) == 0:
-        print(gameutil.FMT_IMPORTANT.format("Available actions: " + ", ".join(gamedata.actions.keys())))
-        print(gameutil.FMT_IMPORTANT.format("Type 'help action' for information about the given action."))
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format("Available actions: " + ", ".join(gamedata.actions.keys())))
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format("Type 'help action' for information about the given action."))
     elif len(args) == 1:
-        name = args[0]
+        name = gamedata.commands.find(args[0])
         if name in gamedata.actions:
-            print(gamedata.actions[name].help)
+            gamedata.io.print(gamedata.actions[name].help)
     else:
-        print(gameutil.FMT_IMPORTANT.format("Too many arguments to 'help'."))
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format("Too many arguments to 'help'."))
 
 def action_stat(gamedata, args):
     """
     The 'stat' action. Gives information about the player's stats.
     """
     if len(args) == 0:
-        print(gameutil.FMT_STAT.format("STR") + ":", gamedata.player.strength.format_string())
-        print("\tStrength, your physical power and health.")
-        print("\tIf you run out, you die from your injuries.")
-        print(gameutil.FMT_STAT.format("DEX") + ":", gamedata.player.dexterity.format_string())
-        print("\tDexterity, your agility and stealthiness.")
-        print("\tIf you run out, you cease to move again.")
-        print(gameutil.FMT_STAT.format("WIS") + ":", gamedata.player.wisdom.format_string())
-        print("\tWisdom, your mental acuity and intelligence.")
-        print("\tIf you run out, you lose the will to keep going.")
-        print(gameutil.FMT_STAT.format("SOUL") + ":", gamedata.player.soul.format_string())
-        print("\tSoul, your mortal connection.")
-        print("\tIf you run out, you succumb to the darkness and your soul is lost forever.")
+        gamedata.io.print(gameutil.FMT_STAT.format("STR") + ":", gamedata.player.strength.format_string())
+        gamedata.io.print("\tStrength, your physical power and health.")
+        gamedata.io.print("\tIf you run out, you die from your injuries.")
+        gamedata.io.print(gameutil.FMT_STAT.format("DEX") + ":", gamedata.player.dexterity.format_string())
+        gamedata.io.print("\tDexterity, your agility and stealthiness.")
+        gamedata.io.print("\tIf you run out, you cease to move again.")
+        gamedata.io.print(gameutil.FMT_STAT.format("WIS") + ":", gamedata.player.wisdom.format_string())
+        gamedata.io.print("\tWisdom, your mental acuity and intelligence.")
+        gamedata.io.print("\tIf you run out, you lose the will to keep going.")
+        gamedata.io.print(gameutil.FMT_STAT.format("SOUL") + ":", gamedata.player.soul.format_string())
+        gamedata.io.print("\tSoul, your mortal connection.")
+        gamedata.io.print("\tIf you run out, you succumb to the darkness and your soul is lost forever.")
     else:
-        print("Too many arguments to 'stat'.")
+        gamedata.io.print("Too many arguments to 'stat'.")
 
 def action_quit(gamedata, args):
     """
@@ -200,33 +244,71 @@ def action_quit(gamedata, args):
     if len(args) == 0:
         gamedata.finished = True
     else:
-        print("Too many arguments to 'quit'.")
+        gamedata.io.print("Too many arguments to 'quit'.")
 
 def action_move(gamedata, args):
     """
     The 'move' action. Moves the player to another location.
     """
     if len(args) == 0:
-        print("Needs one argument to 'move'.")
+        gamedata.io.print("Needs one argument to 'move'.")
     elif len(args) == 1:
         if len(gamedata.encounter) > 0:
-            print("You're engaged in combat, unable to move!")
+            gamedata.io.print("You're engaged in combat, unable to move!")
             return
         name = args[0]
-        exitdata = gamedata.level[gamedata.room]["exits"]
+        roomdata = gamedata.world.rooms[gamedata.room]
         try:
             index = int(name) - 1
-            if index in range(len(exitdata)):
-                try_enter_location(gamedata, exitdata[index])
+            if index in range(len(roomdata.exits)):
+                try_enter_location(gamedata, index)
                 return
         except ValueError:
-            for data in exitdata:
-                if data["exit"].lower() == name:
-                    try_enter_location(gamedata, data)
-                    return
-        print("Invalid exit '{}'".format(name))
+            index = roomdata.exit_index.find(name)
+            if index is commandparser.AMBIGUOUS:
+                gamedata.io.print("'{}' could mean more than one exit.".format(name))
+                return
+            if index != None:
+                try_enter_location(gamedata, index)
+                return
+        gamedata.io.print("Invalid exit '{}'".format(name))
     else:
-        print("Too many arguments to 'move'.")
+        gamedata.io.print("Too many arguments to 'move'.")
+
+def action_goto(gamedata, args):
+    """
+    The 'goto' action. Moves the player to an explored room by the shortest
+    open path.
+    """
+    if len(args) == 0:
+        gamedata.io.print("Needs a room name to 'goto'.")
+        return
+    if len(gamedata.encounter) > 0:
+        gamedata.io.print("You're engaged in combat, unable to move!")
+        return
+    name = " ".join(args)
+    rooms = gamedata.world.graph.room_index.find(name)
+    if rooms is commandparser.AMBIGUOUS:
+        gamedata.io.print("'{}' could mean more than one room.".format(name))
+        return
+    if rooms != None:
+        rooms = [roomname for roomname in rooms if roomname in gamedata.explored]
+    if rooms == None or len(rooms) == 0:
+        gamedata.io.print("You don't know the way to '{}'.".format(name))
+        return
+    if gamedata.room in rooms:
+        gamedata.io.print("You're already there.")
+        return
+    path = gamedata.routes.find_path(gamedata, rooms)
+    if path == None:
+        gamedata.io.print("There is no open path to {}.".format(gamedata.world.rooms[rooms[0]].name))
+        return
+    for exitindex in path:
+        room = gamedata.room
+        try_enter_location(gamedata, exitindex)
+        # Stop if the way was blocked or the player was ambushed
+        if gamedata.room == room or len(gamedata.encounter) > 0:
+            break
 
 def action_use(gamedata, args):
     """
@@ -235,15 +317,15 @@ def action_use(gamedata, args):
     if len(args) == 0:
         attacks = gamedata.player.get_use_actions()
         if len(attacks) == 0:
-            print("You have no items which can be used.")
+            gamedata.io.print("You have no items which can be used.")
             return
-        attack = gameutil.choose_from_list(attacks, True, "Choose an item to use")
-        if attack == None:
+        index = gameutil.choose_index_from_list(attacks, True, "Choose an item to use", io=gamedata.io)
+        if index == None:
             return
-        if attack.use(gamedata) != False:
+        if attacks[index].use(gamedata, gamedata.player.inventory.get_use_items()[index]) != False:
             do_enemy_turn(gamedata)
     else:
-        print("Too many arguments to 'use'")
+        gamedata.io.print("Too many arguments to 'use'")
 
 def action_inventory(gamedata, args):
     """
@@ -253,16 +335,16 @@ def action_inventory(gamedata, args):
         inventory = [item for item in gamedata.player.inventory if not item.unlisted]
         numitems = len(inventory)
         if numitems == 0:
-            print("You don't have anything in your inventory.")
+            gamedata.io.print("You don't have anything in your inventory.")
         else:
             if numitems == 1:
-                print("You have 1 item in your inventory:")
+                gamedata.io.print("You have 1 item in your inventory:")
             else:
-                print("You have {} items in your inventory:".format(numitems))
+                gamedata.io.print("You have {} items in your inventory:".format(numitems))
             for item in inventory:
-                print("\t{} - {}".format(gameutil.FMT_OPTION.format(item.name), item.desc))
+                gamedata.io.print("\t{} - {}".format(gameutil.FMT_OPTION.format(item.name), item.desc))
     else:
-        print("Too many arguments to 'inventory'")
+        gamedata.io.print("Too many arguments to 'inventory'")
 
 def action_attack(gamedata, args):
     """
@@ -270,38 +352,74 @@ def action_attack(gamedata, args):
     """
     if len(args) == 0:
         if len(gamedata.encounter) == 0:
-            print("No enemies to attack.")
+            gamedata.io.print("No enemies to attack.")
             return
         attacks = gamedata.player.get_attacks()
-        attack = gameutil.choose_from_list(attacks, True, "Choose an attack", None, gameutil.FMT_NONE)
-        if attack == None:
+        index = gameutil.choose_index_from_list(attacks, True, "Choose an attack", None, gameutil.FMT_NONE,
+            gamedata.io)
+        if index == None:
             return
-        if attack.use(gamedata) != False:
+        if attacks[index].use(gamedata, gamedata.player.inventory.get_attack_items()[index]) != False:
             do_enemy_turn(gamedata)
     else:
-        print("Too many arguments to 'attack'")
+        gamedata.io.print("Too many arguments to 'attack'")
+
+# Actions available to the player; shared by every game
+PLAYER_ACTIONS = {
+    "help": PlayerAction(action_help, "You're already using this, dummy!"),
+    "stats": PlayerAction(action_stat, "Gives information on your current stats."),
+    "quit": PlayerAction(action_quit, "Quit the game."),
+    "move": PlayerAction(action_move, "Move to another room."),
+    "goto": PlayerAction(action_goto, "Travel to a room you have explored, e.g. 'goto bridge'."),
+    "inventory": PlayerAction(action_inventory, "List inventory items."),
+    "use": PlayerAction(action_use, "Use an item"),
+    "attack": PlayerAction(action_attack, "Attack an enemy")
+}
+
+def build_command_index(actions):
+    """
+    Build the trie of every command that the player can type: the given
+    actions, INTERACT_COMMANDS, and their synonyms. Values are command names.
+
+    Parameters
+    ----------
+    actions: dict[str -> PlayerAction]
+        The actions that the player can take.
+    """
+    commands = commandparser.Trie()
+    for name in actions:
+        commands.add(name, name)
+    for name in INTERACT_COMMANDS:
+        commands.add(name, name)
+    for synonym, name in commandparser.VERB_SYNONYMS.items():
+        if name in commands:
+            commands.add(synonym, name)
+    return commands
+
+PLAYER_COMMANDS = build_command_index(PLAYER_ACTIONS)
 
 def do_enemy_turn(gamedata):
     """
     Performs the enemies' turn.
     """
     gamedata.remove_dead_enemies()
-    for enemy in gamedata.encounter:
-        if not gamedata.player.is_dead():
-            enemy.do_turn(gamedata)
+    gamedata.encounter.take_turns(gamedata)
     gamedata.player.do_turn(gamedata)
 
-def try_enter_location(gamedata, exitdata):
-    location = exitdata["target"]
-    if "flag" in exitdata:
-        required_value = exitdata.get("flag-test", True)
-        flag = exitdata.get("flag")
-        if gamedata.flags.get(flag, exitdata.get("flag-default")) == required_value:
-            enter_location(gamedata, location)
-        else:
-            execute_level_action(gamedata, exitdata.get("fail-text", "For some reason, you weren't able to leave."))
+def try_enter_location(gamedata, exitindex):
+    """
+    Try to leave the current room through one of its exits.
+
+    Parameters
+    ----------
+    exitindex: int
+        The index of the exit in the current room's exit list.
+    """
+    exitdata = gamedata.world.rooms[gamedata.room].exits[exitindex]
+    if exitdata.is_open(gamedata.flags):
+        enter_room(gamedata, exitdata.room)
     else:
-        enter_location(gamedata, location)
+        exitdata.fail_text(gamedata)
 
 
 def enter_location(gamedata, location):
@@ -311,63 +429,86 @@ def enter_location(gamedata, location):
     Parameters
     ----------
     location: str
-        The new location to enter.
+        The name of the new location to enter.
+    """
+    if location in gamedata.world.rooms:
+        enter_room(gamedata, gamedata.world.rooms[location])
+    else:
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format("Unrecognized location '{}'".format(location)))
+
+def enter_room(gamedata, roomdata):
     """
+    Enters a new room.
+
+    Parameters
+    ----------
+    roomdata: world.Room
+        The room to enter.
+    """
+    location = roomdata.id
     if location == gamedata.room:
-        print("You tried to move there, but you were already there all along!\nWacky how nature do that.")
+        gamedata.io.print("You tried to move there, but you were already there all along!\nWacky how nature do that.")
         return
-    if location in gamedata.level:
+    if location not in gamedata.explored:
         gamedata.explored[location] = True
-        gamedata.lastroom = gamedata.room
-        gamedata.room = location
-        roomdata = gamedata.level[location]
-        if "desc-post-combat" in roomdata and location in gamedata.cleared_combats:
-            print(gameutil.FMT_IMPORTANT.format(roomdata["desc-post-combat"]))
-        if "desc" in roomdata:
-            execute_level_action(gamedata, roomdata["desc"])
-        else:
-            print(gameutil.FMT_IMPORTANT.format("There is nothing noteworthy about this room."))
-        if "encounter" in roomdata and location not in gamedata.cleared_combats:
-            for enemyname in roomdata["encounter"]:
-                if enemyname in gamedata.enemydefs:
-                    enemy = gameenemy.GameEnemy(enemyname, gamedata.enemydefs[enemyname])
-                    gamedata.encounter.append(enemy)
-                else:
-                    print("Unknown enemy '{}'".format(enemyname))
-            if len(gamedata.encounter) > 0:
-                fmt_text = gameutil.gen_ambush_text(gamedata.encounter)
-                print("You were ambushed by {}!".format(fmt_text))
+        gamedata.explored_version += 1
+    gamedata.lastroom = gamedata.room
+    gamedata.room = location
+    if roomdata.desc_post_combat != None and location in gamedata.cleared_combats:
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format(roomdata.desc_post_combat))
+    if roomdata.desc != None:
+        roomdata.desc(gamedata)
     else:
-        print(gameutil.FMT_IMPORTANT.format("Unrecognized location '{}'".format(location)))
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format("There is nothing noteworthy about this room."))
+    if len(roomdata.enemies) > 0 and location not in gamedata.cleared_combats:
+        for prototype in roomdata.enemies:
+            gamedata.encounter.add(prototype.spawn())
+        encounter = gamedata.encounter
+        gamedata.events.emit(gameevents.EncounterStarted(encounter.describe(),
+            {prototype.shortname: count for prototype, count in encounter.counts.items()}))
 
 def render(gamedata):
     """
     Prints useful information to the player.
     """
-    print(gamedata.player.format_string())
-    roomdata = gamedata.level[gamedata.room]
-    if len(gamedata.encounter) == 0:
-        if "exits" in roomdata and len(roomdata["exits"]) > 0:
-            exitdefs = roomdata["exits"]
+    gamedata.io.print(gamedata.player.format_string() + "\n" + render_room(gamedata))
+
+def render_room(gamedata):
+    """
+    Get the text that describes how to leave or interact with the current
+    room. The text only depends on the room, which rooms have been explored,
+    and whether the player is fighting, so it is cached until one of those
+    changes.
+    """
+    fighting = len(gamedata.encounter) > 0
+    key = (gamedata.room, gamedata.explored_version, fighting)
+    if key == gamedata.render_key:
+        return gamedata.render_text
+    lines = []
+    roomdata = gamedata.world.rooms[gamedata.room]
+    if not fighting:
+        if len(roomdata.exits) > 0:
+            exitdefs = roomdata.exits
             exitnum = len(exitdefs)
             if exitnum == 1:
-                print("There is 1 exit:")
+                lines.append("There is 1 exit:")
             else:
-                print("There are {} exits:".format(exitnum))
+                lines.append("There are {} exits:".format(exitnum))
             for i, exitdata in enumerate(exitdefs):
                 exitinfo = "???"
-                exitname = exitdata["exit"]
-                exittarget = exitdata["target"]
-                revealed = exitdata.get("revealed", False)
-                if (exittarget in gamedata.explored or revealed) and exittarget in gamedata.level:
-                    exitinfo = gamedata.level[exittarget]["name"]
-                print("    {}. {}:\t{}".format(i + 1, gameutil.FMT_OPTION.format(exitname), exitinfo))
-            print("Enter 'move location' to move to another location")
+                exitname = exitdata.exit
+                if exitdata.revealed or exitdata.target in gamedata.explored:
+                    exitinfo = exitdata.room.name
+                lines.append("    {}. {}:\t{}".format(i + 1, gameutil.FMT_OPTION.format(exitname), exitinfo))
+            lines.append("Enter 'move location' to move to another location")
         else:
-            print("There doesn't appear to be anywhere to go...")
-        print("Use 'search', 'look', 'take', or 'open' to interact with objects.")
+            lines.append("There doesn't appear to be anywhere to go...")
+        lines.append("Use 'search', 'look', 'take', or 'open' to interact with objects.")
     else:
-        print("Use 'attack', 'use', or 'look' to interact during combat.")
+        lines.append("Use 'attack', 'use', or 'look' to interact during combat.")
+    gamedata.render_key = key
+    gamedata.render_text = "\n".join(lines)
+    return gamedata.render_text
 
 def update(gamedata):
     """
@@ -375,39 +516,21 @@ def update(gamedata):
     """
     gamedata.remove_dead_enemies()
     if gamedata.room in END_EXITS:
-        print("Congratulations, you win!")
-        input("Press enter to continue...")
+        gamedata.events.emit(gameevents.GameWon())
         gamedata.finished = True
     if gamedata.player.is_dead():
-        reason = gamedata.player.get_cause_of_death()
-        if reason == "str":
-            print(gameutil.FMT_IMPORTANT.format("You perish from your physical injuries."))
-            print(gameutil.FMT_IMPORTANT.format("Congratulations, your death wasn't slow and painful!"))
-        elif reason == "dex":
-            print(gameutil.FMT_IMPORTANT.format("You fall to the ground and are unable to get back up."))
-            if len(gamedata.encounter) > 0:
-                print(gameutil.FMT_IMPORTANT.format("Unable to defend yourself any longer, your enemies finish you off."))
-                print(gameutil.FMT_IMPORTANT.format("Congratulations, you died with honor!"))
-            else:
-                print(gameutil.FMT_IMPORTANT.format("You lay in place in agony, and eventually die of dehydration."))
-                print(gameutil.FMT_IMPORTANT.format("Congratulations, your body decomposed peacefully!"))
-        elif reason == "wis":
-            if len(gamedata.encounter) > 0:
-                print(gameutil.FMT_IMPORTANT.format("You lose the will to defend yourself, and you stare blankly as your enemies finish you off."))
-                print(gameutil.FMT_IMPORTANT.format("Congratulations, you... uh, at least you tried?"))
-            else:
-                print(gameutil.FMT_IMPORTANT.format("You lose the will to continue onward, and you run back home."))
-                print(gameutil.FMT_IMPORTANT.format("Congratulations, you lived!"))
-        elif reason == "soul":
-            print(gameutil.FMT_IMPORTANT.format("You succumb to the darkness. You slowly feel your soul start to slip away,\n"+\
-                "and another one takes its place."))
-            print(gameutil.FMT_IMPORTANT.format("Congratulations, your body is still technically alive!"))
-        input("Press enter to continue...")
+        fighting = len(gamedata.encounter) > 0
+        gamedata.events.emit(gameevents.PlayerDied(gamedata.player.get_cause_of_death(), fighting))
         gamedata.finished = True
 
 def execute_level_action(gamedata, action):
     """
     Execute the given action.
+    Actions that are part of the level are compiled ahead of time (see
+    levelaction.compile_level_action). Other actions are compiled the first
+    time that they are executed, and the last LEVEL_ACTION_CACHE_SIZE of them
+    are kept by identity, so an action must not be changed once it has been
+    executed.
 
     Parameters
     ----------
@@ -423,61 +546,13 @@ def execute_level_action(gamedata, action):
         list: Run each item of the list as an action sequentially.
         str: Print out the string.
     """
-    if isinstance(action, list):
-        for item in action:
-            execute_level_action(gamedata, item)
-    elif isinstance(action, str):
-        print(gameutil.FMT_IMPORTANT.format(action))
-    elif isinstance(action, dict):
-        atype = action.get("type")
-        # Oh no what have I done
-        if atype == "print":
-            print(gameutil.FMT_IMPORTANT.format(action.get("text")))
-        elif atype == "setflag":
-            gamedata.flags[action.get("flag")] = action.get("value")
-        elif atype == "if":
-            flagname = action.get("flag")
-            value = None
-            if flagname in gamedata.flags:
-                value = gamedata.flags[flagname]
-            else:
-                value = action.get("default")
-            testvalue = action.get("value", None)
-            if (testvalue == None and value) or value == testvalue:
-                if "true" in action:
-                    execute_level_action(gamedata, action.get("true"))
-            else:
-                if "false" in action:
-                    execute_level_action(gamedata, action.get("false"))
-        elif atype == "has":
-            itemname = action.get("item")
-            if gamedata.player.has_item(itemname):
-                if "true" in action:
-                    execute_level_action(gamedata, action.get("true"))
-            else:
-                if "false" in action:
-                    execute_level_action(gamedata, action.get("false"))
-        elif atype == "give":
-            itemname = action.get("item")
-            item = gameitem.GameItem(itemname, gamedata.items[itemname])
-            gamedata.player.inventory.append(item)
-            print(gameutil.FMT_IMPORTANT.format("You got the {}".format(item.name)))
-        elif atype == "remove":
-            itemname = action.get("item")
-            removeall = action.get("remove-all", False)
-            i = 0
-            while i < len(gamedata.player.inventory):
-                item = gamedata.player.inventory[i]
-                if item.fullname == itemname:
-                    gamedata.player.inventory.pop(i)
-                    if not removeall:
-                        break
-                else:
-                    i = i + 1
-        else:
-            print("Unknown level action '{}'".format(atype))
-    else:
-        print("Not a valid level action type")
+    entry = _compiled_actions.pop(id(action), None)
+    if entry == None:
+        entry = (action, levelaction.compile_level_action(action))
+    _compiled_actions[id(action)] = entry
+    if len(_compiled_actions) > LEVEL_ACTION_CACHE_SIZE:
+        del _compiled_actions[next(iter(_compiled_actions))]
+    entry[1](gamedata)
 
 def interact_with(gamedata, action, directobject):
     """
@@ -489,21 +564,25 @@ def interact_with(gamedata, action, directobject):
     action: str
         The method of interaction, e.g. look, search, and take.
     directobject: str
-        The name of the object that is being interacted with.
+        The name of the object that is being interacted with, or an
+        abbreviation of it.
     """
     fmt_verb = action
     if action == "look":
         fmt_verb += " at"
-    roomdata = gamedata.level[gamedata.room].get("interact", {})
-    if directobject in roomdata:
-        objectdata = roomdata[directobject]
+    roomdata = gamedata.world.rooms[gamedata.room]
+    objectname = roomdata.object_index.find(directobject)
+    if objectname is commandparser.AMBIGUOUS:
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format("'{}' could mean more than one thing.".format(directobject)))
+    elif objectname != None:
+        directobject = objectname
+        objectdata = roomdata.interact[directobject]
         if action in objectdata:
-            data = objectdata[action]
-            execute_level_action(gamedata, data)
+            objectdata[action](gamedata)
         else:
-            print(gameutil.FMT_IMPORTANT.format("Can't {} the {}".format(fmt_verb, directobject)))
+            gamedata.io.print(gameutil.FMT_IMPORTANT.format("Can't {} the {}".format(fmt_verb, directobject)))
     else:
-        print(gameutil.FMT_IMPORTANT.format("There is no {} to {}".format(directobject, fmt_verb)))
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format("There is no {} to {}".format(directobject, fmt_verb)))
 
 def interact(gamedata, action, args):
     """
@@ -514,70 +593,169 @@ def interact(gamedata, action, args):
     action: str
         The action to perform
     args: list[str]
-        The arguments to the action
+        The arguments to the action; together they name the object to
+        interact with.
     """
     if len(gamedata.encounter) > 0 and action != "look":
-        print(gameutil.FMT_IMPORTANT.format("You can't do that while you're fighting."))
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format("You can't do that while you're fighting."))
     elif len(args) == 0:
         if action == "look":
             if len(gamedata.encounter) > 0:
-                print("You see {}".format(gameutil.gen_ambush_text(gamedata.encounter)))
+                gamedata.io.print("You see {}".format(gamedata.encounter.describe()))
             else:
-                roomdata = gamedata.level[gamedata.room]
-                execute_level_action(gamedata, roomdata.get("look", "There's not much to look at."))
+                gamedata.world.rooms[gamedata.room].look(gamedata)
         else:
-            print(gameutil.FMT_IMPORTANT.format("Not enough arguments to '{}'".format(action)))
-    elif len(args) == 1:
-        directobject = args[0]
+            gamedata.io.print(gameutil.FMT_IMPORTANT.format("Not enough arguments to '{}'".format(action)))
+    else:
+        directobject = " ".join(args)
         if len(gamedata.encounter) > 0 and action == "look":
-            did_find = False
-            for enemy in gamedata.encounter:
-                if enemy.shortname.lower() == directobject or enemy.name.lower() == directobject:
-                    print(gameutil.FMT_IMPORTANT.format(enemy.look))
-                    did_find = True
-                    break
-            if not did_find:
-                print(gameutil.FMT_IMPORTANT.format("There is no {} to look at".format(directobject)))
+            prototype = gamedata.world.rooms[gamedata.room].enemy_index.find(directobject)
+            enemy = None
+            if prototype is commandparser.AMBIGUOUS:
+                gamedata.io.print(gameutil.FMT_IMPORTANT.format("'{}' could mean more than one enemy.".format(directobject)))
+                return
+            elif prototype != None:
+                enemy = gamedata.encounter.find(prototype)
+            if enemy != None:
+                gamedata.io.print(gameutil.FMT_IMPORTANT.format(enemy.look))
+            else:
+                gamedata.io.print(gameutil.FMT_IMPORTANT.format("There is no {} to look at".format(directobject)))
         else:
             interact_with(gamedata, action, directobject)
-    else:
-        print(gameutil.FMT_IMPORTANT.format("Too many arguments to '{}'".format(action)))
+
+def game_turn(gamedata, userinput):
+    """
+    Carry out a line of the player's input, then update the game.
+
+    Parameters
+    ----------
+    userinput: str
+        What the player typed, e.g. "move north".
+    """
+    userargs = userinput.lower().strip().split()
+    if len(userargs) > 0:
+        action = gamedata.commands.find(userargs[0])
+        args = userargs[1:]
+        if action is commandparser.AMBIGUOUS:
+            gamedata.io.print(gameutil.FMT_IMPORTANT.format("'{}' could mean more than one action.".format(userargs[0])))
+        elif action == None:
+            gamedata.io.print(gameutil.FMT_IMPORTANT.format("Unknown action '{}'".format(userargs[0])))
+        elif action in gamedata.actions:
+            gamedata.actions[action].func(gamedata, args)
+        elif action in INTERACT_COMMANDS:
+            interact(gamedata, action, args)
+    update(gamedata)
 
 def game_loop(gamedata):
     """
     Basic game loop
     """
     while not gamedata.finished:
-        render(gamedata)
-        userinput = input("> ").lower().strip()
-        userargs = userinput.split()
-        if len(userargs) > 0:
-            action = userargs[0]
-            args = userargs[1:]
-            if action in gamedata.actions:
-                gamedata.actions[action].func(gamedata, args)
-            elif action in INTERACT_COMMANDS:
-                interact(gamedata, action, args)
-            else:
-                print(gameutil.FMT_IMPORTANT.format("Unknown action '{}'".format(action)))
-        update(gamedata)
+        try:
+            render(gamedata)
+            game_turn(gamedata, gamedata.io.input("> "))
+        except EOFError:
+            # Ran out of input
+            gamedata.finished = True
 
-# The main function for the game
-def main():
+def start_game(gameworld, io, seed=None, render=True):
     """
-    Initialize game
+    Start a new game: create the player's character and enter the first
+    room. Returns the game, ready to be played with game_loop.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world to play in.
+    io: GameIO
+        Where the game reads input from and writes output to.
+    seed: int
+        The seed of the game's random number generator. A new one is picked
+        if not given.
+    render: bool
+        If false, combat and level effects aren't written to io, which saves
+        formatting them when the output is discarded anyway. The IO must not
+        be interactive, since the text renderer is what waits at pauses.
+    """
+    player = character.generate_character(gameworld.classdefs, gameworld.item_prototypes, io)
+    gamedata = GameData(gameworld, player, io, seed, render)
+    gamedata.io.print(gameutil.FMT_IMPORTANT.format("Type 'help' for information."))
+    if START_ROOM in gameworld.rooms:
+        enter_location(gamedata, START_ROOM)
+    else:
+        enter_location(gamedata, next(iter(gameworld.rooms)))
+    return gamedata
+
+def play(gameworld, io, seed=None, render=True):
+    """
+    Play a game from the beginning. Returns the game once it has finished.
+    Parameters are the same as start_game's.
     """
-    level = load_json(FILE_LEVEL)
-    items = load_json(FILE_ITEMS)
-    classdefs = load_json(FILE_CLASSES)
-    enemydefs = load_json(FILE_ENEMIES)
-    
-    player = character.generate_character(classdefs, items)
-    gamedata = GameData(level, items, player, enemydefs)
-    print(gameutil.FMT_IMPORTANT.format("Type 'help' for information."))
-    enter_location(gamedata, "WHOUS")
+    gamedata = start_game(gameworld, io, seed, render)
     game_loop(gamedata)
+    return gamedata
+
+# The main function for the game
+def main(io=None, level=FILE_LEVEL, seed=None):
+    """
+    Initialize game
+
+    Parameters
+    ----------
+    io: GameIO
+        Where the game reads input from and writes output to. Defaults to the
+        terminal.
+    level: str
+        The level file to play; see load_sources.
+    seed: int
+        The seed of the game's random number generator.
+    """
+    if io == None:
+        io = gameio.TERMINAL
+    play(load_content(level=level), io, seed)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Play the game.")
+    parser.add_argument("--world", default=None,
+        help="level file to play instead of {}, e.g. zork.json".format(FILE_LEVEL))
+    parser.add_argument("--seed", type=int, default=None, help="random seed")
+    parser.add_argument("--record", default=None,
+        help="file to record the game's seed and input to, for replay.py")
+    parser.add_argument("--metrics", default=None,
+        help="file to write each command's timings to when the game ends (.json for JSON, "
+            "otherwise Prometheus text)")
+    parser.add_argument("--profile", default=None, help="file to write cProfile stats to")
+    args = parser.parse_args(argv)
+    level = FILE_LEVEL
+    if args.world != None:
+        level = os.path.abspath(args.world)
+    # Don't wait for enter to be pressed when input is piped in
+    io = gameio.TerminalIO(sys.stdin.isatty())
+    seed = args.seed
+    logfile = None
+    if args.record != None:
+        if seed == None:
+            seed = new_seed()
+        logfile = open(args.record, "w", encoding="utf-8")
+        io = gameio.RecordingIO(io, logfile, seed, args.world)
+    instrumentation = None
+    if args.metrics != None:
+        # When run as a script, this module is __main__ rather than main
+        instrumentation = instrument.Instrumentation(sys.modules[__name__])
+        instrumentation.enable()
+    try:
+        if args.profile != None:
+            instrument.profile(args.profile, main, io, level, seed)
+        else:
+            main(io, level, seed)
+        if logfile != None:
+            io.close()
+    finally:
+        if logfile != None:
+            logfile.close()
+        if instrumentation != None:
+            instrumentation.metrics.write(args.metrics)
 
 # run the main function
 if __name__ == '__main__':
-	main()
\ No newline at end of file
+	main_cli()
\ No newline at end of file
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Replays recorded game sessions.
+
+A session is recorded with `python main.py --record session.log` (or
+`python server.py --record DIR` for every connection). The log holds the
+game's seed and every line that the player typed, so playing it again takes
+exactly the same turns and rolls. Replaying doesn't wait for input or write
+output, so many sessions can be replayed each second. This is useful for
+reproducing a player's bug report, and for checking that a content change
+doesn't change how recorded games play out.
+
+Run with e.g. `python replay.py session.log --show` to see the game again, or
+`python replay.py logs/*.log --check` to check every log's output digest.
+`--metrics FILE` records how long each command took, and `--profile FILE`
+writes cProfile stats of the replays (see instrument.py).
+"""
+import sys
+assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
+
+import argparse
+import json
+import os
+import time
+import gameio
+import instrument
+import main
+
+class SessionError(Exception):
+    """
+    Raised when a session log can't be read.
+    """
+    pass
+
+class Session:
+    """
+    A recorded session.
+
+    Attributes
+    ----------
+    seed: int
+        The seed of the game's random number generator.
+    level: str
+        The level file that was played, or None for the default level.
+    lines: list[str]
+        Every line of input, in order.
+    digest: str
+        The digest of the game's output, or None if the game didn't finish
+        normally.
+    """
+    __slots__ = ("seed", "level", "lines", "digest")
+    def __init__(self, seed, level=None, lines=(), digest=None):
+        self.seed = seed
+        self.level = level
+        self.lines = list(lines)
+        self.digest = digest
+
+def read_session(logfile):
+    """
+    Read a session log written by gameio.RecordingIO. Raises SessionError if
+    it isn't one.
+
+    Parameters
+    ----------
+    logfile: file
+        A text file to read from.
+    """
+    session = None
+    for i, line in enumerate(logfile):
+        try:
+            value = json.loads(line)
+        except ValueError:
+            raise SessionError("Line {} is not valid JSON".format(i + 1))
+        if session == None:
+            if not isinstance(value, dict) or not isinstance(value.get("seed"), int):
+                raise SessionError("The log doesn't start with a seed")
+            session = Session(value["seed"], value.get("level"))
+        elif isinstance(value, str):
+            session.lines.append(value)
+        elif isinstance(value, dict) and "digest" in value:
+            session.digest = value["digest"]
+        else:
+            raise SessionError("Unexpected value on line {}".format(i + 1))
+    if session == None:
+        raise SessionError("The log is empty")
+    return session
+
+def replay(gameworld, session, io=None, check=False):
+    """
+    Play a recorded session again. Returns the finished game, and the digest
+    of its output if check is true (otherwise None).
+
+    Parameters
+    ----------
+    gameworld: World
+        The world to play in.
+    session: Session
+        The session to play.
+    io: GameIO
+        Where the game's output is written; it must read the session's lines
+        (e.g. gameio.ScriptedIO(session.lines)). By default the output is
+        discarded, and combat and level effects aren't even formatted.
+    check: bool
+        If true, the output's digest is computed, so that it can be compared
+        with the session's.
+    """
+    if io == None:
+        if not check:
+            return main.play(gameworld, gameio.NullIO(session.lines), session.seed, render=False), None
+        io = gameio.NullIO(session.lines)
+    if not check:
+        return main.play(gameworld, io, session.seed), None
+    recorder = gameio.RecordingIO(io)
+    gamedata = main.play(gameworld, recorder, session.seed)
+    return gamedata, recorder.digest()
+
+def _replay_all(sessions, show, check, repeat):
+    # Replay (path, session, world) tuples, printing how each ended. Returns
+    # the number of replays and the number of sessions whose output changed.
+    changed = 0
+    count = 0
+    for path, session, gameworld in sessions:
+        for _ in range(max(repeat, 1)):
+            io = None
+            if show:
+                io = gameio.ScriptedIO(session.lines)
+            gamedata, digest = replay(gameworld, session, io, check)
+            count += 1
+        if show:
+            print(io.get_output())
+        status = "ended in {}".format(gamedata.room)
+        if gamedata.player.is_dead():
+            status = "died in {}".format(gamedata.room)
+        if check:
+            if session.digest == None:
+                status += ", no digest to check"
+            elif digest != session.digest:
+                status += ", OUTPUT CHANGED"
+                changed += 1
+            else:
+                status += ", output unchanged"
+        print("{}: {}".format(path, status))
+    return count, changed
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded game sessions.")
+    parser.add_argument("logs", nargs="+", help="session logs to replay")
+    parser.add_argument("--world", default=None,
+        help="level file to replay in instead of the recorded one")
+    parser.add_argument("--directory", default=None, help="folder with the content files")
+    parser.add_argument("--check", action="store_true",
+        help="check that each session's output is unchanged")
+    parser.add_argument("--show", action="store_true", help="print each session's output")
+    parser.add_argument("--repeat", type=int, default=1, help="times to replay each session")
+    parser.add_argument("--metrics", default=None,
+        help="file to write each command's timings to (.json for JSON, otherwise Prometheus text)")
+    parser.add_argument("--profile", default=None, help="file to write cProfile stats to")
+    args = parser.parse_args(argv)
+    sessions = []
+    for path in args.logs:
+        try:
+            with open(path, encoding="utf-8") as logfile:
+                sessions.append((path, read_session(logfile)))
+        except (OSError, SessionError) as e:
+            print("{}: {}".format(path, e))
+            return 1
+    worlds = {}
+    for i, (path, session) in enumerate(sessions):
+        level = args.world or session.level
+        level = main.FILE_LEVEL if level == None else os.path.abspath(level)
+        if level not in worlds:
+            worlds[level] = main.load_content(level=level, directory=args.directory)
+        sessions[i] = (path, session, worlds[level])
+    instrumentation = None
+    if args.metrics != None:
+        instrumentation = instrument.Instrumentation(main)
+        instrumentation.enable()
+    start = time.perf_counter()
+    if args.profile != None:
+        count, changed = instrument.profile(args.profile, _replay_all, sessions, args.show,
+            args.check, args.repeat)
+    else:
+        count, changed = _replay_all(sessions, args.show, args.check, args.repeat)
+    elapsed = time.perf_counter() - start
+    if instrumentation != None:
+        instrumentation.disable()
+        instrumentation.metrics.write(args.metrics)
+    if args.profile != None:
+        instrument.print_profile(args.profile)
+    print("Replayed {} sessions in {:.2f}s ({:.0f} per second)".format(
+        count, elapsed, count / max(elapsed, 1e-9)))
+    if changed > 0:
+        print("{} of {} sessions changed".format(changed, len(sessions)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
@@ -0,0 +1,316 @@
+"""
+Compact binary snapshots of a game in progress.
+
+A snapshot only stores the game's progress. Rooms, items and enemies are
+stored as their IDs in the world (see World.room_ids), and flags by their
+slots (see World.flag_layout), so a snapshot can only be loaded into a world
+with the same signature.
+
+Layout (little endian):
+    header      magic "TXAS", version u8, world signature u32, ID width u8
+    rooms       room ID, last room ID (no ID if none)
+    player      (max u8, value u8) for STR, DEX, WIS, SOUL; barricade u8
+    inventory   count u16, then (item ID, durability i16) per item
+    explored    bitset over room IDs
+    cleared     bitset over room IDs
+    flags       set bitset, then value bitset, over boolean flag slots;
+                count u16, then (slot ID, value) per set value flag;
+                count u16, then (name, value) per flag without a slot
+    encounter   count u16, then (enemy ID, health u16, curse i16,
+                next action u8) per enemy
+IDs are u16 if every room, item, enemy and value flag slot fits below 0xFFFF,
+otherwise u32. The largest value of the width is the "no ID" value, so it is
+never a valid ID. Strings are a u16 byte length followed by UTF-8. Values are
+a type tag u8 followed by the value.
+"""
+import struct
+import character
+import gameencounter
+import gameflags
+import main
+
+MAGIC = b"TXAS"
+VERSION = 3
+NO_ACTION = 0xFF
+
+_HEADER = struct.Struct("<4sBIB")
+_PLAYER = struct.Struct("<9B")
+_COUNT = struct.Struct("<H")
+_INT = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+
+_TAG_NONE = 0
+_TAG_FALSE = 1
+_TAG_TRUE = 2
+_TAG_INT = 3
+_TAG_FLOAT = 4
+_TAG_STR = 5
+
+class SaveError(Exception):
+    """
+    Raised when a snapshot can't be loaded.
+    """
+    pass
+
+class _IdFormat:
+    """
+    The structs for packing IDs of one width.
+
+    Attributes
+    ----------
+    width: int
+        The size of an ID in bytes.
+    no_id: int
+        The ID stored in place of a missing room.
+    """
+    __slots__ = ("width", "no_id", "id", "rooms", "item", "enemy")
+    def __init__(self, width, code):
+        self.width = width
+        self.no_id = (1 << width * 8) - 1
+        self.id = struct.Struct("<" + code)
+        self.rooms = struct.Struct("<" + code * 2)
+        self.item = struct.Struct("<" + code + "h")
+        self.enemy = struct.Struct("<" + code + "HhB")
+
+_ID_FORMATS = {2: _IdFormat(2, "H"), 4: _IdFormat(4, "I")}
+
+def _id_format(gameworld):
+    """
+    Get the narrowest ID format that every ID in a world fits into, keeping
+    the "no ID" value free. Raises SaveError if none is wide enough.
+    """
+    largest = max(len(gameworld.room_names), len(gameworld.item_names),
+        len(gameworld.enemy_names), len(gameworld.flag_layout.value_names))
+    for width in sorted(_ID_FORMATS):
+        if largest <= _ID_FORMATS[width].no_id:
+            return _ID_FORMATS[width]
+    raise SaveError("The world has too many IDs to save ({})".format(largest))
+
+def _enemy_actions(enemy):
+    """
+    List every action an enemy can perform, including follow-up actions, in
+    a fixed order. An action's index in this list is its ID.
+    """
+    actions = []
+    for action in enemy.attacks:
+        while action != None and action not in actions:
+            actions.append(action)
+            action = action.next_action
+    return actions
+
+def _pack_str(out, value):
+    data = value.encode("utf-8")
+    out += _COUNT.pack(len(data))
+    out += data
+
+def _pack_value(out, value):
+    if value == None:
+        out.append(_TAG_NONE)
+    elif value is False:
+        out.append(_TAG_FALSE)
+    elif value is True:
+        out.append(_TAG_TRUE)
+    elif isinstance(value, int):
+        out.append(_TAG_INT)
+        out += _INT.pack(value)
+    elif isinstance(value, float):
+        out.append(_TAG_FLOAT)
+        out += _FLOAT.pack(value)
+    elif isinstance(value, str):
+        out.append(_TAG_STR)
+        _pack_str(out, value)
+    else:
+        raise SaveError("Can't save flag value '{}'".format(value))
+
+def _bitset_size(count):
+    return (count + 7) // 8
+
+def _pack_bitset(out, names, ids):
+    bits = 0
+    for name in names:
+        bits |= 1 << ids[name]
+    out += bits.to_bytes(_bitset_size(len(ids)), "little")
+
+def save_session(gamedata):
+    """
+    Take a snapshot of a game. Returns the snapshot as bytes.
+
+    Parameters
+    ----------
+    gamedata: GameData
+        The game to save.
+    """
+    gameworld = gamedata.world
+    ids = _id_format(gameworld)
+    try:
+        return _pack_session(gamedata, ids)
+    except struct.error as e:
+        raise SaveError("Game doesn't fit in a save: {}".format(e)) from e
+
+def _pack_session(gamedata, ids):
+    gameworld = gamedata.world
+    room_ids = gameworld.room_ids
+    player = gamedata.player
+    out = bytearray(_HEADER.pack(MAGIC, VERSION, gameworld.signature, ids.width))
+    out += ids.rooms.pack(room_ids.get(gamedata.room, ids.no_id), room_ids.get(gamedata.lastroom, ids.no_id))
+    out += _PLAYER.pack(player.strength.maxvalue, player.strength.value,
+        player.dexterity.maxvalue, player.dexterity.value,
+        player.wisdom.maxvalue, player.wisdom.value,
+        player.soul.maxvalue, player.soul.value, player.barricade)
+    item_ids = gameworld.item_ids
+    out += _COUNT.pack(len(player.inventory))
+    for item in player.inventory:
+        out += ids.item.pack(item_ids[item.fullname], item.durability)
+    _pack_bitset(out, gamedata.explored, room_ids)
+    _pack_bitset(out, gamedata.cleared_combats, room_ids)
+    flags = gamedata.flags
+    flagbytes = _bitset_size(len(gameworld.flag_layout.bool_names))
+    out += flags.isset.to_bytes(flagbytes, "little")
+    out += flags.bits.to_bytes(flagbytes, "little")
+    value_items = flags.value_items()
+    out += _COUNT.pack(len(value_items))
+    for index, value in value_items:
+        out += ids.id.pack(index)
+        _pack_value(out, value)
+    out += _COUNT.pack(len(flags.extra))
+    for name, value in flags.extra.items():
+        _pack_str(out, name)
+        _pack_value(out, value)
+    enemy_ids = gameworld.enemy_ids
+    out += _COUNT.pack(len(gamedata.encounter))
+    for enemy in gamedata.encounter:
+        next_action = NO_ACTION
+        if enemy.next_action != None:
+            next_action = _enemy_actions(enemy).index(enemy.next_action)
+        out += ids.enemy.pack(enemy_ids[enemy.shortname], enemy.health.value, enemy.curse, next_action)
+    return bytes(out)
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+    def unpack(self, fmt):
+        values = fmt.unpack_from(self.data, self.offset)
+        self.offset += fmt.size
+        return values
+    def read_bytes(self, size):
+        if self.offset + size > len(self.data):
+            raise SaveError("Save data is truncated")
+        value = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return value
+    def read_str(self):
+        size, = self.unpack(_COUNT)
+        return self.read_bytes(size).decode("utf-8")
+    def read_value(self):
+        tag = self.read_bytes(1)[0]
+        if tag == _TAG_NONE:
+            return None
+        elif tag == _TAG_FALSE:
+            return False
+        elif tag == _TAG_TRUE:
+            return True
+        elif tag == _TAG_INT:
+            return self.unpack(_INT)[0]
+        elif tag == _TAG_FLOAT:
+            return self.unpack(_FLOAT)[0]
+        elif tag == _TAG_STR:
+            return self.read_str()
+        raise SaveError("Unknown value type {}".format(tag))
+    def read_bitset(self, names):
+        bits = int.from_bytes(self.read_bytes(_bitset_size(len(names))), "little")
+        return {name: True for i, name in enumerate(names) if bits >> i & 1}
+
+def restore_session(gamedata, data):
+    """
+    Replace a game's progress with a snapshot.
+
+    Parameters
+    ----------
+    gamedata: GameData
+        The game to restore into. Its world must match the snapshot's.
+    data: bytes
+        The snapshot, as returned by save_session.
+    """
+    gameworld = gamedata.world
+    reader = _Reader(data)
+    try:
+        magic, version, signature, width = reader.unpack(_HEADER)
+        if magic != MAGIC:
+            raise SaveError("Not a save file")
+        if version != VERSION:
+            raise SaveError("Unsupported save version {}".format(version))
+        if signature != gameworld.signature:
+            raise SaveError("Save was made for different game content")
+        ids = _ID_FORMATS.get(width)
+        if ids == None:
+            raise SaveError("Unsupported ID width {}".format(width))
+        room, lastroom = reader.unpack(ids.rooms)
+        room = gameworld.room_names[room] if room != ids.no_id else ""
+        lastroom = gameworld.room_names[lastroom] if lastroom != ids.no_id else ""
+        stats = reader.unpack(_PLAYER)
+        inventory = []
+        count, = reader.unpack(_COUNT)
+        for _ in range(count):
+            itemid, durability = reader.unpack(ids.item)
+            itemname = gameworld.item_names[itemid]
+            item = gameworld.item_prototypes[itemname].create()
+            item.durability = durability
+            inventory.append(item)
+        explored = reader.read_bitset(gameworld.room_names)
+        cleared_combats = reader.read_bitset(gameworld.room_names)
+        flags = gameflags.Flags(gameworld.flag_layout)
+        flagbytes = _bitset_size(len(gameworld.flag_layout.bool_names))
+        flags.isset = int.from_bytes(reader.read_bytes(flagbytes), "little")
+        flags.bits = int.from_bytes(reader.read_bytes(flagbytes), "little")
+        count, = reader.unpack(_COUNT)
+        for _ in range(count):
+            index, = reader.unpack(ids.id)
+            flags.values[index] = reader.read_value()
+        count, = reader.unpack(_COUNT)
+        for _ in range(count):
+            name = reader.read_str()
+            flags.extra[name] = reader.read_value()
+        encounter = gameencounter.Encounter()
+        count, = reader.unpack(_COUNT)
+        for _ in range(count):
+            enemyid, health, curse, next_action = reader.unpack(ids.enemy)
+            enemyname = gameworld.enemy_names[enemyid]
+            enemy = gameworld.enemy_prototypes[enemyname].spawn()
+            enemy.health.value = health
+            enemy.curse = curse
+            if next_action != NO_ACTION:
+                enemy.next_action = _enemy_actions(enemy)[next_action]
+            encounter.add(enemy)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise SaveError("Save data is corrupt") from e
+    player = gamedata.player
+    for i, stat in enumerate([player.strength, player.dexterity, player.wisdom, player.soul]):
+        stat.maxvalue = stats[i * 2]
+        stat.value = stats[i * 2 + 1]
+    player.barricade = stats[8]
+    player.inventory.replace(inventory)
+    gamedata.room = room
+    gamedata.lastroom = lastroom
+    gamedata.explored = explored
+    gamedata.explored_version += 1
+    gamedata.cleared_combats = cleared_combats
+    gamedata.flags = flags
+    gamedata.encounter = encounter
+
+def load_session(gameworld, data, io=None):
+    """
+    Create a game from a snapshot.
+
+    Parameters
+    ----------
+    gameworld: World
+        The world that the snapshot was made in.
+    data: bytes
+        The snapshot, as returned by save_session.
+    io: GameIO
+        Where the game reads input from and writes output to.
+    """
+    gamedata = main.GameData(gameworld, character.Character(), io)
+    restore_session(gamedata, data)
+    return gamedata
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+A telnet-style game server.
+
+Content is loaded once and shared by every connection. Each connection gets
+its own game (player, flags, explored rooms, encounter), which is played on
+the asyncio event loop a line at a time, so a session is just its game and
+a few buffers; there are no threads. The event loop also owns the sockets: it
+writes the game's output back to the client, and disconnects idle or slow
+clients.
+
+The game reads input synchronously, and a turn can ask for more lines than
+the command itself: menus (targets, reactions) and pauses. When a turn asks
+for a line that hasn't arrived yet, it stops. Once the line arrives, the game
+is restored to how it was at the start of the turn (see savegame) and the
+turn is played again with every line so far. Games with the same state and
+input always play out the same way, so only the output after what was
+already sent is new.
+
+Run with e.g. `python server.py --port 4000`, then connect with
+`telnet localhost 4000`.
+"""
+import sys
+assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
+
+import argparse
+import array
+import asyncio
+import itertools
+import os
+import gameio
+import instrument
+import main
+import savegame
+
+MAX_LINE_LENGTH = 256
+TELNET_IAC = 255
+TELNET_SB = 250
+TELNET_SE = 240
+# WILL, WONT, DO and DONT are followed by an option byte
+TELNET_OPTION_COMMANDS = range(251, 255)
+# Seconds between writes of the metrics file
+METRICS_INTERVAL = 15
+
+class _NeedInput(Exception):
+    """
+    Raised by SessionIO when the game reads a line that hasn't arrived yet.
+    """
+    pass
+
+class SessionIO(gameio.GameIO):
+    """
+    IO for a game that is played over a connection, a turn at a time.
+
+    Attributes
+    ----------
+    lines: list[str]
+        The lines that have arrived since the current turn started.
+    read: int
+        The number of lines that the game has read in this try of the turn.
+    output: list[str]
+        Everything that has been written in this try of the turn.
+    """
+    def __init__(self, interactive=True):
+        super().__init__(interactive)
+        self.lines = []
+        self.read = 0
+        self.output = []
+    def print(self, *args, sep=" ", end="\n"):
+        self.output.append(sep.join(str(x) for x in args) + end)
+    def input(self, prompt=""):
+        self.output.append(prompt)
+        if self.read == len(self.lines):
+            raise _NeedInput()
+        line = self.lines[self.read]
+        self.read += 1
+        return line
+
+class GameSession:
+    """
+    A game that is played a line at a time.
+
+    Attributes
+    ----------
+    world: World
+        The world that the game is played in.
+    seed: int
+        The seed of the game's random number generator.
+    io: SessionIO
+        Collects the game's input and output.
+    recorder: gameio.RecordingIO
+        If not None, records the game; the game reads and writes through it.
+    gamedata: GameData
+        The game, or None until the player's character has been created.
+    finished: bool
+        True once the game has ended.
+    """
+    __slots__ = ("world", "seed", "io", "recorder", "gamedata", "finished", "_snapshot", "_sent", "_top")
+    def __init__(self, gameworld, io, seed=None, recorder=None):
+        """
+        Parameters
+        ----------
+        gameworld: World
+            The world to play in.
+        io: SessionIO
+            The session's IO.
+        seed: int
+            The seed of the game's random number generator. A new one is
+            picked if not given.
+        recorder: gameio.RecordingIO
+            If given, a recorder of io to play through.
+        """
+        if seed == None:
+            seed = main.new_seed()
+        self.world = gameworld
+        self.seed = seed
+        self.io = io
+        self.recorder = recorder
+        self.gamedata = None
+        self.finished = False
+        # How the game was at the start of the current turn, if it has been
+        # stopped to wait for input
+        self._snapshot = None
+        # The number of characters of the turn's output that have been sent
+        self._sent = 0
+        # Where the next turn starts in the current try: (output length,
+        # lines read, recorder mark)
+        self._top = None
+    def start(self):
+        """
+        Start the game. Returns the output to send to the client.
+        """
+        self._snapshot = (None, None, self._mark())
+        return self._play()
+    def feed(self, line):
+        """
+        Play a line of input. Returns the output to send to the client.
+
+        Parameters
+        ----------
+        line: str
+            The line, without its line ending.
+        """
+        if self._snapshot == None:
+            self._snapshot = self._save()
+        else:
+            self._restore(self._snapshot)
+        self.io.lines.append(line)
+        return self._play()
+    def close(self):
+        """
+        Close the session's log, if it is recorded.
+        """
+        if self.recorder != None and self.recorder.logfile != None:
+            self.recorder.logfile.close()
+    def _mark(self):
+        if self.recorder == None:
+            return None
+        return self.recorder.mark()
+    def _save(self):
+        gamedata = self.gamedata
+        # The generator's state is 625 numbers; as an array, it takes a
+        # tenth of the memory of a tuple
+        version, internal, gauss_next = gamedata.rng.getstate()
+        rngstate = (version, array.array("I", internal), gauss_next)
+        return (savegame.save_session(gamedata), rngstate, self._mark())
+    def _restore(self, snapshot):
+        data, rngstate, mark = snapshot
+        if data == None:
+            self.gamedata = None
+        else:
+            savegame.restore_session(self.gamedata, data)
+            version, internal, gauss_next = rngstate
+            self.gamedata.rng.setstate((version, tuple(internal), gauss_next))
+        if mark != None:
+            self.recorder.rewind(mark)
+    def _play(self):
+        # Play the turn's lines from the start of the turn, until the game
+        # waits for a line that hasn't arrived or ends
+        io = self.io
+        gameio_ = io if self.recorder == None else self.recorder
+        io.read = 0
+        io.output.clear()
+        self._top = None
+        try:
+            if self.gamedata == None:
+                self.gamedata = main.start_game(self.world, gameio_, self.seed)
+                main.render(self.gamedata)
+            gamedata = self.gamedata
+            while not gamedata.finished:
+                self._top = (sum(len(text) for text in io.output), io.read, self._mark())
+                main.game_turn(gamedata, gameio_.input("> "))
+                if not gamedata.finished:
+                    main.render(gamedata)
+        except _NeedInput:
+            text = "".join(io.output)
+            new = text[self._sent:]
+            # The output is written again if the turn is played again
+            io.output.clear()
+            if self._top != None and self._top[1] == io.read:
+                # Waiting for the next command: the turn has ended
+                size, _, mark = self._top
+                if mark != None:
+                    self.recorder.rewind(mark)
+                io.lines.clear()
+                self._snapshot = None
+                self._sent = len(text) - size
+            else:
+                self._sent = len(text)
+            return new
+        if self.recorder != None:
+            self.recorder.close()
+        io.print("Goodbye!")
+        self.finished = True
+        return "".join(io.output)[self._sent:]
+
+_DATA = 0
+_COMMAND = 1
+_OPTION = 2
+_SUBNEGOTIATION = 3
+_SUBNEGOTIATION_IAC = 4
+
+class _LineCleaner:
+    """
+    Removes telnet commands, line endings and other unprintable characters
+    from a connection's input. A command can be split across lines, so one
+    cleaner is used for every line of a connection.
+
+    IAC IAC is an escaped 0xFF data byte, which is unprintable and dropped.
+    WILL, WONT, DO and DONT commands are three bytes long, other commands are
+    two, and everything from IAC SB up to IAC SE is a subnegotiation.
+    """
+    __slots__ = ("state",)
+    def __init__(self):
+        self.state = _DATA
+    def clean(self, data):
+        """
+        Clean a line of input. Returns the printable text.
+
+        Parameters
+        ----------
+        data: bytes
+            The line, as read from the connection.
+        """
+        out = bytearray()
+        state = self.state
+        for byte in data:
+            if state == _DATA:
+                if byte == TELNET_IAC:
+                    state = _COMMAND
+                elif byte >= 32 and byte < 127:
+                    out.append(byte)
+            elif state == _COMMAND:
+                if byte == TELNET_SB:
+                    state = _SUBNEGOTIATION
+                elif byte in TELNET_OPTION_COMMANDS:
+                    state = _OPTION
+                else:
+                    # A two byte command, or IAC IAC
+                    state = _DATA
+            elif state == _OPTION:
+                state = _DATA
+            elif state == _SUBNEGOTIATION:
+                if byte == TELNET_IAC:
+                    state = _SUBNEGOTIATION_IAC
+            elif byte == TELNET_SE:
+                state = _DATA
+            else:
+                # IAC IAC is data inside the subnegotiation
+                state = _SUBNEGOTIATION
+        self.state = state
+        return out.decode("ascii")
+
+class GameServer:
+    """
+    Accepts connections and runs a game for each one.
+
+    Attributes
+    ----------
+    world: World
+        The world that is shared by every game.
+    sessions: set[GameSession]
+        The connected sessions.
+    record_dir: str
+        If not None, each game is recorded to a log in this folder, which
+        replay.py can play again.
+    level: str
+        The level file that is recorded in session logs.
+    metrics: instrument.Metrics
+        If not None, written to metrics_path every METRICS_INTERVAL seconds.
+    metrics_path: str
+        Where to write the metrics; see instrument.Metrics.write.
+    """
+    def __init__(self, gameworld, max_sessions=500, idle_timeout=600,
+            write_timeout=30, interactive=True, record_dir=None, level=None,
+            metrics=None, metrics_path=None):
+        self.world = gameworld
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.write_timeout = write_timeout
+        self.interactive = interactive
+        self.sessions = set()
+        self.record_dir = record_dir
+        self.level = level
+        self.metrics = metrics
+        self.metrics_path = metrics_path
+        self._session_ids = itertools.count(1)
+    def new_session(self):
+        """
+        Create a session for a new connection. It is recorded if the server
+        records games.
+        """
+        io = SessionIO(self.interactive)
+        if self.record_dir == None:
+            return GameSession(self.world, io)
+        seed = main.new_seed()
+        name = "session-{}-{}.log".format(os.getpid(), next(self._session_ids))
+        logfile = open(os.path.join(self.record_dir, name), "w", encoding="utf-8")
+        return GameSession(self.world, io, seed, gameio.RecordingIO(io, logfile, seed, self.level))
+    async def _send(self, writer, text):
+        if len(text) > 0:
+            writer.write(text.replace("\n", "\r\n").encode("utf-8"))
+            await asyncio.wait_for(writer.drain(), self.write_timeout)
+    async def handle_client(self, reader, writer):
+        """
+        Run a game for a newly connected client.
+        """
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b"The server is full, try again later.\r\n")
+            await writer.drain()
+            writer.close()
+            return
+        session = self.new_session()
+        self.sessions.add(session)
+        cleaner = _LineCleaner()
+        try:
+            await self._send(writer, session.start())
+            while not session.finished:
+                try:
+                    data = await asyncio.wait_for(reader.readline(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    writer.write(b"\r\nDisconnected for inactivity.\r\n")
+                    break
+                if not data:
+                    break
+                if len(data) > MAX_LINE_LENGTH:
+                    data = data[:MAX_LINE_LENGTH]
+                await self._send(writer, session.feed(cleaner.clean(data)))
+        except asyncio.TimeoutError:
+            # The client isn't reading its output fast enough; drop the
+            # connection without waiting for the rest to be sent.
+            writer.transport.abort()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            session.close()
+            self.sessions.discard(session)
+            try:
+                writer.close()
+            except ConnectionError:
+                pass
+    async def serve(self, host, port):
+        """
+        Accept connections forever.
+        """
+        server = await asyncio.start_server(self.handle_client, host, port, limit=MAX_LINE_LENGTH * 4)
+        if self.metrics != None:
+            asyncio.ensure_future(self._write_metrics())
+        async with server:
+            await server.serve_forever()
+    async def _write_metrics(self):
+        while True:
+            await asyncio.sleep(METRICS_INTERVAL)
+            self.metrics.write(self.metrics_path)
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Host the game over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--max-sessions", type=int, default=500)
+    parser.add_argument("--idle-timeout", type=float, default=600,
+        help="seconds before an idle client is disconnected")
+    parser.add_argument("--write-timeout", type=float, default=30,
+        help="seconds before a client that isn't reading output is disconnected")
+    parser.add_argument("--no-pause", action="store_true",
+        help="don't wait for enter at 'Press enter to continue' prompts")
+    parser.add_argument("--world", default=None,
+        help="level file to host instead of {}, e.g. zork.json".format(main.FILE_LEVEL))
+    parser.add_argument("--record", default=None, metavar="DIR",
+        help="folder to record every game to, for replay.py")
+    parser.add_argument("--metrics", default=None, metavar="FILE",
+        help="file to write each command's timings to every {} seconds (.json for JSON, "
+            "otherwise Prometheus text)".format(METRICS_INTERVAL))
+    args = parser.parse_args(argv)
+    level = main.FILE_LEVEL
+    if args.world != None:
+        level = os.path.abspath(args.world)
+    if args.record != None:
+        os.makedirs(args.record, exist_ok=True)
+    metrics = None
+    if args.metrics != None:
+        instrumentation = instrument.Instrumentation(main)
+        instrumentation.enable()
+        metrics = instrumentation.metrics
+    server = GameServer(main.load_content(level=level), args.max_sessions, args.idle_timeout,
+        args.write_timeout, interactive=not args.no_pause, record_dir=args.record, level=args.world,
+        metrics=metrics, metrics_path=args.metrics)
+    print("Listening on {}:{}".format(args.host, args.port))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    if metrics != None:
+        metrics.write(args.metrics)
+
+if __name__ == '__main__':
+    main_cli()
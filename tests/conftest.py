@@ -0,0 +1,15 @@
+import os
+import sys
+
+# The game's modules live in the folder above this one
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import main
+
+@pytest.fixture(scope="session")
+def gameworld():
+    """
+    The game's own world, built from the content files without the cache.
+    """
+    return main.load_content(use_cache=False)
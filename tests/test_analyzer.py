@@ -0,0 +1,98 @@
+import analyzer
+import gameio
+import main
+import world
+
+def test_level_is_won_in_13_commands(gameworld):
+    result = analyzer.analyze(gameworld)
+    assert result.complete
+    assert len(result.winning_script) == 13
+    assert result.unreachable_rooms == []
+    assert result.untakeable_items == []
+    assert result.softlock_states == 0
+
+def _knock_world(gameworld):
+    level = {
+        "WHOUS": {
+            "name": "Door",
+            "desc": "There is a door to the north.",
+            "exits": [{
+                "exit": "NORTH",
+                "target": "END",
+                "flag": "KNOCKED",
+                "flag-test": True,
+                "fail-text": [
+                    "You knock on the door.",
+                    {"type": "setflag", "flag": "KNOCKED", "value": True}
+                ]
+            }]
+        },
+        "END": {
+            "name": "Inside",
+            "desc": "Someone let you in.",
+            "exits": [{"exit": "SOUTH", "target": "WHOUS"}]
+        }
+    }
+    return world.World(level, dict(gameworld.items), dict(gameworld.classdefs), dict(gameworld.enemydefs))
+
+def test_fail_text_changes_state(gameworld):
+    knockworld = _knock_world(gameworld)
+    result = analyzer.analyze(knockworld)
+    assert result.winning_script == ["move north", "move north"]
+    assert result.unreachable_rooms == []
+    gamedata = main.play(knockworld, gameio.NullIO(["1"] + result.winning_script), seed=1, render=False)
+    assert gamedata.room == "END"
+
+def _pit_world(gameworld):
+    level = {
+        "WHOUS": {
+            "name": "Lever room",
+            "desc": "There is a lever here.",
+            "exits": [
+                {"exit": "NORTH", "target": "END", "flag": "LEVER"},
+                {"exit": "EAST", "target": "PIT"}
+            ],
+            "interact": {"lever": {"open": {"type": "setflag", "flag": "LEVER", "value": True}}}
+        },
+        "PIT": {"name": "Pit", "desc": "You fell into a pit with no way out."},
+        "END": {"name": "End", "desc": "You made it.", "exits": [{"exit": "SOUTH", "target": "WHOUS"}]}
+    }
+    return world.World(level, dict(gameworld.items), dict(gameworld.classdefs), dict(gameworld.enemydefs))
+
+def test_softlocks(gameworld):
+    result = analyzer.analyze(_pit_world(gameworld))
+    assert result.states == 5
+    assert result.winning_script == ["open lever", "move north"]
+    assert result.softlock_states == 2
+    assert result.softlock_rooms == ["PIT"]
+    assert result.softlock_script == ["move east"]
+
+def test_spilling_to_disk_gives_the_same_result(gameworld):
+    for testworld in (gameworld, _pit_world(gameworld)):
+        inmemory = analyzer.analyze(testworld)
+        spilled = analyzer.analyze(testworld, memory_states=3)
+        assert inmemory.spilled == 0
+        assert spilled.spilled > 0
+        assert spilled.spilled >= spilled.states - 3
+        del inmemory.spilled, spilled.spilled
+        assert vars(spilled) == vars(inmemory)
+
+def test_state_store_reads_back_from_disk():
+    store = analyzer.StateStore(4, memory_limit=5)
+    for i in range(analyzer.BLOCK_RECORDS + 50):
+        assert store.append(i.to_bytes(4, "little")) == i
+    assert store.spilled == analyzer.BLOCK_RECORDS + 50 - (analyzer.BLOCK_RECORDS + 50) % 5
+    for i in [0, 7, analyzer.BLOCK_RECORDS + 3, analyzer.BLOCK_RECORDS + 49, 1, analyzer.BLOCK_RECORDS - 1]:
+        assert int.from_bytes(store.get(i), "little") == i
+    store.close()
+
+def test_state_table_grows():
+    table = analyzer.StateTable(capacity=4)
+    keys = [(i * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF for i in range(1, 1000)]
+    for index, key in enumerate(keys):
+        table.add(key, index)
+    assert table.capacity >= 2 * len(table)
+    for index, key in enumerate(keys):
+        assert table.get(key) == index
+    assert table.get(12345) == None
+    table.close()
@@ -0,0 +1,43 @@
+import analyzer
+import balance
+import combatsim
+import gameio
+import main
+
+def _state(gamedata):
+    player = gamedata.player
+    return (gamedata.room, gamedata.finished, sorted(gamedata.cleared_combats),
+        [(stat.value, stat.maxvalue) for stat in (player.strength, player.dexterity, player.wisdom, player.soul)],
+        [item.fullname for item in player.inventory])
+
+def test_seeded_run_plays_like_a_direct_game(gameworld):
+    script = analyzer.analyze(gameworld).winning_script
+    for classname in sorted(gameworld.classdefs):
+        for seed in range(5):
+            stats = balance.ClassStats()
+            gamedata = balance.play_run(gameworld, classname, script, combatsim.greedy_attack_policy,
+                combatsim.best_reaction_policy, seed, stats)
+            # Type everything the policies chose into an ordinary game
+            direct = main.play(gameworld, gameio.NullIO(gamedata.io.typed), seed, render=False)
+            assert _state(direct) == _state(gamedata)
+            assert stats.runs == 1
+            assert stats.wins == (0 if direct.player.is_dead() else 1)
+
+def test_runs_are_reproducible(gameworld):
+    script = analyzer.analyze(gameworld).winning_script
+    results = []
+    for _ in range(2):
+        stats = balance.ClassStats()
+        for seed in range(20):
+            balance.play_run(gameworld, "ROGUE", script, combatsim.greedy_attack_policy,
+                combatsim.best_reaction_policy, seed, stats)
+        results.append(stats.to_dict())
+    assert results[0] == results[1]
+    assert results[0]["runs"] == 20
+
+def test_route_script(gameworld):
+    script = analyzer.analyze(gameworld).winning_script
+    route = balance.find_route(gameworld, script)
+    assert route[0] == main.START_ROOM
+    assert route[-1] == "END"
+    assert balance.find_route(gameworld, balance.route_script(gameworld, route)) == route
@@ -0,0 +1,43 @@
+import random
+import time
+import combatsim
+import gameencounter
+import gameevents
+
+def test_hordes_use_the_game_batching(gameworld):
+    gamedata = combatsim.new_game(gameworld, "WARRIOR", seed=3)
+    events = []
+    gamedata.events.subscribe(events.append)
+    goblin = gameworld.enemy_prototypes["GOBLIN"]
+    result = combatsim.simulate_encounter(gamedata, [goblin.spawn() for _ in range(gameencounter.BATCH_SIZE)])
+    assert result.rounds > 0
+    assert any(isinstance(event, gameevents.HordeAttacked) for event in events)
+    assert result.won == (len(gamedata.encounter) == 0)
+
+def test_same_seed_same_fight(gameworld):
+    results = []
+    for _ in range(2):
+        gamedata = combatsim.new_game(gameworld, "ROGUE", seed=11)
+        result = combatsim.simulate_encounter(gamedata, [gameworld.enemy_prototypes["ORC"].spawn()])
+        results.append((result.won, result.rounds, result.stat_loss, gamedata.io.typed))
+    assert results[0] == results[1]
+
+def test_policies_answer_every_menu(gameworld):
+    # Random policies use every class's attacks, items and reactions
+    for classname in gameworld.classdefs:
+        for seed in range(20):
+            gamedata = combatsim.new_game(gameworld, classname, combatsim.random_attack_policy,
+                combatsim.random_reaction_policy, seed)
+            enemies = [prototype.spawn() for prototype in gameworld.enemy_prototypes.values()]
+            combatsim.simulate_encounter(gamedata, enemies)
+
+def test_throughput(gameworld):
+    encounters = {name: [name] for name in gameworld.enemydefs}
+    fights = 20 * len(encounters) * len(gameworld.classdefs)
+    best = 0
+    # The best of a few runs, so that a busy machine doesn't fail the test
+    for _ in range(3):
+        start = time.perf_counter()
+        combatsim.run_all(gameworld, encounters, 20, rng=random.Random(1))
+        best = max(best, fights / (time.perf_counter() - start) * 60)
+    assert best >= combatsim.FIGHTS_PER_MINUTE
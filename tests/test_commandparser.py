@@ -0,0 +1,87 @@
+import character
+import commandparser
+import gameio
+import main
+
+def test_whole_names_and_prefixes():
+    trie = commandparser.Trie({"move": 1, "look": 2, "lock": 3})
+    assert trie.find("move") == 1
+    assert trie.find("m") == 1
+    assert trie.find("loo") == 2
+    assert trie.find("lo") is commandparser.AMBIGUOUS
+    assert trie.find("l") is commandparser.AMBIGUOUS
+    assert trie.find("x") == None
+    assert trie.find("moves") == None
+    assert trie.find("") == None
+    assert len(trie) == 3
+    assert "look" in trie and "lo" not in trie
+
+def test_whole_name_wins_over_longer_names():
+    trie = commandparser.Trie({"in": 1, "inside": 2, "inventory": 3})
+    assert trie.find("in") == 1
+    assert trie.find("ins") == 2
+    assert trie.find("inv") == 3
+
+def test_names_with_the_same_value_are_not_ambiguous():
+    trie = commandparser.Trie({"inventory": "inventory", "inv": "inventory", "i": "inventory"})
+    trie.add("item", "item")
+    assert trie.find("inve") == "inventory"
+    assert trie.find("i") == "inventory"
+    assert trie.find("it") == "item"
+
+def test_names_are_normalized():
+    trie = commandparser.Trie()
+    trie.add("  Massive   Spider ", 1)
+    assert trie.find("massive spider") == 1
+    assert trie.find("MASSIVE  sp") == 1
+    # A name keeps its first value
+    trie.add("massive spider", 2)
+    assert trie.find("massive spider") == 1
+
+class _Exit:
+    def __init__(self, exit):
+        self.exit = exit
+
+def test_exit_index():
+    index = commandparser.build_exit_index([_Exit("NORTH"), _Exit("NORTHEAST"), _Exit("INSIDE"), _Exit("SOUTH")])
+    assert index.find("n") == 0
+    assert index.find("north") == 0
+    assert index.find("northe") == 1
+    assert index.find("nor") is commandparser.AMBIGUOUS
+    assert index.find("in") == 2
+    assert index.find("s") == 3
+    # Only synonyms of exits that the room has are added
+    assert index.find("e") == None
+
+def test_object_index_finds_trailing_words():
+    index = commandparser.build_object_index(["rusty key", "key ring", "door"])
+    assert index.find("rusty") == "rusty key"
+    assert index.find("ring") == "key ring"
+    assert index.find("do") == "door"
+    # 'key' is the end of 'rusty key' and the start of 'key ring'; a whole
+    # name wins, but a shorter prefix is ambiguous
+    assert index.find("key") == "rusty key"
+    assert index.find("ke") is commandparser.AMBIGUOUS
+    assert index.find("key r") == "key ring"
+
+def test_enemy_index(gameworld):
+    goblin = gameworld.enemy_prototypes["GOBLIN"]
+    spider = gameworld.enemy_prototypes["SPIDER"]
+    index = commandparser.build_enemy_index([goblin, spider])
+    assert index.find("goblin") is goblin
+    assert index.find(goblin.nameplural) is goblin
+    assert index.find(spider.name.split()[-1]) is spider
+
+def _play(gameworld, lines):
+    io = gameio.ScriptedIO(lines, echo=False)
+    gamedata = main.GameData(gameworld, character.Character(), io, seed=1)
+    main.enter_location(gamedata, main.START_ROOM)
+    main.game_loop(gamedata)
+    return gamedata, io.get_output()
+
+def test_commands_in_a_game(gameworld):
+    assert main.PLAYER_COMMANDS.find("s") is commandparser.AMBIGUOUS
+    gamedata, output = _play(gameworld, ["s", "ta pam", "mo n"])
+    assert "'s' could mean more than one action." in output
+    assert gamedata.player.inventory.has("PAMPHLET")
+    assert gamedata.room == "FOREST1"
@@ -0,0 +1,135 @@
+import json
+import os
+import shutil
+import pytest
+import contentcache
+import gameio
+import main
+import world
+
+FILES = {"level": "level.json", "items": "items.json", "classes": "classes.json", "enemies": "enemies.json"}
+
+def _write(directory, key, value):
+    path = os.path.join(directory, FILES[key])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    return path
+
+@pytest.fixture
+def content_dir(tmp_path):
+    directory = str(tmp_path)
+    _write(directory, "level", {"WHOUS": {"name": "Start", "exits": []}})
+    _write(directory, "items", {"SWORD": {"name": "Sword"}})
+    _write(directory, "classes", {"KNIGHT": {"items": ["SWORD"]}})
+    _write(directory, "enemies", {})
+    return directory
+
+def _no_parsing(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("The content was parsed again")
+    monkeypatch.setattr(contentcache.json, "loads", fail)
+
+def test_bundle_is_used_when_nothing_changed(content_dir, monkeypatch):
+    content = contentcache.load_content_files(content_dir, FILES)
+    assert os.path.exists(contentcache.bundle_path(content_dir, FILES))
+    _no_parsing(monkeypatch)
+    assert contentcache.load_content_files(content_dir, FILES) == content
+
+def test_changed_file_is_parsed_again(content_dir):
+    contentcache.load_content_files(content_dir, FILES)
+    path = _write(content_dir, "items", {"SWORD": {"name": "Sword"}, "SHIELD": {"name": "Shield"}})
+    content = contentcache.load_content_files(content_dir, FILES)
+    assert sorted(content["items"]) == ["SHIELD", "SWORD"]
+    # Same size, but a different time and hash
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"SWORD": {"name": "Sword"}, "SHIELD": {"name": "Spoon"}}, f)
+    os.utime(path, ns=(1, 1))
+    content = contentcache.load_content_files(content_dir, FILES)
+    assert content["items"]["SHIELD"]["name"] == "Spoon"
+
+def test_touched_file_is_only_hashed(content_dir, monkeypatch):
+    content = contentcache.load_content_files(content_dir, FILES)
+    path = os.path.join(content_dir, FILES["level"])
+    os.utime(path, ns=(1, 1))
+    _no_parsing(monkeypatch)
+    assert contentcache.load_content_files(content_dir, FILES) == content
+    # The bundle's times were updated
+    bundle = contentcache._read_bundle(contentcache.bundle_path(content_dir, FILES))
+    assert bundle["stats"]["level"][0] == 1
+
+def test_each_level_has_its_own_bundle(content_dir, monkeypatch):
+    contentcache.load_content_files(content_dir, FILES)
+    with open(os.path.join(content_dir, "other.json"), "w", encoding="utf-8") as f:
+        json.dump({"OTHER": {"name": "Other", "exits": []}}, f)
+    files = dict(FILES, level="other.json")
+    assert contentcache.bundle_path(content_dir, files) != contentcache.bundle_path(content_dir, FILES)
+    assert list(contentcache.load_content_files(content_dir, files)["level"]) == ["OTHER"]
+    # Switching levels doesn't overwrite either bundle
+    _no_parsing(monkeypatch)
+    assert list(contentcache.load_content_files(content_dir, FILES)["level"]) == ["WHOUS"]
+    assert list(contentcache.load_content_files(content_dir, files)["level"]) == ["OTHER"]
+
+def test_tables_are_linked_once(content_dir, monkeypatch):
+    calls = []
+    def link(content):
+        calls.append(sorted(content["level"]))
+        return {"rooms": len(content["level"])}
+    content = contentcache.load_content_files(content_dir, FILES, link=link)
+    assert content["tables"] == {"rooms": 1}
+    _no_parsing(monkeypatch)
+    assert contentcache.load_content_files(content_dir, FILES, link=link) == content
+    assert calls == [["WHOUS"]]
+
+def test_bundle_without_tables_is_linked(content_dir):
+    contentcache.load_content_files(content_dir, FILES)
+    content = contentcache.load_content_files(content_dir, FILES, link=lambda content: 5)
+    assert content["tables"] == 5
+
+def test_content_that_doesnt_link_is_never_cached(content_dir):
+    def link(content):
+        raise contentcache.ContentError(["room 'WHOUS': unknown item 'SPOON'"])
+    with pytest.raises(contentcache.ContentError):
+        contentcache.load_content_files(content_dir, FILES, link=link)
+    assert not os.path.exists(contentcache.bundle_path(content_dir, FILES))
+
+def test_invalid_content_is_never_cached(content_dir):
+    contentcache.load_content_files(content_dir, FILES)
+    _write(content_dir, "level", {"WHOUS": {"exits": [{"exit": "NORTH"}]}})
+    with pytest.raises(contentcache.ContentError) as e:
+        contentcache.load_content_files(content_dir, FILES)
+    assert e.value.problems == ["room 'WHOUS' exit 0: missing 'target'"]
+    with pytest.raises(contentcache.ContentError):
+        contentcache.load_content_files(content_dir, FILES)
+
+def test_corrupt_bundle_is_rebuilt(content_dir):
+    content = contentcache.load_content_files(content_dir, FILES)
+    path = contentcache.bundle_path(content_dir, FILES)
+    with open(path, "wb") as f:
+        f.write(b"not a bundle")
+    assert contentcache.load_content_files(content_dir, FILES) == content
+    assert contentcache._read_bundle(path)["content"] == content
+
+def test_without_cache(content_dir):
+    contentcache.load_content_files(content_dir, FILES, use_cache=False)
+    assert not os.path.exists(contentcache.bundle_path(content_dir, FILES))
+
+def test_world_from_tables_plays_the_same(tmp_path):
+    for name in (main.FILE_LEVEL, main.FILE_ITEMS, main.FILE_CLASSES, main.FILE_ENEMIES):
+        shutil.copy(os.path.join(os.path.dirname(os.path.abspath(main.__file__)), name), str(tmp_path))
+    directory = str(tmp_path)
+    main.load_content(directory=directory)
+    cached = main.load_content(directory=directory)
+    linked = main.load_content(directory=directory, use_cache=False)
+    assert isinstance(cached.rooms, world.LinkedRooms)
+    assert list(cached.rooms) == list(linked.rooms)
+    assert cached.signature == linked.signature
+    # Rooms are only linked once they are used
+    assert len(cached.rooms._rooms) == 0
+    lines = ["1", "take pamphlet", "move north", "attack", "1", "1", "look", "goto forest", "stat"]
+    outputs = []
+    for gameworld in (cached, linked):
+        io = gameio.ScriptedIO(lines)
+        main.play(gameworld, io, seed=4)
+        outputs.append(io.get_output())
+    assert outputs[0] == outputs[1]
+    assert 0 < len(cached.rooms._rooms) < len(cached.rooms)
@@ -0,0 +1,51 @@
+import itertools
+import random
+from fractions import Fraction
+import dice
+
+def _sums(num):
+    return [sum(faces) for faces in itertools.product(range(1, dice.SIDES + 1), repeat=num)]
+
+def test_distribution_matches_brute_force():
+    for num in range(5):
+        sums = _sums(num)
+        dist = dice.distribution(num)
+        assert sum(dist) == dice.SIDES ** num
+        for total in range(len(dist) + 2):
+            assert (dist[total] if total < len(dist) else 0) == sums.count(total)
+        for total in range(-1, 6 * num + 3):
+            expected = Fraction(sum(1 for s in sums if s >= total), len(sums))
+            assert abs(dice.p_sum_at_least(num, total) - expected) < 1e-12
+
+def test_contests_match_brute_force():
+    for num_a in range(4):
+        sums_a = _sums(num_a)
+        for num_b in range(4):
+            sums_b = _sums(num_b)
+            outcomes = len(sums_a) * len(sums_b)
+            at_least = sum(1 for a in sums_a for b in sums_b if a >= b)
+            greater = sum(1 for a in sums_a for b in sums_b if a > b)
+            assert dice.exact_p_at_least(num_a, num_b) == Fraction(at_least, outcomes)
+            assert dice.exact_p_greater(num_a, num_b) == Fraction(greater, outcomes)
+            assert dice.p_at_least(num_a, num_b) == float(Fraction(at_least, outcomes))
+            assert dice.p_greater(num_a, num_b) == float(Fraction(greater, outcomes))
+
+def test_beyond_the_precomputed_tables():
+    num = dice.MAX_PRECOMPUTED_DICE + 2
+    assert sum(dice.distribution(num)) == dice.SIDES ** num
+    # A contest between equal sides is a tie or a win for either, equally
+    tie = dice.exact_p_at_least(num, num) - dice.exact_p_greater(num, num)
+    assert dice.exact_p_greater(num, num) * 2 + tie == 1
+
+def test_sample_sum_follows_the_distribution():
+    rng = random.Random(5)
+    num = 3
+    samples = 60000
+    counts = [0] * (dice.SIDES * num + 1)
+    for _ in range(samples):
+        counts[dice.sample_sum(rng, num)] += 1
+    dist = dice.distribution(num)
+    for total, ways in enumerate(dist):
+        expected = samples * ways / dice.SIDES ** num
+        assert abs(counts[total] - expected) <= 5 * expected ** 0.5 + 1
+    assert dice.sample_sum(rng, 0) == 0
@@ -0,0 +1,130 @@
+import character
+import gameencounter
+import gameenemy
+import gameevents
+import gameio
+import gameutil
+import inventory
+import main
+
+def _prototype(name, actions=None):
+    enemydef = {"name": name, "plural": name + "s", "health": 2}
+    if actions != None:
+        enemydef["actions"] = actions
+    return gameenemy.EnemyPrototype(name.upper(), enemydef)
+
+GOBLIN = _prototype("Goblin")
+SPIDER = _prototype("Spider")
+
+def _kill(encounter, enemy):
+    encounter.damage(enemy, enemy.health.value)
+
+def test_counts_follow_adds_and_removes():
+    encounter = gameencounter.Encounter([GOBLIN.spawn(), SPIDER.spawn(), GOBLIN.spawn(), GOBLIN.spawn()])
+    assert encounter.counts == {GOBLIN: 3, SPIDER: 1}
+    first = encounter[0]
+    _kill(encounter, first)
+    # Dead enemies stay until they are removed
+    assert encounter.counts == {GOBLIN: 3, SPIDER: 1}
+    assert encounter.remove_dead() == [first]
+    assert encounter.counts == {GOBLIN: 2, SPIDER: 1}
+    _kill(encounter, encounter.find(SPIDER))
+    encounter.remove_dead()
+    assert encounter.counts == {GOBLIN: 2}
+    assert encounter.find(SPIDER) == None
+    assert encounter.remove_dead() == []
+
+def test_stable_remove_keeps_order():
+    enemies = [GOBLIN.spawn() for _ in range(10)]
+    encounter = gameencounter.Encounter(enemies)
+    for i in (7, 2, 3):
+        _kill(encounter, enemies[i])
+    assert encounter.remove_dead() == [enemies[2], enemies[3], enemies[7]]
+    assert encounter.enemies == [enemy for i, enemy in enumerate(enemies) if i not in (2, 3, 7)]
+
+def test_swap_remove_keeps_every_living_enemy():
+    count = gameencounter.STABLE_REMOVE_SIZE * 2
+    enemies = [(GOBLIN if i % 3 else SPIDER).spawn() for i in range(count)]
+    encounter = gameencounter.Encounter(enemies)
+    # Kill enemies at the back, the front and in between, including ones
+    # that would be swapped into the place of another dead enemy
+    dead = set(range(0, count, 5)) | {count - 1, count - 2, 1}
+    for i in sorted(dead, reverse=True):
+        _kill(encounter, enemies[i])
+    removed = encounter.remove_dead()
+    assert removed == [enemies[i] for i in sorted(dead)]
+    living = [enemy for i, enemy in enumerate(enemies) if i not in dead]
+    assert len(encounter) == len(living)
+    assert set(encounter) == set(living)
+    assert not any(enemy.is_dead() for enemy in encounter)
+    assert encounter.counts == {
+        GOBLIN: sum(1 for enemy in living if enemy.prototype is GOBLIN),
+        SPIDER: sum(1 for enemy in living if enemy.prototype is SPIDER)
+    }
+    # Removing again after the swaps still finds the right enemies
+    _kill(encounter, living[0])
+    _kill(encounter, living[-1])
+    assert set(encounter.remove_dead()) == {living[0], living[-1]}
+    assert set(encounter) == set(living[1:-1])
+
+def test_describe():
+    encounter = gameencounter.Encounter([GOBLIN.spawn(), SPIDER.spawn(), GOBLIN.spawn()])
+    assert encounter.describe() == "2 {} and a {}".format(
+        gameutil.FMT_ENEMY.format("Goblins"), gameutil.FMT_ENEMY.format("Spider"))
+    _kill(encounter, encounter[0])
+    encounter.remove_dead()
+    assert encounter.describe() == "a {} and a {}".format(
+        gameutil.FMT_ENEMY.format("Goblin"), gameutil.FMT_ENEMY.format("Spider"))
+
+def _new_game(gameworld, enemies):
+    player = character.Character()
+    # Without reactions, the player never blocks and is never asked anything
+    player.inventory = inventory.Inventory(character.BASIC_ATTACKS, ())
+    gamedata = main.GameData(gameworld, player, gameio.NullIO(), seed=1, render=False)
+    gamedata.encounter.replace(enemies)
+    events = []
+    gamedata.events.subscribe(events.append)
+    return gamedata, events
+
+def test_group_stops_when_the_player_dies(gameworld):
+    ogre = _prototype("Ogre", {
+        "smash": {"type": "attack", "stat": "STR", "damage": 10, "roll": 2},
+        "kick": {"type": "attack", "stat": "STR", "damage": 10, "roll": 3}
+    })
+    smash, kick = ogre.attacks
+    enemies = [ogre.spawn() for _ in range(gameencounter.BATCH_SIZE + 1)]
+    for i, enemy in enumerate(enemies):
+        enemy.next_action = smash if i < 3 else kick
+    gamedata, events = _new_game(gameworld, enemies)
+    gamedata.encounter.take_turns(gamedata)
+    assert gamedata.player.is_dead()
+    assert [type(event) for event in events] == [gameevents.HordeAttacked, gameevents.HordeRolled,
+        gameevents.HordeResolved]
+    for enemy in enemies[:3]:
+        assert enemy.curse == -2
+        assert enemy.next_action == None
+    # The kicking ogres never got to act, so their turn wasn't used up
+    for enemy in enemies[3:]:
+        assert enemy.curse == -1
+        assert enemy.next_action is kick
+
+def test_idle_group_emits_idle(gameworld):
+    statue = _prototype("Statue")
+    gamedata, events = _new_game(gameworld, [statue.spawn() for _ in range(gameencounter.BATCH_SIZE)])
+    gamedata.encounter.take_turns(gamedata)
+    assert len(events) == 1
+    assert isinstance(events[0], gameevents.EnemyIdle)
+    assert events[0].name == "Statues"
+
+def test_encounter_started_describes_the_ambush(gameworld):
+    gamedata, events = _new_game(gameworld, [])
+    main.enter_location(gamedata, "GOBLIN_CAMP")
+    started = [event for event in events if isinstance(event, gameevents.EncounterStarted)]
+    assert len(started) == 1
+    assert started[0].description == "2 {}".format(gameutil.FMT_ENEMY.format("Goblins"))
+    assert started[0].counts == {"GOBLIN": 2}
+    # The event keeps describing the ambush after the fight moves on
+    _kill(gamedata.encounter, gamedata.encounter[0])
+    gamedata.encounter.remove_dead()
+    assert started[0].description == "2 {}".format(gameutil.FMT_ENEMY.format("Goblins"))
+    assert started[0].counts == {"GOBLIN": 2}
@@ -0,0 +1,146 @@
+import character
+import exitgraph
+import gameio
+import main
+import world
+
+def _vault_world(gameworld):
+    # The vault's door is locked by GATE; the corridors go around it. The
+    # cellar's door is locked by OTHER, which has nothing to do with the vault.
+    level = {
+        "WHOUS": {
+            "name": "Hall",
+            "desc": "There is a lever and a button here.",
+            "exits": [
+                {"exit": "NORTH", "target": "VAULT", "flag": "GATE"},
+                {"exit": "EAST", "target": "CORR1"},
+                {"exit": "DOWN", "target": "CELLAR", "flag": "OTHER"}
+            ],
+            "interact": {
+                "lever": {"open": {"type": "setflag", "flag": "GATE", "value": True}},
+                "button": {"open": {"type": "setflag", "flag": "OTHER", "value": True}}
+            }
+        },
+        "CORR1": {"name": "East corridor", "desc": "A corridor.", "exits": [
+            {"exit": "NORTH", "target": "CORR2"},
+            {"exit": "WEST", "target": "WHOUS"}
+        ]},
+        "CORR2": {"name": "North corridor", "desc": "A corridor.", "exits": [
+            {"exit": "WEST", "target": "VAULT"},
+            {"exit": "SOUTH", "target": "CORR1"}
+        ]},
+        "VAULT": {"name": "Vault", "desc": "A vault.", "exits": [
+            {"exit": "SOUTH", "target": "WHOUS"},
+            {"exit": "EAST", "target": "CORR2"}
+        ]},
+        "CELLAR": {"name": "Cellar", "desc": "A cellar.", "exits": [
+            {"exit": "UP", "target": "WHOUS"},
+            {"exit": "DOWN", "target": "END"}
+        ]},
+        "END": {"name": "End", "desc": "You made it.", "exits": []}
+    }
+    return world.World(level, dict(gameworld.items), dict(gameworld.classdefs), dict(gameworld.enemydefs))
+
+def _start(testworld):
+    io = gameio.ScriptedIO([], echo=False)
+    gamedata = main.GameData(testworld, character.Character(), io, seed=1)
+    main.enter_location(gamedata, main.START_ROOM)
+    return gamedata
+
+def _play(gamedata, lines):
+    gamedata.io.lines = list(reversed(lines))
+    gamedata.io.output = []
+    gamedata.finished = False
+    main.game_loop(gamedata)
+    return gamedata.io.get_output()
+
+def _explore(gamedata):
+    _play(gamedata, ["move east", "move north", "move west", "move south"])
+    assert gamedata.room == "WHOUS"
+
+def test_graph(gameworld):
+    graph = _vault_world(gameworld).graph
+    assert [(index, target) for index, target, _ in graph.edges["WHOUS"]] == [(0, "VAULT"), (1, "CORR1"), (2, "CELLAR")]
+    assert [(source, index) for source, index, _ in graph.incoming["VAULT"]] == [("WHOUS", 0), ("CORR2", 0)]
+    assert graph.edges["WHOUS"][0][2] == "GATE"
+    assert graph.edges["WHOUS"][1][2] == None
+    assert graph.room_index.find("vault") == ("VAULT",)
+    assert graph.room_index.find("north corridor") == ("CORR2",)
+    assert graph.room_index.find("corridor") == ("CORR1", "CORR2")
+
+def test_gated_path_goes_around(gameworld):
+    gamedata = _start(_vault_world(gameworld))
+    _explore(gamedata)
+    assert gamedata.routes.find_path(gamedata, ["VAULT"]) == [1, 0, 0]
+    _play(gamedata, ["goto vault"])
+    assert gamedata.room == "VAULT"
+    assert gamedata.routes.find_path(gamedata, ["VAULT"]) == []
+    # No path comes back through the locked door
+    assert gamedata.routes.find_path(gamedata, ["WHOUS"]) == [0]
+
+def test_path_unlocks_after_setflag(gameworld):
+    gamedata = _start(_vault_world(gameworld))
+    _explore(gamedata)
+    assert gamedata.routes.find_path(gamedata, ["VAULT"]) == [1, 0, 0]
+    _play(gamedata, ["open lever"])
+    assert gamedata.flags.get("GATE") == True
+    assert gamedata.routes.find_path(gamedata, ["VAULT"]) == [0]
+    _play(gamedata, ["goto vault"])
+    assert gamedata.room == "VAULT"
+
+def test_trees_are_kept_until_a_gate_they_use_flips(gameworld):
+    gamedata = _start(_vault_world(gameworld))
+    _explore(gamedata)
+    tree = gamedata.routes.find_tree(gamedata, ["VAULT"])
+    # Moving doesn't change the tree
+    _play(gamedata, ["goto north corridor"])
+    assert gamedata.room == "CORR2"
+    assert gamedata.routes.find_tree(gamedata, ["VAULT"]) is tree
+    assert gamedata.routes.find_path(gamedata, ["VAULT"]) == [0]
+    # Neither does a flag that locks an exit the tree doesn't depend on
+    _play(gamedata, ["goto hall", "open button"])
+    assert gamedata.flags.get("OTHER") == True
+    assert gamedata.routes.find_tree(gamedata, ["VAULT"]) is tree
+    # Exploring a room, or opening the vault's door, finds it again
+    _play(gamedata, ["move down", "move up"])
+    newtree = gamedata.routes.find_tree(gamedata, ["VAULT"])
+    assert newtree is not tree
+    _play(gamedata, ["open lever"])
+    assert gamedata.routes.find_tree(gamedata, ["VAULT"]) is not newtree
+    assert gamedata.routes.find_path(gamedata, ["VAULT"]) == [0]
+
+def test_cache_is_bounded(gameworld):
+    gamedata = _start(_vault_world(gameworld))
+    _explore(gamedata)
+    for i in range(exitgraph.ROUTE_CACHE_SIZE + 5):
+        gamedata.routes.find_tree(gamedata, ["VAULT"] * (i + 1))
+    assert len(gamedata.routes._trees) == exitgraph.ROUTE_CACHE_SIZE
+
+def test_unexplored_targets(gameworld):
+    gamedata = _start(_vault_world(gameworld))
+    output = _play(gamedata, ["goto vault"])
+    assert "You don't know the way to 'vault'." in output
+    assert gamedata.room == "WHOUS"
+    output = _play(gamedata, ["goto nowhere", "goto corridor", "goto hall"])
+    assert "You don't know the way to 'nowhere'." in output
+    assert "You don't know the way to 'corridor'." in output
+    assert "You're already there." in output
+    # Only explored rooms are gone to
+    _play(gamedata, ["move east", "move west", "goto corridor"])
+    assert gamedata.room == "CORR1"
+    # Paths only go through explored rooms
+    _play(gamedata, ["move north", "move west", "move south"])
+    gamedata.explored.pop("CORR1")
+    gamedata.explored_version += 1
+    assert gamedata.routes.find_path(gamedata, ["VAULT"]) == None
+    assert gamedata.routes.find_path(gamedata, ["CORR2"]) == None
+
+def test_no_open_path(gameworld):
+    gamedata = _start(_vault_world(gameworld))
+    _play(gamedata, ["open button", "move down", "move up"])
+    # The cellar was explored, but there is no way back into it once OTHER is
+    # cleared
+    gamedata.flags.set("OTHER", False)
+    output = _play(gamedata, ["goto cellar"])
+    assert "There is no open path to Cellar." in output
+    assert gamedata.room == "WHOUS"
@@ -0,0 +1,63 @@
+import character
+import gameevents
+import gameio
+import levelaction
+import main
+
+def _game(gameworld):
+    io = gameio.ScriptedIO([], echo=False)
+    gamedata = main.GameData(gameworld, character.Character(), io, seed=1)
+    events = []
+    gamedata.events.subscribe(events.append)
+    return gamedata, events
+
+def _run(gamedata, action):
+    levelaction.compile_level_action(action)(gamedata)
+
+def test_give(gameworld):
+    gamedata, events = _game(gameworld)
+    _run(gamedata, {"type": "give", "item": "SWORD"})
+    assert len(events) == 1
+    assert isinstance(events[0], gameevents.ItemGiven)
+    assert events[0].item.fullname == "SWORD"
+    assert gamedata.player.has_item("SWORD")
+    # Rendered for the player
+    assert "You got the Broadsword" in gamedata.io.get_output()
+
+def test_remove(gameworld):
+    gamedata, events = _game(gameworld)
+    for _ in range(3):
+        _run(gamedata, {"type": "give", "item": "DAGGER"})
+    del events[:]
+    _run(gamedata, {"type": "remove", "item": "DAGGER"})
+    assert len(events) == 1
+    assert isinstance(events[0], gameevents.ItemRemoved)
+    assert (events[0].itemname, events[0].removeall) == ("DAGGER", False)
+    assert gamedata.player.inventory.count("DAGGER") == 2
+    _run(gamedata, {"type": "remove", "item": "DAGGER", "remove-all": True})
+    assert len(events) == 2
+    assert (events[1].itemname, events[1].removeall) == ("DAGGER", True)
+    assert not gamedata.player.has_item("DAGGER")
+    # Nothing is removed, so nothing is emitted
+    gamedata.io.output = []
+    _run(gamedata, {"type": "remove", "item": "DAGGER"})
+    _run(gamedata, {"type": "remove", "item": "SHIELD", "remove-all": True})
+    assert len(events) == 2
+    assert gamedata.io.get_output() == ""
+
+def test_setflag(gameworld):
+    gamedata, events = _game(gameworld)
+    _run(gamedata, [{"type": "setflag", "flag": "GATE_OUTSIDE_UNLOCKED", "value": True},
+        {"type": "setflag", "flag": "NOT_IN_THE_LEVEL", "value": 2}])
+    assert [(type(event), event.flag, event.value) for event in events] == [
+        (gameevents.FlagSet, "GATE_OUTSIDE_UNLOCKED", True),
+        (gameevents.FlagSet, "NOT_IN_THE_LEVEL", 2)
+    ]
+    assert gamedata.flags.get("GATE_OUTSIDE_UNLOCKED") == True
+    assert gamedata.flags.get("NOT_IN_THE_LEVEL") == 2
+
+def test_unsubscribe(gameworld):
+    gamedata, events = _game(gameworld)
+    gamedata.events.unsubscribe(events.append)
+    _run(gamedata, {"type": "give", "item": "SWORD"})
+    assert events == []
@@ -0,0 +1,122 @@
+import character
+import gameflags
+import gameio
+import main
+import savegame
+import world
+
+def _layout():
+    return gameflags.FlagLayout({
+        "OPEN": [True, False],
+        "LIT": [True],
+        "COUNT": [1, 2],
+        "COLOR": ["red", True]
+    })
+
+def test_layout():
+    layout = _layout()
+    # Names are sorted, and only flags that are always true or false are bits
+    assert layout.bool_names == ("LIT", "OPEN")
+    assert layout.value_names == ("COLOR", "COUNT")
+    assert layout.slots == {
+        "LIT": (gameflags.KIND_BOOL, 0),
+        "OPEN": (gameflags.KIND_BOOL, 1),
+        "COLOR": (gameflags.KIND_VALUE, 0),
+        "COUNT": (gameflags.KIND_VALUE, 1)
+    }
+    assert layout.accessors("MISSING") == None
+    get, set, index = layout.accessors("OPEN")
+    flags = gameflags.Flags(layout)
+    set(flags, index, True)
+    assert get(flags, index, None) == True
+    assert flags.get("OPEN") == True
+
+def test_bits():
+    flags = gameflags.Flags(_layout())
+    flags.set("OPEN", True)
+    assert (flags.isset, flags.bits) == (0b10, 0b10)
+    flags.set("LIT", False)
+    assert (flags.isset, flags.bits) == (0b11, 0b10)
+    flags.set("OPEN", False)
+    assert (flags.isset, flags.bits) == (0b11, 0b00)
+    assert flags.get("OPEN") == False
+    assert flags.get("LIT") == False
+    # Booleans never go to the value slots
+    assert flags.value_items() == []
+    assert flags.extra == {}
+
+def test_values():
+    flags = gameflags.Flags(_layout())
+    flags.set("COUNT", 2)
+    flags.set("COLOR", "red")
+    assert flags.values == ["red", 2]
+    assert flags.value_items() == [(0, "red"), (1, 2)]
+    flags.set("COLOR", True)
+    assert flags.get("COLOR") == True
+    # None is a value, not the same as being unset
+    flags.set("COUNT", None)
+    assert flags.get("COUNT", 5) == None
+    assert "COUNT" in flags
+    assert (flags.isset, flags.bits) == (0, 0)
+
+def test_extra():
+    flags = gameflags.Flags(_layout())
+    flags.set("NEW", 7)
+    flags.set("OTHER", False)
+    assert flags.extra == {"NEW": 7, "OTHER": False}
+    assert flags.get("NEW") == 7
+    assert flags.get("OTHER", True) == False
+    assert (flags.isset, flags.bits, flags.value_items()) == (0, 0, [])
+
+def test_defaults():
+    flags = gameflags.Flags(_layout())
+    for name in ("OPEN", "COUNT", "NEW"):
+        assert flags.get(name) == None
+        assert flags.get(name, 3) == 3
+        assert name not in flags
+    assert len(flags) == 0
+    assert flags.items() == []
+    flags.set("OPEN", False)
+    flags.set("COUNT", 0)
+    flags.set("NEW", "x")
+    # Falsy values are still set
+    assert flags.get("OPEN", True) == False
+    assert flags.get("COUNT", 3) == 0
+    assert len(flags) == 3
+    assert flags.items() == [("OPEN", False), ("COUNT", 0), ("NEW", "x")]
+
+def _flag_world(gameworld):
+    level = {
+        "WHOUS": {
+            "name": "Hall",
+            "desc": "There is a dial here.",
+            "exits": [{"exit": "NORTH", "target": "END", "flag": "OPEN"}],
+            "interact": {
+                "dial": {
+                    "open": {"type": "setflag", "flag": "OPEN", "value": True},
+                    "close": {"type": "setflag", "flag": "COUNT", "value": 3},
+                    "look": {"type": "setflag", "flag": "COLOR", "value": "red"}
+                }
+            }
+        },
+        "END": {"name": "End", "desc": "You made it.", "exits": []}
+    }
+    return world.World(level, dict(gameworld.items), dict(gameworld.classdefs), dict(gameworld.enemydefs))
+
+def test_savegame_round_trip(gameworld):
+    flagworld = _flag_world(gameworld)
+    assert flagworld.flag_layout.bool_names == ("OPEN",)
+    assert flagworld.flag_layout.value_names == ("COLOR", "COUNT")
+    gamedata = main.GameData(flagworld, character.Character(), gameio.NullIO([]), render=False)
+    main.enter_location(gamedata, main.START_ROOM)
+    gamedata.flags.set("OPEN", False)
+    gamedata.flags.set("COUNT", 3)
+    gamedata.flags.set("NEW", 1.5)
+    gamedata.flags.set("NONE", None)
+    data = savegame.save_session(gamedata)
+    loaded = savegame.load_session(flagworld, data, gameio.NullIO([]))
+    assert loaded.flags.items() == gamedata.flags.items()
+    assert (loaded.flags.isset, loaded.flags.bits) == (1, 0)
+    assert "COLOR" not in loaded.flags
+    assert "NONE" in loaded.flags
+    assert savegame.save_session(loaded) == data
@@ -0,0 +1,97 @@
+import json
+import re
+import gameencounter
+import gameio
+import gameitem
+import instrument
+import main
+
+def test_quantile():
+    histogram = instrument.Histogram()
+    assert histogram.quantile(0.5) == None
+    # Buckets 0, 1, 2 and 10
+    for value in (-5, 1, 3, 1000):
+        histogram.observe(value)
+    assert histogram.buckets[0] == 1 and histogram.buckets[1] == 1
+    assert histogram.buckets[2] == 1 and histogram.buckets[10] == 1
+    assert histogram.count == 4 and histogram.total == 999
+    assert histogram.quantile(0.25) == 1
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(0.75) == 4
+    assert histogram.quantile(0.99) == 1024
+    assert histogram.quantile(1.0) == 1024
+    # Values above every bound have no upper bound
+    histogram.observe(2 ** 40)
+    assert histogram.buckets[-1] == 1
+    assert histogram.quantile(1.0) == None
+    assert histogram.quantile(0.8) == 1024
+
+def _originals():
+    return ([action.func for action in main.PLAYER_ACTIONS.values()]
+        + [main.interact] + [getattr(main, name) for name in instrument.MAIN_FUNCTIONS]
+        + [getattr(owner, attr) for owner, attr, _ in instrument.COMBAT_FUNCTIONS])
+
+def _play(gameworld):
+    main.play(gameworld, gameio.NullIO(["1", "look", "move north", "inventory"]), seed=1)
+
+def test_enable_and_disable(gameworld):
+    originals = _originals()
+    instrumentation = instrument.Instrumentation(main)
+    # Nothing is wrapped until enabled
+    assert _originals() == originals
+    instrumentation.enable()
+    try:
+        wrapped = _originals()
+        assert all(wrapper is not func for wrapper, func in zip(wrapped, originals))
+        assert [wrapper.__wrapped__ for wrapper in wrapped] == originals
+        assert gameencounter.Encounter.take_turns.__wrapped__ is originals[-5]
+        # Enabling twice doesn't wrap the wrappers
+        instrumentation.enable()
+        assert _originals() == wrapped
+        _play(gameworld)
+    finally:
+        instrumentation.disable()
+    assert _originals() == originals
+    assert gameitem.try_attack_enemy is originals[-1]
+    metrics = instrumentation.metrics
+    assert metrics.commands["look"].wall.count == 1
+    assert metrics.commands["move"].wall.count == 1
+    assert metrics.functions["render"].wall.count > 0
+    # Nothing is recorded once disabled
+    _play(gameworld)
+    assert metrics.commands["look"].wall.count == 1
+    data = json.loads(json.dumps(metrics.to_dict()))
+    assert data["commands"]["look"]["calls"] == 1
+
+def test_prometheus(gameworld):
+    instrumentation = instrument.Instrumentation(main)
+    instrumentation.enable()
+    try:
+        _play(gameworld)
+    finally:
+        instrumentation.disable()
+    text = instrumentation.metrics.to_prometheus()
+    series = {}
+    counts = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        match = re.match(r'^(\w+)_(bucket|count|sum)\{(\w+="[^"]*")(?:,le="([^"]+)")?\} (\S+)$', line)
+        assert match, line
+        name, kind, labels, le, value = match.groups()
+        key = (name, labels)
+        if kind == "bucket":
+            series.setdefault(key, []).append((le, int(value)))
+        elif kind == "count":
+            counts[key] = int(value)
+    assert ("game_command_wall_seconds", 'command="look"') in series
+    assert series.keys() == counts.keys()
+    for key, buckets in series.items():
+        values = [value for _, value in buckets]
+        assert values == sorted(values), key
+        bounds = [float(le) for le, _ in buckets[:-1]]
+        assert bounds == sorted(bounds)
+        assert len(buckets) == instrument.BUCKETS
+        assert buckets[-1] == ("+Inf", counts[key])
+    look = series[("game_command_wall_seconds", 'command="look"')]
+    assert look[-1][1] == 1
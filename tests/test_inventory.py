@@ -0,0 +1,46 @@
+import character
+import gameio
+import main
+
+def _new_game(gameworld, lines):
+    player = character.Character()
+    return main.GameData(gameworld, player, gameio.NullIO(lines), seed=1, render=False)
+
+def test_remove_is_by_identity(gameworld):
+    gamedata = _new_game(gameworld, [])
+    inventory = gamedata.player.inventory
+    first = gameworld.item_prototypes["POTION"].create()
+    second = gameworld.item_prototypes["POTION"].create()
+    inventory.add(first)
+    inventory.add(second)
+    inventory.remove(second)
+    assert list(inventory) == [first]
+    assert inventory.count("POTION") == 1
+
+def test_use_removes_the_copy_that_was_used(gameworld):
+    gamedata = _new_game(gameworld, ["2", "1"])
+    player = gamedata.player
+    player.strength.setvalue(1)
+    first = gameworld.item_prototypes["POTION"].create()
+    second = gameworld.item_prototypes["POTION"].create()
+    first.durability = 5
+    player.inventory.add(first)
+    player.inventory.add(second)
+    actions = player.get_use_actions()
+    assert actions[0] is actions[1]
+    assert player.inventory.get_use_items() == [first, second]
+    # Drink the second potion, healing STR
+    main.action_use(gamedata, [])
+    assert player.strength.value == 3
+    assert list(player.inventory) == [first]
+
+def test_attack_items_line_up_with_attacks(gameworld):
+    gamedata = _new_game(gameworld, [])
+    inventory = gamedata.player.inventory
+    sword = gameworld.item_prototypes["SWORD"].create()
+    inventory.add(sword)
+    attacks = inventory.get_attacks()
+    items = inventory.get_attack_items()
+    assert len(attacks) == len(items)
+    assert items[:len(character.BASIC_ATTACKS)] == [None] * len(character.BASIC_ATTACKS)
+    assert all(item is sword for item in items[len(character.BASIC_ATTACKS):])
@@ -0,0 +1,151 @@
+import itertools
+import character
+import gameflags
+import gameio
+import gameutil
+import levelaction
+import main
+import world
+
+ACTIONS = [
+    {"type": "if", "flag": "GATE",
+        "true": [{"type": "give", "item": "SWORD"}, "The gate is open."],
+        "false": {"type": "setflag", "flag": "GATE", "value": True}},
+    {"type": "if", "flag": "COUNT", "value": 2,
+        "true": {"type": "setflag", "flag": "COUNT", "value": 3},
+        "false": {"type": "has", "item": "DAGGER",
+            "true": [{"type": "remove", "item": "DAGGER"}, {"type": "setflag", "flag": "COUNT", "value": 2}],
+            "false": "Nothing happens."}},
+    {"type": "if", "flag": "UNSET", "default": False, "true": "Yes.", "false": {"type": "print", "text": "No."}},
+    {"type": "has", "item": "SWORD",
+        "true": {"type": "remove", "item": "SWORD", "remove-all": True},
+        "false": {"type": "give", "item": "DAGGER"}},
+    {"type": "if", "flag": "COLOR", "value": "red",
+        "true": {"type": "setflag", "flag": "COLOR", "value": None},
+        "false": {"type": "setflag", "flag": "COLOR", "value": "red"}},
+    {"type": "if", "flag": "COLOR", "true": "Colorful.", "false": "Colorless."},
+    {"type": "if", "flag": "NOSLOT", "true": {"type": "setflag", "flag": "NOSLOT", "value": 0},
+        "false": [{"type": "setflag", "flag": "NOSLOT", "value": True}, {"type": "give", "item": "SWORD"}]},
+    {"type": "if", "flag": "GATE", "value": False, "true": "Closed."},
+    {"type": "has", "item": "DAGGER", "false": "No dagger."}
+]
+
+def _interpret(gamedata, action):
+    # How level actions were executed before they were compiled
+    if isinstance(action, list):
+        for item in action:
+            _interpret(gamedata, item)
+    elif isinstance(action, str):
+        gamedata.io.print(gameutil.FMT_IMPORTANT.format(action))
+    elif isinstance(action, dict):
+        atype = action.get("type")
+        if atype == "print":
+            gamedata.io.print(gameutil.FMT_IMPORTANT.format(action.get("text")))
+        elif atype == "setflag":
+            gamedata.flags.set(action.get("flag"), action.get("value"))
+        elif atype == "if":
+            flagname = action.get("flag")
+            if flagname in gamedata.flags:
+                value = gamedata.flags.get(flagname)
+            else:
+                value = action.get("default")
+            testvalue = action.get("value", None)
+            if (testvalue == None and value) or value == testvalue:
+                if "true" in action:
+                    _interpret(gamedata, action.get("true"))
+            elif "false" in action:
+                _interpret(gamedata, action.get("false"))
+        elif atype == "has":
+            if gamedata.player.has_item(action.get("item")):
+                if "true" in action:
+                    _interpret(gamedata, action.get("true"))
+            elif "false" in action:
+                _interpret(gamedata, action.get("false"))
+        elif atype == "give":
+            item = gamedata.world.item_prototypes[action.get("item")].create()
+            gamedata.player.inventory.add(item)
+            gamedata.io.print(gameutil.FMT_IMPORTANT.format("You got the {}".format(item.name)))
+        elif atype == "remove":
+            gamedata.player.inventory.remove_named(action.get("item"), action.get("remove-all", False))
+
+def _layout():
+    flagvalues = {}
+    levelaction.collect_flags(ACTIONS, flagvalues)
+    # NOSLOT is read and set through Flags.extra
+    del flagvalues["NOSLOT"]
+    return gameflags.FlagLayout(flagvalues)
+
+def _states():
+    for gate, count, color, noslot, items in itertools.product((None, True, False), (None, 2, 3),
+            (None, "red", "blue"), (None, True, 0), ((), ("DAGGER",), ("SWORD", "SWORD", "DAGGER"))):
+        flags = {name: value for name, value in
+            (("GATE", gate), ("COUNT", count), ("COLOR", color), ("NOSLOT", noslot)) if value != None}
+        yield flags, items
+
+def _game(gameworld, layout, state):
+    flags, items = state
+    gamedata = main.GameData(gameworld, character.Character(), gameio.ScriptedIO([], echo=False), seed=1)
+    gamedata.flags = gameflags.Flags(layout)
+    for name, value in flags.items():
+        gamedata.flags.set(name, value)
+    for itemname in items:
+        gamedata.player.inventory.add(gameworld.item_prototypes[itemname].create())
+    return gamedata
+
+def _result(gamedata):
+    return (gamedata.io.get_output(), sorted(gamedata.flags.items(), key=lambda item: item[0]),
+        [item.fullname for item in gamedata.player.inventory])
+
+def test_layout():
+    layout = _layout()
+    assert layout.bool_names == ("GATE", "UNSET")
+    assert layout.value_names == ("COLOR", "COUNT")
+
+def test_compiled_actions_match_the_interpreter(gameworld):
+    layout = _layout()
+    linker = world.Linker(gameworld.item_prototypes, gameworld.enemy_prototypes, layout)
+    unlinked = [levelaction.compile_level_action(action) for action in ACTIONS]
+    linked = [levelaction.compile_level_action(action, linker) for action in ACTIONS]
+    assert linker.problems == []
+    runners = {
+        "unlinked": lambda gamedata, i: unlinked[i](gamedata),
+        "linked": lambda gamedata, i: linked[i](gamedata),
+        "execute_level_action": lambda gamedata, i: main.execute_level_action(gamedata, ACTIONS[i])
+    }
+    for state in _states():
+        expected = _game(gameworld, layout, state)
+        games = {name: _game(gameworld, layout, state) for name in runners}
+        # Each action runs more than once, so later runs see what earlier ones did
+        for _ in range(3):
+            for i, action in enumerate(ACTIONS):
+                _interpret(expected, action)
+                for name, run in runners.items():
+                    run(games[name], i)
+                    assert _result(games[name]) == _result(expected), (name, state, action)
+
+def test_execute_level_action_compiles_once(gameworld, monkeypatch):
+    compiled = []
+    compile_level_action = levelaction.compile_level_action
+    def counting_compile(action, linker=None):
+        compiled.append(action)
+        return compile_level_action(action, linker)
+    monkeypatch.setattr(levelaction, "compile_level_action", counting_compile)
+    monkeypatch.setattr(main, "_compiled_actions", {})
+    gamedata = _game(gameworld, gameworld.flag_layout, ({}, ()))
+    action = {"type": "give", "item": "DAGGER"}
+    for _ in range(5):
+        main.execute_level_action(gamedata, action)
+    assert compiled == [action]
+    assert gamedata.player.inventory.count("DAGGER") == 5
+    # Equal actions that aren't the same object are compiled on their own
+    main.execute_level_action(gamedata, dict(action))
+    assert len(compiled) == 2
+    # Only the most recent actions are kept
+    actions = ["Text {}".format(i) for i in range(main.LEVEL_ACTION_CACHE_SIZE + 10)]
+    for text in actions:
+        main.execute_level_action(gamedata, text)
+    assert len(main._compiled_actions) == main.LEVEL_ACTION_CACHE_SIZE
+    del compiled[:]
+    main.execute_level_action(gamedata, actions[-1])
+    main.execute_level_action(gamedata, action)
+    assert compiled == [action]
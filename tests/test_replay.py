@@ -0,0 +1,38 @@
+import glob
+import os
+import pytest
+import main
+import replay
+
+SESSION_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions")
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _read(path):
+    with open(path, encoding="utf-8") as logfile:
+        return replay.read_session(logfile)
+
+@pytest.fixture(scope="module")
+def worlds():
+    return {}
+
+@pytest.mark.parametrize("path", sorted(glob.glob(os.path.join(SESSION_DIR, "*.log"))),
+    ids=os.path.basename)
+def test_session_output_is_unchanged(path, worlds):
+    session = _read(path)
+    assert session.digest != None
+    level = main.FILE_LEVEL if session.level == None else os.path.join(REPO_DIR, session.level)
+    if level not in worlds:
+        worlds[level] = main.load_content(level=level, use_cache=False)
+    gamedata, digest = replay.replay(worlds[level], session, check=True)
+    assert digest == session.digest
+    assert gamedata.finished
+
+def test_sessions_are_checked_in():
+    names = {os.path.basename(path) for path in glob.glob(os.path.join(SESSION_DIR, "*.log"))}
+    assert {"won.log", "died.log", "explore.log", "zork.log"} <= names
+
+def test_recorded_outcomes(gameworld):
+    gamedata, _ = replay.replay(gameworld, _read(os.path.join(SESSION_DIR, "won.log")))
+    assert gamedata.room == "END"
+    gamedata, _ = replay.replay(gameworld, _read(os.path.join(SESSION_DIR, "died.log")))
+    assert gamedata.player.is_dead()
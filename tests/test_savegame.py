@@ -0,0 +1,62 @@
+import pytest
+import analyzer
+import character
+import gameio
+import main
+import savegame
+import world
+
+def _state(gamedata):
+    player = gamedata.player
+    return (gamedata.room, gamedata.lastroom, sorted(gamedata.explored), sorted(gamedata.cleared_combats),
+        gamedata.flags.items(), player.barricade,
+        [(stat.value, stat.maxvalue) for stat in (player.strength, player.dexterity, player.wisdom, player.soul)],
+        [(item.fullname, item.durability) for item in player.inventory],
+        [(enemy.shortname, enemy.health.value, enemy.curse, enemy.next_action) for enemy in gamedata.encounter])
+
+def test_round_trip(gameworld):
+    script = analyzer.analyze(gameworld).winning_script
+    for count in range(len(script) + 1):
+        # Stop partway through the level, sometimes in the middle of a fight
+        gamedata = main.start_game(gameworld, gameio.NullIO(["1"] + script[:count]), seed=3, render=False)
+        main.game_loop(gamedata)
+        data = savegame.save_session(gamedata)
+        loaded = savegame.load_session(gameworld, data, gameio.NullIO([]))
+        assert _state(loaded) == _state(gamedata)
+        assert savegame.save_session(loaded) == data
+
+def _big_world(gameworld, rooms):
+    level = {}
+    for i in range(rooms):
+        level["R{:06}".format(i)] = {"name": "Room", "desc": "A room.", "exits": []}
+    return world.World(level, dict(gameworld.items), dict(gameworld.classdefs), dict(gameworld.enemydefs))
+
+def test_more_rooms_than_fit_in_u16(gameworld):
+    bigworld = _big_world(gameworld, 70001)
+    gamedata = main.GameData(bigworld, character.Character(), gameio.NullIO([]), render=False)
+    # 0xFFFF used to mean "no room"
+    gamedata.room = bigworld.room_names[0xFFFF]
+    gamedata.lastroom = bigworld.room_names[70000]
+    gamedata.explored = {gamedata.room: True, gamedata.lastroom: True}
+    data = savegame.save_session(gamedata)
+    loaded = savegame.load_session(bigworld, data)
+    assert (loaded.room, loaded.lastroom) == (gamedata.room, gamedata.lastroom)
+    assert loaded.explored == gamedata.explored
+    gamedata.lastroom = ""
+    loaded = savegame.load_session(bigworld, savegame.save_session(gamedata))
+    assert loaded.lastroom == ""
+
+def test_too_many_for_inventory_count(gameworld):
+    gamedata = main.GameData(gameworld, character.Character(), gameio.NullIO([]), render=False)
+    prototype = gameworld.item_prototypes["POTION"]
+    gamedata.player.inventory.replace(prototype.create() for _ in range(0x10000))
+    with pytest.raises(savegame.SaveError):
+        savegame.save_session(gamedata)
+
+def test_rejects_other_content(gameworld):
+    gamedata = main.GameData(gameworld, character.Character(), gameio.NullIO([]), render=False)
+    data = savegame.save_session(gamedata)
+    with pytest.raises(savegame.SaveError):
+        savegame.load_session(_big_world(gameworld, 3), data)
+    with pytest.raises(savegame.SaveError):
+        savegame.load_session(gameworld, data[:-1])
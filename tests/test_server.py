@@ -0,0 +1,106 @@
+import asyncio
+import random
+import bench_memory
+import gameio
+import main
+import replay
+import server
+
+def _clean(*lines):
+    cleaner = server._LineCleaner()
+    return [cleaner.clean(line) for line in lines]
+
+def test_plain_lines():
+    assert _clean(b"look\r\n", b"move north\n") == ["look", "move north"]
+    assert _clean(b"l\x00o\x1bok\x7f\r\n") == ["look"]
+
+def test_option_commands_are_three_bytes():
+    # IAC WILL ECHO, IAC DONT LINEMODE
+    assert _clean(b"\xff\xfb\x01look\xff\xfe\x22\r\n") == ["look"]
+
+def test_other_commands_are_two_bytes():
+    # IAC NOP, IAC GA
+    assert _clean(b"\xff\xf1look\xff\xf9\r\n") == ["look"]
+
+def test_escaped_iac_keeps_the_next_byte():
+    assert _clean(b"lo\xff\xffok\r\n") == ["look"]
+
+def test_subnegotiation_is_skipped():
+    # IAC SB NAWS 0 80 0 24 IAC SE, with an escaped IAC inside
+    assert _clean(b"\xff\xfa\x1f\x00\x50\xff\xff\x18\xff\xf0look\r\n") == ["look"]
+
+def test_commands_split_across_lines():
+    assert _clean(b"look\xff", b"\xfb\x01\r\n") == ["look", ""]
+    assert _clean(b"\xff\xfa\x18\x00xterm\r\n", b"more\xff\xf0look\r\n") == ["", "look"]
+
+def test_session(gameworld):
+    count = 200
+    async def play():
+        gameserver = server.GameServer(gameworld, interactive=False)
+        tcpserver = await asyncio.start_server(gameserver.handle_client, "127.0.0.1", 0)
+        port = tcpserver.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        # Many lines at once, behind a telnet command
+        writer.write(b"\xff\xfd\x03" + b"1\r\n" + b"stat\r\n" * count + b"quit\r\n")
+        await writer.drain()
+        output = await asyncio.wait_for(reader.read(), 30)
+        writer.close()
+        tcpserver.close()
+        await tcpserver.wait_closed()
+        return output.decode("utf-8")
+    output = asyncio.run(play())
+    assert output.count("Strength, your physical power") == count
+    assert output.endswith("Goodbye!\r\n")
+
+COMMANDS = ["attack", "use", "1", "2", "3", "", "look", "stat", "move north", "move south", "move east",
+    "move west", "take", "search", "open", "inventory", "goto forest", "x"]
+
+def _lines(seed):
+    rng = random.Random(seed)
+    return [str(rng.randint(1, 5))] + [rng.choice(COMMANDS) for _ in range(rng.randint(10, 80))]
+
+def _feed(session, lines):
+    output = [session.start()]
+    for line in lines:
+        if session.finished:
+            break
+        output.append(session.feed(line))
+    return "".join(output)
+
+def test_turns_played_again_give_the_same_game(gameworld):
+    # Menus and pauses stop a turn until the next line arrives, and the turn
+    # is then played again from a snapshot
+    for seed in range(20):
+        lines = _lines(seed)
+        io = gameio.ScriptedIO(lines, interactive=True, echo=False)
+        gamedata = main.play(gameworld, io, seed)
+        session = server.GameSession(gameworld, server.SessionIO(), seed)
+        output = _feed(session, lines)
+        assert session.gamedata.room == gamedata.room
+        assert session.gamedata.player.format_string() == gamedata.player.format_string()
+        assert output == io.get_output() + ("Goodbye!\n" if session.finished else "")
+
+def test_recorded_session_replays(gameworld, tmp_path):
+    lines = _lines(9) + ["quit"]
+    path = str(tmp_path / "session.log")
+    io = server.SessionIO()
+    recorder = gameio.RecordingIO(io, open(path, "w", encoding="utf-8"), 9, None)
+    session = server.GameSession(gameworld, io, 9, recorder)
+    _feed(session, lines)
+    session.close()
+    assert session.finished
+    with open(path, encoding="utf-8") as logfile:
+        recorded = replay.read_session(logfile)
+    # Lines that only answered pauses aren't recorded
+    assert len(recorded.lines) <= len(lines)
+    _, digest = replay.replay(gameworld, recorded, check=True)
+    assert digest == recorded.digest
+
+def test_session_memory(gameworld):
+    def create(i):
+        session = server.GameSession(gameworld, server.SessionIO(), i)
+        _feed(session, ["1", "look", "stat", "move north", "attack"])
+        return session
+    # A session is its game and a few buffers, plus a snapshot of the game
+    # while a turn waits for input; it used to be a thread with its own stack
+    assert bench_memory.measure(create, 200) < 32 * 1024
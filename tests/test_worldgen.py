@@ -0,0 +1,101 @@
+import json
+import os
+import contentcache
+import main
+import world
+import worldgen
+
+CONTENT_FILES = {"level": "level.json", "items": "items.json", "classes": "classes.json", "enemies": "enemies.json"}
+
+def _generate(tmp_path, name, **kwargs):
+    directory = str(tmp_path / name)
+    worldgen.generate_world(directory, **kwargs)
+    return directory
+
+def _read(directory, key):
+    with open(os.path.join(directory, CONTENT_FILES[key]), "rb") as f:
+        return f.read()
+
+def _level(directory):
+    return json.loads(_read(directory, "level").decode("utf-8"))
+
+def _depth(action):
+    # The deepest nesting of "if"/"has" actions
+    if isinstance(action, list):
+        return max((_depth(item) for item in action), default=0)
+    if isinstance(action, dict) and action.get("type") in ("if", "has"):
+        return 1 + max(_depth(action.get("true")), _depth(action.get("false")))
+    return 0
+
+def _flags(action, found):
+    if isinstance(action, list):
+        for item in action:
+            _flags(item, found)
+    elif isinstance(action, dict):
+        if "flag" in action:
+            found.add(action["flag"])
+        for key in ("true", "false"):
+            _flags(action.get(key), found)
+
+def test_same_seed_gives_the_same_files(tmp_path):
+    first = _generate(tmp_path, "first", seed=5, rooms=50)
+    second = _generate(tmp_path, "second", seed=5, rooms=50)
+    other = _generate(tmp_path, "other", seed=6, rooms=50)
+    for key in CONTENT_FILES:
+        assert _read(first, key) == _read(second, key)
+    assert _read(first, "level") != _read(other, "level")
+
+def test_generated_world_links(tmp_path):
+    directory = _generate(tmp_path, "world", seed=1, rooms=30, exits=4, objects=2)
+    # Raises ContentError if any name can't be resolved
+    content = contentcache.load_content_files(directory, CONTENT_FILES, use_cache=False)
+    gameworld = world.World(content["level"], content["items"], content["classes"], content["enemies"])
+    assert len(gameworld.rooms) == 31
+    assert main.load_content(directory=directory, use_cache=False).signature == gameworld.signature
+
+def test_rooms_and_exits(tmp_path):
+    level = _level(_generate(tmp_path, "world", seed=2, rooms=40, exits=5))
+    assert len(level) == 41
+    assert "WHOUS" in level and "END" in level
+    for roomname, room in level.items():
+        if roomname != "END":
+            assert len(room["exits"]) == 5
+            assert all(exitdata["target"] in level for exitdata in room["exits"])
+    # Every room leads forward, so END can always be reached
+    assert level["R39"]["exits"][0]["target"] == "END"
+    assert level["WHOUS"]["exits"][0]["target"] == "R1"
+
+def test_objects_and_depth(tmp_path):
+    for depth in (0, 1, 3):
+        level = _level(_generate(tmp_path, "depth{}".format(depth), seed=3, rooms=10, objects=3, depth=depth))
+        for roomname, room in level.items():
+            if roomname == "END":
+                continue
+            assert len(room["interact"]) == 3
+            for objectdata in room["interact"].values():
+                for verb in worldgen.VERBS:
+                    assert _depth(objectdata[verb]) == depth
+
+def test_flags_and_keys(tmp_path):
+    directory = _generate(tmp_path, "world", seed=4, rooms=60, flags=3, keys=2)
+    found = set()
+    for room in _level(directory).values():
+        for exitdata in room.get("exits", []):
+            _flags(exitdata, found)
+        for objectdata in room.get("interact", {}).values():
+            for action in objectdata.values():
+                _flags(action, found)
+    assert found == {worldgen.flag_name(i) for i in range(3)}
+    items = json.loads(_read(directory, "items").decode("utf-8"))
+    assert {name for name in items if name.startswith("GEN_KEY_")} == {worldgen.key_name(i) for i in range(2)}
+
+def test_no_flags(tmp_path):
+    found = set()
+    for room in _level(_generate(tmp_path, "world", seed=4, rooms=20, flags=0, keys=0)).values():
+        for exitdata in room.get("exits", []):
+            _flags(exitdata, found)
+        for objectdata in room.get("interact", {}).values():
+            for action in objectdata.values():
+                _flags(action, found)
+                assert _depth(action) == 0
+    assert found == set()
@@ -0,0 +1,82 @@
+import io
+import json
+import os
+import pytest
+import gameio
+import main
+import worldimport
+
+ZORK = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "zork.json")
+
+@pytest.fixture(scope="module")
+def zorkworld():
+    return main.load_content(use_cache=False, level="zork.json")
+
+def _source():
+    with open(ZORK, encoding="utf-8") as f:
+        return json.load(f)
+
+def test_import(zorkworld):
+    level = main.load_sources(use_cache=False, level="zork.json")["level"]
+    assert len(level) == 196
+    assert len(zorkworld.rooms) == 196
+    for roomname, room in level.items():
+        assert not worldimport.is_foreign_room(room)
+        for exitdata in room["exits"]:
+            assert exitdata["target"] in level
+            assert exitdata["exit"] != worldimport.HIDDEN_EXIT
+        for item in room.get("items", {}).values():
+            assert item["item"] in zorkworld.items
+    pamphlet = level["WHOUS"]["items"]["pamphlet"]
+    assert pamphlet == {
+        "item": "PAMPHLET",
+        "look": "A pamphlet is lying on the ground, near the front door.",
+        "take": "You pick the pamphlet up off the ground."
+    }
+
+def test_convert_room():
+    stats = {}
+    room = worldimport.convert_room("ROOM", {
+        "exits": [
+            {"exit": "NORTH", "target": "OTHER"},
+            {"exit": "SOUTH", "target": worldimport.NOWHERE},
+            {"exit": worldimport.HIDDEN_EXIT, "target": "OTHER"}
+        ],
+        "items": [{"item": "BIG_KEY"}, {"item": "BIG_KEY", "desc": "Again."}]
+    }, stats)
+    assert room == {"name": "ROOM", "exits": [{"exit": "NORTH", "target": "OTHER"}],
+        "items": {"big key": {"item": "BIG_KEY"}}}
+    assert stats == {"dead-end exits": 1, "hidden exits": 1, "duplicate items": 1, "rooms": 1}
+    # Native rooms are left alone
+    native = {"name": "Room", "exits": []}
+    assert worldimport.convert_room("ROOM", native) is native
+
+def test_iter_object_streams():
+    with open(ZORK, encoding="utf-8") as f:
+        text = f.read()
+    expected = list(_source().items())
+    # Chunks that end in the middle of keys, strings and numbers
+    for chunk_size in (1, 7, 100, worldimport.CHUNK_SIZE):
+        items = worldimport.iter_object(io.StringIO(text), chunk_size)
+        first = next(items)
+        assert first == expected[0]
+        assert [first] + list(items) == expected
+    assert list(worldimport.iter_object(io.StringIO(' { "a" : 12345 , "b":[1, {}]}'), 2)) == [("a", 12345), ("b", [1, {}])]
+    assert list(worldimport.iter_object(io.StringIO("{}"))) == []
+    for bad in ("[1]", '{"a": 1', '{"a" 1}'):
+        with pytest.raises(ValueError):
+            list(worldimport.iter_object(io.StringIO(bad), 2))
+
+def test_import_world():
+    with open(ZORK, encoding="utf-8") as sourcefile:
+        dest = io.StringIO()
+        stats = worldimport.import_world(sourcefile, dest, chunk_size=1000)
+    assert stats["rooms"] == 196
+    assert json.loads(dest.getvalue()) == worldimport.convert_level(_source())
+
+def test_play(zorkworld):
+    lines = ["1", "take pamphlet", "move north", "look", "inventory"]
+    gamedata = main.play(zorkworld, gameio.NullIO(lines), seed=1, render=False)
+    assert gamedata.room == "NHOUS"
+    assert "PAMPHLET" in [item.fullname for item in gamedata.player.inventory]
+    assert gamedata.explored.keys() >= {"WHOUS", "NHOUS"}
@@ -0,0 +1,449 @@
+import collections.abc
+import types
+import zlib
+import commandparser
+import contentcache
+import exitgraph
+import gameenemy
+import gameflags
+import gameitem
+import levelaction
+
+DEFAULT_FAIL_TEXT = "For some reason, you weren't able to leave."
+DEFAULT_LOOK = "There's not much to look at."
+
+def freeze(value):
+    """
+    Make a read-only copy of JSON data; dictionaries become mapping proxies
+    and lists become tuples.
+
+    Parameters
+    ----------
+    value: dict, list, or any other JSON value
+        The data to freeze.
+    """
+    if isinstance(value, dict):
+        return types.MappingProxyType({key: freeze(x) for key, x in value.items()})
+    elif isinstance(value, list):
+        return tuple(freeze(x) for x in value)
+    return value
+
+def preprocess_level_items(roomname, room):
+    """
+    Get a room's interactions, including generated interactions for each of
+    its items so that they can be looked at and taken. An item's optional
+    "take" text is printed before the item is given. The room itself is not
+    modified.
+
+    Parameters
+    ----------
+    roomname: str
+        The name of the room.
+    room: dict
+        The room's definition.
+    """
+    interact = dict(room.get("interact", {}))
+    for itemname, itemdef in room.get("items", {}).items():
+        if itemname in interact:
+            continue
+        # Unique, but a level could check if a specific item was taken anyways
+        flag = "@{}_{}".format(roomname, itemname)
+        itemkey = itemdef.get("item")
+        take = [
+            {
+                "type": "give",
+                "item": itemkey
+            }, {
+                "type": "setflag",
+                "flag": flag,
+                "value": False
+            }
+        ]
+        if "take" in itemdef:
+            take.insert(0, itemdef["take"])
+        data = {
+            "take": {
+                "type": "if",
+                "flag": flag,
+                "default": True,
+                "true": take,
+                "false": "You already took the {}.".format(itemname)
+            },
+            "look": {
+                "type": "if",
+                "flag": flag,
+                "default": True,
+                "true": itemdef.get("look", "There is a {}.".format(itemname)),
+                "false": "You already took the {}.".format(itemname)
+            }
+        }
+        interact[itemname] = data
+    return interact
+
+def find_flags(level):
+    """
+    Find every flag that a level uses. Returns a dictionary of flag names to
+    the values that the level sets them to (see levelaction.collect_flags).
+
+    Parameters
+    ----------
+    level: dict[str -> dict]
+        The level's rooms.
+    """
+    flagvalues = {}
+    for roomname, room in level.items():
+        for key in ("desc", "look"):
+            if key in room:
+                levelaction.collect_flags(room[key], flagvalues)
+        for exitdata in room.get("exits", []):
+            if exitdata.get("flag") != None:
+                flagvalues.setdefault(exitdata["flag"], [])
+            levelaction.collect_flags(exitdata.get("fail-text"), flagvalues)
+        for objectdata in preprocess_level_items(roomname, room).values():
+            for actiondata in objectdata.values():
+                levelaction.collect_flags(actiondata, flagvalues)
+    return flagvalues
+
+class Linker:
+    """
+    Resolves names in the content to the definitions they refer to while a
+    world is built, and collects every name that couldn't be resolved.
+
+    Attributes
+    ----------
+    items: dict[str -> gameitem.ItemPrototype]
+        Item prototypes.
+    enemies: dict[str -> gameenemy.EnemyPrototype]
+        Enemy prototypes.
+    flags: gameflags.FlagLayout
+        The slot of each flag.
+    rooms: mapping[str -> Room]
+        The world's rooms, which exits lead to.
+    context: str
+        Where in the content names are being resolved, e.g. "room 'WHOUS'".
+    problems: list[str]
+        Every problem that was found.
+    """
+    def __init__(self, items, enemies, flags, rooms=None):
+        self.items = items
+        self.enemies = enemies
+        self.flags = flags
+        self.rooms = rooms
+        self.context = "content"
+        self.problems = []
+    def problem(self, text):
+        """
+        Report a problem at the current context.
+        """
+        self.problems.append("{}: {}".format(self.context, text))
+    def flag(self, flagname):
+        """
+        Get the accessors of a flag's slot (see FlagLayout.accessors), or None
+        if the flag has no slot.
+        """
+        return self.flags.accessors(flagname)
+    def item(self, itemname):
+        """
+        Get an item's prototype, or None if there is no such item.
+        """
+        if itemname not in self.items:
+            self.problem("unknown item '{}'".format(itemname))
+            return None
+        return self.items[itemname]
+    def enemy(self, enemyname):
+        """
+        Get an enemy's prototype, or None if there is no such enemy.
+        """
+        if enemyname not in self.enemies:
+            self.problem("unknown enemy '{}'".format(enemyname))
+            return None
+        return self.enemies[enemyname]
+
+class _Frozen:
+    """
+    Base class for objects that can't be modified once they are created.
+    """
+    __slots__ = ()
+    def _set(self, name, value):
+        object.__setattr__(self, name, value)
+    def __setattr__(self, name, value):
+        raise AttributeError("'{}' objects are read-only".format(type(self).__name__))
+    def __delattr__(self, name):
+        raise AttributeError("'{}' objects are read-only".format(type(self).__name__))
+
+class Exit(_Frozen):
+    """
+    An exit out of a room.
+
+    Attributes
+    ----------
+    exit: str
+        The exit's name, e.g. "NORTH".
+    target: str
+        The name of the room that this exit leads to.
+    room: Room
+        The room that this exit leads to.
+    revealed: bool
+        If true, the target's name is shown even if it hasn't been explored.
+    flag: str
+        The flag that must be set to use this exit, or None.
+    flag_slot: tuple
+        Accessors of the flag's slot (see FlagLayout.accessors), or None.
+    flag_test: any
+        The value that the flag must have.
+    flag_default: any
+        The value of the flag if it hasn't been set.
+    fail_text: function(gamedata)
+        Compiled level action to run when the exit can't be used.
+    """
+    __slots__ = ("exit", "target", "_rooms", "revealed", "flag", "flag_slot", "flag_test",
+        "flag_default", "fail_text")
+    def __init__(self, exitdata, linker=None):
+        self._set("exit", exitdata["exit"])
+        self._set("target", exitdata["target"])
+        # The target is looked up when it is needed, so that linking a room
+        # doesn't link every room it leads to
+        self._set("_rooms", linker.rooms if linker != None else None)
+        self._set("revealed", exitdata.get("revealed", False))
+        self._set("flag", exitdata.get("flag"))
+        flag_slot = None
+        if linker != None and self.flag != None:
+            flag_slot = linker.flag(self.flag)
+        self._set("flag_slot", flag_slot)
+        self._set("flag_test", exitdata.get("flag-test", True))
+        self._set("flag_default", exitdata.get("flag-default"))
+        self._set("fail_text", levelaction.compile_level_action(
+            exitdata.get("fail-text", DEFAULT_FAIL_TEXT), linker))
+    @property
+    def room(self):
+        if self._rooms == None:
+            return None
+        return self._rooms[self.target]
+    def is_open(self, flags):
+        """
+        Returns true if this exit can be used.
+
+        Parameters
+        ----------
+        flags: gameflags.Flags
+            The game's flags.
+        """
+        if self.flag == None:
+            return True
+        if self.flag_slot != None:
+            getter, _, index = self.flag_slot
+            return getter(flags, index, self.flag_default) == self.flag_test
+        return flags.get(self.flag, self.flag_default) == self.flag_test
+
+class Room(_Frozen):
+    """
+    A room in the world.
+
+    Attributes
+    ----------
+    id: str
+        The room's key in the level data.
+    name: str
+        The room's display name.
+    data: mapping
+        Read-only copy of the room's definition, with generated item
+        interactions included in "interact".
+    desc: function(gamedata)
+        Compiled description, or None if the room has no description.
+    desc_post_combat: str
+        Description shown once the room's encounter was beaten, or None.
+    look: function(gamedata)
+        Compiled action for looking around the room.
+    exits: tuple[Exit]
+        The room's exits.
+    interact: mapping[str -> mapping[str -> function(gamedata)]]
+        Compiled interactions; keys are object names, then verbs.
+    encounter: tuple[str]
+        Names of the enemies that ambush the player in this room.
+    enemies: tuple[gameenemy.EnemyPrototype]
+        The prototype of each enemy in the encounter.
+    exit_index: commandparser.Trie
+        Finds an exit's index by its name or an abbreviation.
+    object_index: commandparser.Trie
+        Finds an object in interact by its name or an abbreviation.
+    enemy_index: commandparser.Trie
+        Finds an enemy's prototype by its name or an abbreviation.
+    """
+    __slots__ = ("id", "name", "data", "desc", "desc_post_combat", "look", "exits", "interact",
+        "encounter", "enemies", "exit_index", "object_index", "enemy_index")
+    def __init__(self, roomname, room, linker=None):
+        interact = preprocess_level_items(roomname, room)
+        data = dict(room)
+        data["interact"] = interact
+        self._set("id", roomname)
+        self._set("name", room.get("name", roomname))
+        self._set("data", freeze(data))
+        desc = None
+        if "desc" in room:
+            desc = levelaction.compile_level_action(room["desc"], linker)
+        self._set("desc", desc)
+        self._set("desc_post_combat", room.get("desc-post-combat"))
+        self._set("look", levelaction.compile_level_action(room.get("look", DEFAULT_LOOK), linker))
+        self._set("exits", tuple(Exit(exitdata, linker) for exitdata in room.get("exits", [])))
+        self._set("interact", types.MappingProxyType({objectname:
+            types.MappingProxyType({action: levelaction.compile_level_action(actiondata, linker)
+                for action, actiondata in objectdata.items()})
+            for objectname, objectdata in interact.items()}))
+        self._set("encounter", tuple(room.get("encounter", [])))
+        enemies = []
+        if linker != None:
+            for enemyname in self.encounter:
+                prototype = linker.enemy(enemyname)
+                if prototype != None:
+                    enemies.append(prototype)
+        self._set("enemies", tuple(enemies))
+        self._set("exit_index", commandparser.build_exit_index(self.exits))
+        self._set("object_index", commandparser.build_object_index(self.interact))
+        self._set("enemy_index", commandparser.build_enemy_index(self.enemies))
+
+class LinkedRooms(collections.abc.Mapping):
+    """
+    A world's rooms, each linked the first time that it is looked up. Only
+    used for content that is known to link without problems (see
+    link_tables), since problems are found late or not at all.
+    """
+    __slots__ = ("_level", "_linker", "_rooms")
+    def __init__(self, level, linker):
+        """
+        Parameters
+        ----------
+        level: dict[str -> dict]
+            The level's rooms.
+        linker: Linker
+            Resolves the names in each room.
+        """
+        self._level = level
+        self._linker = linker
+        self._rooms = {}
+    def __getitem__(self, roomname):
+        room = self._rooms.get(roomname)
+        if room == None:
+            # Raises KeyError for unknown rooms
+            room = Room(roomname, self._level[roomname], self._linker)
+            self._rooms[roomname] = room
+        return room
+    def __contains__(self, roomname):
+        return roomname in self._level
+    def __iter__(self):
+        return iter(self._level)
+    def __len__(self):
+        return len(self._level)
+
+def link_tables(content):
+    """
+    Link content into a world, and get the tables that let a world be
+    created from the same content without linking it again (see World).
+    Raises contentcache.ContentError if the content can't be linked.
+
+    The tables are plain data, so that they can be cached with the content
+    (see contentcache.load_content_files). Compiled actions are functions,
+    which can't be cached, so rooms are linked when they are first used.
+
+    Parameters
+    ----------
+    content: dict[str -> any]
+        The content, with the keys "level", "items", "classes" and "enemies".
+    """
+    World(content["level"], content["items"], content["classes"], content["enemies"])
+    return {"flags": find_flags(content["level"])}
+
+class World(_Frozen):
+    """
+    Everything that is loaded from the game's content files, prepared to be
+    played. A world is never modified by a game, so any number of games can
+    share it; each game's progress is kept in its GameData.
+
+    Every name in the content (exit targets, items and enemies) is resolved
+    when the world is created. If any of them can't be resolved, a
+    contentcache.ContentError listing all of them is raised. If the world is
+    created with tables from link_tables, the content is known to link, and
+    each room is only linked once it is first looked up.
+
+    Attributes
+    ----------
+    rooms: mapping[str -> Room]
+        The rooms in the world, where keys are room names.
+    items: mapping[str -> dict]
+        Item definitions.
+    item_prototypes: mapping[str -> gameitem.ItemPrototype]
+        The prototype of each item, shared by every copy of the item.
+    classdefs: mapping[str -> dict]
+        Class definitions.
+    enemydefs: mapping[str -> dict]
+        Enemy definitions.
+    enemy_prototypes: mapping[str -> gameenemy.EnemyPrototype]
+        The prototype of each enemy, shared by every spawned copy of it.
+    room_names, item_names, enemy_names: tuple[str]
+        Sorted names of every room, item and enemy. A name's index in its tuple
+        is its ID, which is used to refer to it compactly (e.g. in saves).
+    room_ids, item_ids, enemy_ids: mapping[str -> int]
+        The ID of each room, item and enemy name.
+    flag_layout: gameflags.FlagLayout
+        The slot of every flag used by the content.
+    graph: exitgraph.ExitGraph
+        The exits between rooms, for finding paths.
+    signature: int
+        A checksum of every ID and flag slot. Two worlds with the same
+        signature assign the same IDs and slots.
+    """
+    __slots__ = ("rooms", "items", "item_prototypes", "classdefs", "enemydefs",
+        "enemy_prototypes", "room_names", "item_names",
+        "enemy_names", "room_ids", "item_ids", "enemy_ids", "flag_layout", "graph", "signature")
+    def __init__(self, level, items, classdefs, enemydefs, tables=None):
+        """
+        Parameters
+        ----------
+        level, items, classdefs, enemydefs: dict[str -> dict]
+            The content.
+        tables: dict
+            If given, the tables that link_tables returned for the same
+            content.
+        """
+        flagvalues = find_flags(level) if tables == None else tables["flags"]
+        flag_layout = gameflags.FlagLayout(flagvalues)
+        self._set("flag_layout", flag_layout)
+        item_prototypes = gameitem.build_prototypes(items)
+        self._set("item_prototypes", types.MappingProxyType(item_prototypes))
+        enemy_prototypes = gameenemy.build_prototypes(enemydefs)
+        self._set("enemy_prototypes", types.MappingProxyType(enemy_prototypes))
+        linker = Linker(item_prototypes, enemy_prototypes, flag_layout)
+        if tables != None:
+            rooms = LinkedRooms(level, linker)
+            linker.rooms = rooms
+        else:
+            rooms = {}
+            linker.rooms = rooms
+            for roomname, room in level.items():
+                linker.context = "room '{}'".format(roomname)
+                rooms[roomname] = Room(roomname, room, linker)
+            for roomname, room in rooms.items():
+                linker.context = "room '{}'".format(roomname)
+                for exitdata in room.exits:
+                    if exitdata.target not in rooms:
+                        linker.problem("exit {} leads to unknown room '{}'".format(exitdata.exit, exitdata.target))
+            for classname, classdef in classdefs.items():
+                linker.context = "class '{}'".format(classname)
+                for itemname in classdef.get("items", []):
+                    linker.item(itemname)
+            if len(linker.problems) > 0:
+                raise contentcache.ContentError(linker.problems)
+            rooms = types.MappingProxyType(rooms)
+        self._set("rooms", rooms)
+        self._set("graph", exitgraph.ExitGraph(level, rooms, flag_layout))
+        self._set("items", types.MappingProxyType(items))
+        self._set("classdefs", types.MappingProxyType(classdefs))
+        self._set("enemydefs", types.MappingProxyType(enemydefs))
+        signature = 0
+        for kind, names in (("room", level), ("item", items), ("enemy", enemydefs)):
+            names = tuple(sorted(names))
+            self._set(kind + "_names", names)
+            self._set(kind + "_ids", types.MappingProxyType({name: i for i, name in enumerate(names)}))
+            signature = zlib.crc32("\0".join(names).encode("utf-8"), signature)
+        for names in (flag_layout.bool_names, flag_layout.value_names):
+            signature = zlib.crc32("\0".join(names).encode("utf-8"), signature)
+        self._set("signature", signature)
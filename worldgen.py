@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Procedural world generator.
+
+Writes a complete set of content files (level.json, items.json, classes.json
+and enemies.json) to a folder, so that loading and playing can be measured on
+worlds of any size. The same seed and settings always produce the same files.
+
+Every generated room can be reached: room i has an exit to room i + 1, and the
+last room leads to the END room. Other exits lead to random rooms, and some of
+them are locked by a flag that objects in the world may set. Objects
+have nested "if"/"has" actions, some rooms have keys to pick up, and some rooms
+ambush the player with enemies. The player starts in WHOUS, which is room 0.
+
+Run with e.g. `python worldgen.py out --rooms 100000 --seed 1`, then load the
+world with `main.load_content(directory="out")`.
+"""
+import sys
+assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
+
+import argparse
+import json
+import os
+import random
+
+# Names of the first exits of each room; later exits are numbered
+DIRECTIONS = ["NORTH", "SOUTH", "EAST", "WEST", "UP", "DOWN", "NE", "NW", "SE", "SW"]
+ADJECTIVES = ["Dusty", "Damp", "Quiet", "Narrow", "Ruined", "Bright", "Cold", "Crooked"]
+PLACES = ["Hall", "Cave", "Clearing", "Cellar", "Path", "Chamber", "Garden", "Tunnel"]
+OBJECTS = ["statue", "chest", "lever", "painting", "altar", "crate", "mirror", "well"]
+VERBS = ["look", "search", "open"]
+
+def room_id(index, rooms):
+    """
+    Get the key of the index'th room. The first room is WHOUS, so that the
+    game starts there, and the room after the last is END.
+    """
+    if index == 0:
+        return "WHOUS"
+    if index >= rooms:
+        return "END"
+    return "R{}".format(index)
+
+def flag_name(index):
+    return "GEN_FLAG_{}".format(index)
+
+def key_name(index):
+    return "GEN_KEY_{}".format(index)
+
+def _gen_action(rng, depth, flags, keys):
+    """
+    Generate an action with the given number of nested conditions. One branch
+    of each condition nests further, and the innermost action sets a flag.
+    """
+    if depth <= 0:
+        text = "Something {} happens.".format(rng.choice(ADJECTIVES).lower())
+        if flags == 0:
+            return text
+        return [text, {"type": "setflag", "flag": flag_name(rng.randrange(flags)), "value": True}]
+    inner = _gen_action(rng, depth - 1, flags, keys)
+    if keys > 0 and (flags == 0 or rng.random() < 0.5):
+        return {
+            "type": "has",
+            "item": key_name(rng.randrange(keys)),
+            "true": inner,
+            "false": "You seem to be missing something."
+        }
+    if flags == 0:
+        return inner
+    return {
+        "type": "if",
+        "flag": flag_name(rng.randrange(flags)),
+        "default": False,
+        "true": "Nothing else happens.",
+        "false": inner
+    }
+
+def generate_room(rng, index, rooms, exits=3, objects=1, depth=2, flags=16, keys=4,
+        enemies=(), encounter_chance=0.2, encounter_size=3):
+    """
+    Generate a room in the native level format. See generate_world for the
+    parameters.
+
+    Parameters
+    ----------
+    rng: random.Random
+        The generator to draw from.
+    index: int
+        The room's index.
+    """
+    room = {
+        "name": "{} {} {}".format(rng.choice(ADJECTIVES), rng.choice(PLACES), index),
+        "desc": "You are in room {}.".format(index)
+    }
+    exitdefs = [{"exit": DIRECTIONS[0], "target": room_id(index + 1, rooms)}]
+    if index > 0:
+        exitdefs.append({"exit": DIRECTIONS[1], "target": room_id(index - 1, rooms)})
+    while len(exitdefs) < exits:
+        i = len(exitdefs)
+        exitname = DIRECTIONS[i] if i < len(DIRECTIONS) else "PATH{}".format(i)
+        exitdata = {"exit": exitname, "target": room_id(rng.randrange(rooms), rooms)}
+        if flags > 0 and rng.random() < 0.25:
+            exitdata["revealed"] = True
+            exitdata["flag"] = flag_name(rng.randrange(flags))
+            exitdata["flag-test"] = True
+            exitdata["fail-text"] = "The way is blocked."
+        exitdefs.append(exitdata)
+    room["exits"] = exitdefs
+    interact = {}
+    for i in range(objects):
+        objectname = OBJECTS[i % len(OBJECTS)]
+        if i >= len(OBJECTS):
+            objectname += " {}".format(i // len(OBJECTS) + 1)
+        interact[objectname] = {verb: _gen_action(rng, depth, flags, keys) for verb in VERBS}
+    if len(interact) > 0:
+        room["interact"] = interact
+    if keys > 0 and rng.random() < 0.1:
+        room["items"] = {"key": {"item": key_name(rng.randrange(keys))}}
+    if len(enemies) > 0 and index > 0 and rng.random() < encounter_chance:
+        room["encounter"] = [rng.choice(enemies) for _ in range(rng.randint(1, encounter_size))]
+    return room
+
+def _write_level(path, rng, rooms, roomargs):
+    with open(path, "w", encoding="utf-8") as levelfile:
+        levelfile.write("{\n")
+        for index in range(rooms):
+            room = generate_room(rng, index, rooms, **roomargs)
+            levelfile.write("{}: {},\n".format(json.dumps(room_id(index, rooms)), json.dumps(room)))
+        end = {"name": "The End", "desc": "You made it to the end.", "exits": []}
+        levelfile.write("{}: {}\n}}\n".format(json.dumps("END"), json.dumps(end)))
+
+def _load_base(name):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), encoding="utf-8") as basefile:
+        return json.load(basefile)
+
+def generate_world(directory, seed=0, rooms=100, exits=3, objects=1, depth=2, flags=16, keys=4,
+        encounter_chance=0.2, encounter_size=3):
+    """
+    Write a generated world's content files to a folder. Rooms are written one
+    at a time, so memory use doesn't grow with the number of rooms. The
+    game's own items, classes and enemies are included, so every class can
+    play the world.
+
+    Parameters
+    ----------
+    directory: str
+        The folder to write to; it is created if it doesn't exist.
+    seed: int
+        The random seed.
+    rooms: int
+        The number of rooms, not counting END.
+    exits: int
+        The number of exits in each room. Rooms other than the first always
+        have an exit forward and one back, so they have at least two.
+    objects: int
+        The number of objects to interact with in each room.
+    depth: int
+        How deeply the objects' "if"/"has" actions are nested.
+    flags: int
+        The number of distinct flags.
+    keys: int
+        The number of distinct key items.
+    encounter_chance: float
+        The chance that a room ambushes the player.
+    encounter_size: int
+        The largest number of enemies in an encounter.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    items = _load_base("items.json")
+    for i in range(keys):
+        items[key_name(i)] = {"name": "Key {}".format(i + 1), "desc": "A generated key."}
+    enemies = _load_base("enemies.json")
+    for name, data in (("items.json", items), ("classes.json", _load_base("classes.json")),
+            ("enemies.json", enemies)):
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as contentfile:
+            json.dump(data, contentfile, indent=4)
+    _write_level(os.path.join(directory, "level.json"), rng, max(rooms, 1), {
+        "exits": max(exits, 1),
+        "objects": objects,
+        "depth": depth,
+        "flags": flags,
+        "keys": keys,
+        "enemies": sorted(enemies),
+        "encounter_chance": encounter_chance,
+        "encounter_size": max(encounter_size, 1)
+    })
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a world for benchmarking.")
+    parser.add_argument("directory", help="folder to write the content files to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--exits", type=int, default=3, help="exits per room")
+    parser.add_argument("--objects", type=int, default=1, help="objects per room")
+    parser.add_argument("--depth", type=int, default=2, help="nesting depth of object actions")
+    parser.add_argument("--flags", type=int, default=16, help="number of distinct flags")
+    parser.add_argument("--keys", type=int, default=4, help="number of distinct key items")
+    parser.add_argument("--encounter-chance", type=float, default=0.2)
+    parser.add_argument("--encounter-size", type=int, default=3, help="most enemies in an encounter")
+    args = parser.parse_args(argv)
+    generate_world(args.directory, args.seed, args.rooms, args.exits, args.objects, args.depth,
+        args.flags, args.keys, args.encounter_chance, args.encounter_size)
+
+if __name__ == '__main__':
+    main_cli()
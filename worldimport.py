@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Importer for worlds in the Zork schema, such as zork.json.
+
+These worlds differ from level.json in a few ways:
+  * A room's "items" is a list of {"item", "desc", "take"} objects, where
+    "desc" is how the item appears in the room and "take" is printed when the
+    item is taken.
+  * An exit whose target is "!" doesn't lead anywhere.
+  * Exits named "#!#!#" are special exits that the player can't take by name.
+
+convert_room converts one room to the native level format. import_world
+converts a whole file one room at a time, so memory use doesn't grow with the
+size of the world. The game's loader converts these worlds automatically (see
+contentcache), so `python main.py --world zork.json` plays one directly.
+
+Run with e.g. `python worldimport.py zork.json -o zork.level.json`.
+"""
+import sys
+assert sys.version_info >= (3,7), "This script requires at least Python 3.7"
+
+import argparse
+import json
+
+# The target of exits that don't lead anywhere
+NOWHERE = "!"
+# The name of exits that can't be taken by name
+HIDDEN_EXIT = "#!#!#"
+# Number of characters read from the source file at a time
+CHUNK_SIZE = 64 * 1024
+
+def is_foreign_room(room):
+    """
+    Returns true if a room is in the Zork schema rather than the native one.
+    """
+    return isinstance(room, dict) and isinstance(room.get("items"), list)
+
+def convert_room(roomid, room, stats=None):
+    """
+    Convert a room from the Zork schema to the native level format. Rooms
+    that are already native are returned unchanged.
+
+    Parameters
+    ----------
+    roomid: str
+        The room's key.
+    room: dict
+        The room's definition.
+    stats: dict[str -> int]
+        If given, counts of what was converted and dropped are added to it.
+    """
+    if not is_foreign_room(room):
+        return room
+    if stats == None:
+        stats = {}
+    native = {key: value for key, value in room.items() if key not in ("exits", "items")}
+    native.setdefault("name", roomid)
+    exits = []
+    for exitdata in room.get("exits", []):
+        if exitdata.get("target") == NOWHERE:
+            stats["dead-end exits"] = stats.get("dead-end exits", 0) + 1
+        elif exitdata.get("exit") == HIDDEN_EXIT:
+            stats["hidden exits"] = stats.get("hidden exits", 0) + 1
+        else:
+            exits.append(exitdata)
+    native["exits"] = exits
+    items = {}
+    for itemdata in room["items"]:
+        itemkey = itemdata.get("item", "")
+        itemname = itemkey.lower().replace("_", " ")
+        if itemname in items:
+            stats["duplicate items"] = stats.get("duplicate items", 0) + 1
+            continue
+        item = {"item": itemkey}
+        if "desc" in itemdata:
+            item["look"] = itemdata["desc"]
+        if "take" in itemdata:
+            item["take"] = itemdata["take"]
+        items[itemname] = item
+    if len(items) > 0:
+        native["items"] = items
+    stats["rooms"] = stats.get("rooms", 0) + 1
+    return native
+
+def convert_level(level):
+    """
+    Convert every room of a level that is in the Zork schema. Returns the
+    level itself if every room is already native.
+    """
+    if not any(is_foreign_room(room) for room in level.values()):
+        return level
+    return {roomid: convert_room(roomid, room) for roomid, room in level.items()}
+
+def _skip_space(text, pos):
+    while pos < len(text) and text[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+def iter_object(sourcefile, chunk_size=CHUNK_SIZE):
+    """
+    Read the top level JSON object of a file one member at a time, yielding
+    (key, value) pairs. Only one member is held in memory at a time. Raises
+    ValueError if the file isn't a JSON object.
+
+    Parameters
+    ----------
+    sourcefile: file
+        A text file to read from.
+    chunk_size: int
+        The number of characters to read at a time.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = sourcefile.read(chunk_size)
+        if chunk == "":
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+    def peek():
+        # Skip whitespace, and return the next character
+        nonlocal pos
+        while True:
+            pos = _skip_space(buffer, pos)
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                raise ValueError("Unexpected end of file")
+            fill()
+    def expect(chars):
+        c = peek()
+        if c not in chars:
+            raise ValueError("Expected one of {} but found {!r}".format(list(chars), c))
+        return c
+    def decode():
+        # Decode the next value. A value is only accepted once something
+        # follows it, since e.g. a number could continue in the next chunk.
+        nonlocal pos
+        while True:
+            peek()
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    pos = end
+                    return value
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            fill()
+    expect("{")
+    pos += 1
+    if expect('"}') == "}":
+        return
+    while True:
+        key = decode()
+        expect(":")
+        pos += 1
+        yield key, decode()
+        if expect(",}") == "}":
+            return
+        pos += 1
+        expect('"')
+
+def import_world(sourcefile, destfile, chunk_size=CHUNK_SIZE):
+    """
+    Convert a world file to the native level format, one room at a time.
+    Returns counts of what was converted and dropped.
+
+    Parameters
+    ----------
+    sourcefile: file
+        A text file to read the world from.
+    destfile: file
+        A text file to write the level to.
+    chunk_size: int
+        The number of characters to read at a time.
+    """
+    stats = {"rooms": 0}
+    destfile.write("{")
+    separator = "\n"
+    for roomid, room in iter_object(sourcefile, chunk_size):
+        room = convert_room(roomid, room, stats)
+        destfile.write("{}{}: {}".format(separator, json.dumps(roomid), json.dumps(room, indent="\t")))
+        separator = ",\n"
+    destfile.write("\n}\n")
+    return stats
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Convert a Zork-style world to the native level format.")
+    parser.add_argument("source", help="the world file to convert, e.g. zork.json")
+    parser.add_argument("-o", "--output", help="where to write the level (default: standard output)")
+    args = parser.parse_args(argv)
+    with open(args.source, encoding="utf-8") as sourcefile:
+        if args.output == None:
+            stats = import_world(sourcefile, sys.stdout)
+        else:
+            with open(args.output, "w", encoding="utf-8") as destfile:
+                stats = import_world(sourcefile, destfile)
+    for name, count in stats.items():
+        print("{}: {}".format(name, count), file=sys.stderr)
+
+if __name__ == '__main__':
+    main_cli()